@@ -10,7 +10,6 @@ from tqdm import trange, tqdm
 from ogb.graphproppred import Evaluator
 from torch_geometric.data import DataLoader
 from torch_geometric.utils import negative_sampling
-from torch_geometric.loader import GraphSAINTRandomWalkSampler
 from sklearn.metrics import roc_auc_score, average_precision_score, accuracy_score, f1_score
 
 from ..evaluation import *
@@ -63,6 +62,9 @@ class Trainer:
         return z
 
     def train(self, model, data, optimizer, args):
+        if args.num_neighbors:
+            return self.train_minibatch(model, data, optimizer, args)
+
         if self.args.dataset in ['Cora', 'PubMed', 'DBLP', 'CS']:
             return self.train_fullbatch(model, data, optimizer, args)
 
@@ -146,8 +148,8 @@ class Trainer:
         best_valid_loss = 1000000
 
         data.edge_index = data.train_pos_edge_index
-        loader = GraphSAINTRandomWalkSampler(
-            data, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
+        loader = get_minibatch_loader(
+            data, args, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
         )
         for epoch in trange(args.epochs, desc='Epoch'):
             model.train()
@@ -398,8 +400,9 @@ class KGTrainer(Trainer):
         best_metric = 0
 
         print('Num workers:', len(os.sched_getaffinity(0)))
-        loader = GraphSAINTRandomWalkSampler(
-            data, batch_size=128, walk_length=2, num_steps=args.num_steps, num_workers=len(os.sched_getaffinity(0))
+        loader = get_minibatch_loader(
+            data, args, batch_size=args.batch_size if args.num_neighbors else 128,
+            walk_length=2, num_steps=args.num_steps, num_workers=len(os.sched_getaffinity(0))
         )
         for epoch in trange(args.epochs, desc='Epoch'):
             model.train()
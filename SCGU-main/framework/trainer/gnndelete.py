@@ -5,13 +5,14 @@ from tqdm import tqdm, trange
 import torch
 import torch.nn as nn
 from torch_geometric.utils import negative_sampling, k_hop_subgraph
-from torch_geometric.loader import GraphSAINTRandomWalkSampler
 
 from .base import Trainer
 from ..evaluation import *
 from ..utils import *
 
 
+device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+
 def BoundedKLD(logits, truth):
     # print('aaaaaaaaa', truth.shape, truth)
     return 1 - torch.exp(-F.kl_div(F.log_softmax(logits, -1), truth.softmax(-1), None, None, 'batchmean'))
@@ -37,7 +38,7 @@ def get_loss_fct(name):
 class GNNDeleteTrainer(Trainer):
 
     def train(self, model, data, optimizer, args, logits_ori=None, attack_model_all=None, attack_model_sub=None):
-        if 'ogbl' in self.args.dataset:
+        if 'ogbl' in self.args.dataset or args.num_neighbors:
             return self.train_minibatch(model, data, optimizer, args, logits_ori, attack_model_all, attack_model_sub)
 
         else:
@@ -136,8 +137,8 @@ class GNNDeleteTrainer(Trainer):
         return loss, loss_r, loss_l
 
     def train_fullbatch(self, model, data, optimizer, args, logits_ori=None, attack_model_all=None, attack_model_sub=None):
-        model = model.to('cuda')
-        data = data.to('cuda')
+        model = model.to(device)
+        data = data.to(device)
 
         best_metric = 0
 
@@ -332,8 +333,8 @@ class GNNDeleteTrainer(Trainer):
 
         data.edge_index = data.train_pos_edge_index
         data.node_id = torch.arange(data.x.shape[0])
-        loader = GraphSAINTRandomWalkSampler(
-            data, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
+        loader = get_minibatch_loader(
+            data, args, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
         )
         for epoch in trange(args.epochs, desc='Unlerning'):
             model.train()
@@ -346,7 +347,9 @@ class GNNDeleteTrainer(Trainer):
             epoch_time = 0
             for step, batch in enumerate(tqdm(loader, leave=False)):
                 start_time = time.time()
-                batch = batch.to('cuda')
+                batch = batch.to(device)
+                # Global ids of the subgraph nodes: n_id from the neighbor loader, node_id from GraphSAINT
+                node_id = batch.n_id if 'n_id' in batch else batch.node_id
 
                 train_pos_edge_index = batch.edge_index
                 z = model(batch.x, train_pos_edge_index[:, batch.sdf_mask], batch.sdf_node_1hop_mask, batch.sdf_node_2hop_mask)
@@ -380,7 +383,9 @@ class GNNDeleteTrainer(Trainer):
                 lower_mask = edge[0] < edge[1]
                 row, col = edge[0][lower_mask], edge[1][lower_mask]
 
-                logits_ori = (z_ori[row] * z_ori[col]).sum(dim=-1).to('cuda')
+                # z_ori covers the full graph (on CPU), row/col are batch-local
+                row_ori, col_ori = node_id[row].cpu(), node_id[col].cpu()
+                logits_ori = (z_ori[row_ori] * z_ori[col_ori]).sum(dim=-1).to(device)
                 logits = (z[row] * z[col]).sum(dim=-1)
 
                 loss_l = loss_fct(logits, logits_ori)
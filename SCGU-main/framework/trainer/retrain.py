@@ -7,7 +7,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.utils import negative_sampling
-from torch_geometric.loader import GraphSAINTRandomWalkSampler
 
 from .base import Trainer, KGTrainer
 from ..evaluation import *
@@ -29,15 +28,15 @@ class RetrainTrainer(Trainer):
         model.operator.register_hook(lambda grad: grad.mul_(gradient_mask))
     
     def train(self, model, data, optimizer, args, logits_ori=None, attack_model_all=None, attack_model_sub=None):
-        if 'ogbl' in self.args.dataset:
+        if 'ogbl' in self.args.dataset or args.num_neighbors:
             return self.train_minibatch(model, data, optimizer, args, logits_ori, attack_model_all, attack_model_sub)
 
         else:
             return self.train_fullbatch(model, data, optimizer, args, logits_ori, attack_model_all, attack_model_sub)
 
     def train_fullbatch(self, model, data, optimizer, args, logits_ori=None, attack_model_all=None, attack_model_sub=None):
-        model = model.to('cuda')
-        data = data.to('cuda')
+        model = model.to(device)
+        data = data.to(device)
 
         best_metric = 0
         loss_fct = nn.MSELoss()
@@ -146,8 +145,8 @@ class RetrainTrainer(Trainer):
             self.trainer_log['mi_sucrate_sub_before'] = mi_sucrate_sub_before
 
         data.edge_index = data.train_pos_edge_index
-        loader = GraphSAINTRandomWalkSampler(
-            data, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
+        loader = get_minibatch_loader(
+            data, args, batch_size=args.batch_size, walk_length=2, num_steps=args.num_steps,
         )
         for epoch in trange(args.epochs, desc='Epoch'):
             model.train()
@@ -248,8 +247,9 @@ class KGRetrainTrainer(KGTrainer):
             self.trainer_log['mi_logit_sub_before'] = mi_logit_sub_before
             self.trainer_log['mi_sucrate_sub_before'] = mi_sucrate_sub_before
 
-        loader = GraphSAINTRandomWalkSampler(
-            data, batch_size=128, walk_length=2, num_steps=args.num_steps, 
+        loader = get_minibatch_loader(
+            data, args, batch_size=args.batch_size if args.num_neighbors else 128,
+            walk_length=2, num_steps=args.num_steps,
         )
         for epoch in trange(args.epochs, desc='Epoch'):
             model.train()
@@ -42,6 +42,12 @@ def parse_args():
                         help='random walk length for GraphSAINTRandomWalk sampler')
     parser.add_argument('--num_steps', type=int, default=32,
                         help='number of steps for GraphSAINTRandomWalk sampler')
+    parser.add_argument('--num_neighbors', type=lambda s: [int(i) for i in s.split(',')], default=None,
+                        help='fanout per layer, e.g. 15,10. Enables neighbor-sampled mini-batch training')
+    parser.add_argument('--num_workers', type=int, default=0,
+                        help='data loading workers for the neighbor sampler')
+    parser.add_argument('--num_threads', type=int, default=0,
+                        help='number of CPU threads for training, 0 for torch default')
 
     # Training
     parser.add_argument('--lr', type=float, default=1e-3, 
@@ -1,6 +1,7 @@
 import numpy as np
 import torch
 import networkx as nx
+from torch_geometric.loader import GraphSAINTRandomWalkSampler, LinkNeighborLoader
 
 
 def get_node_edge(graph):
@@ -56,3 +57,29 @@ def negative_sampling_kg(edge_index, edge_type):
         edge_index_copy[0, mask] = new_source
     
     return edge_index_copy
+
+
+def set_num_threads(args):
+    '''Pin the number of intra-op CPU threads (--num_threads, 0 keeps the torch default)'''
+    if getattr(args, 'num_threads', 0) > 0:
+        torch.set_num_threads(args.num_threads)
+
+def get_minibatch_loader(data, args, batch_size, **saint_kwargs):
+    '''Mini-batch loader over data.edge_index.
+
+    By default this is the GraphSAINT random walk sampler (batch_size root nodes).
+    With --num_neighbors, subgraphs are built by layer-wise neighbor sampling around
+    batch_size seed edges instead, so memory per step is bounded by the fanout rather
+    than the graph size. Node and edge attributes (x, edge_type, masks) are sliced
+    into each batch in both cases, so the training loops are unchanged.
+    '''
+    set_num_threads(args)
+
+    if getattr(args, 'num_neighbors', None):
+        num_workers = getattr(args, 'num_workers', 0)
+        return LinkNeighborLoader(
+            data, num_neighbors=args.num_neighbors, edge_label_index=data.edge_index,
+            batch_size=batch_size, shuffle=True,
+            num_workers=num_workers, persistent_workers=num_workers > 0)
+
+    return GraphSAINTRandomWalkSampler(data, batch_size=batch_size, **saint_kwargs)
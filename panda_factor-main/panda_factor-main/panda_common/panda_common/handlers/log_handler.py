@@ -2,18 +2,41 @@ import logging
 import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional, List
+from pymongo import UpdateMany
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.config import config
+import queue
 import threading
 import time
 import os
 
+class _FlushRequest:
+    """Queue marker asking the writer to persist everything queued before it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
 class LogBatchManager:
-    """Log batch manager that caches logs and periodically writes them to the database"""
-    
+    """
+    Asynchronous log shipper that writes factor analysis logs to the database
+
+    Logging threads only enqueue entries into a bounded queue; a single
+    background writer drains it, inserts logs with ``insert_many`` and coalesces
+    the task status updates to one write per task per batch, so logging never
+    adds database round trips to the compute path.
+
+    When the queue is full, WARNING and above block for up to ``put_timeout``
+    seconds (backpressure) and lower levels follow ``overflow_policy``:
+    ``drop_newest`` discards the incoming entry, ``drop_oldest`` discards the
+    oldest queued one and ``block`` treats every level like WARNING.
+    """
+
     _instance = None
     _lock = threading.Lock()
-    
+
+    URGENT_LEVELS = ("WARNING", "ERROR", "CRITICAL")
+
     @classmethod
     def get_instance(cls):
         """Get singleton instance"""
@@ -22,99 +45,206 @@ class LogBatchManager:
                 if cls._instance is None:
                     cls._instance = LogBatchManager()
         return cls._instance
-    
-    def __init__(self):
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 500, flush_interval: float = 5,
+                 overflow_policy: str = "drop_newest", put_timeout: float = 1.0):
         """Initialize batch manager"""
-        self.log_buffer = {}  # Log cache grouped by task_id
-        self.buffer_lock = threading.Lock()
+        if overflow_policy not in ("drop_newest", "drop_oldest", "block"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
         self.db_handler = DatabaseHandler(config)
-        self.flush_interval = 5  # Flush interval (seconds)
-        self.max_buffer_size = 50  # Maximum number of cached logs per task
-        
-        # Start background thread for periodic log flushing
+        self.log_queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size  # Maximum number of logs per insert_many
+        self.flush_interval = flush_interval  # Maximum delay before queued logs are written (seconds)
+        self.overflow_policy = overflow_policy
+        self.put_timeout = put_timeout
+        self.dropped_count = 0
+        self._reported_dropped = 0
+        self._dropped_lock = threading.Lock()
+
+        # Start the single background writer
         self.stop_flag = False
-        self.flush_thread = threading.Thread(target=self._flush_loop)
+        self.flush_thread = threading.Thread(target=self._writer_loop, name="factor-log-writer")
         self.flush_thread.daemon = True
         self.flush_thread.start()
-    
+
     def add_log(self, task_id: str, log_entry: Dict[str, Any]):
-        """Add log to cache"""
-        with self.buffer_lock:
-            if task_id not in self.log_buffer:
-                self.log_buffer[task_id] = []
-            
-            self.log_buffer[task_id].append(log_entry)
-            
-            # If cache reaches threshold, flush immediately
-            if len(self.log_buffer[task_id]) >= self.max_buffer_size:
-                self._flush_task_logs(task_id)
-    
-    def _flush_loop(self):
-        """Background thread for periodic log flushing"""
-        while not self.stop_flag:
-            time.sleep(self.flush_interval)
-            self.flush_all()
-    
-    def _flush_task_logs(self, task_id: str):
-        """Flush logs of specified task to database"""
-        logs_to_save = []
-        with self.buffer_lock:
-            if task_id in self.log_buffer and self.log_buffer[task_id]:
-                logs_to_save = self.log_buffer[task_id]
-                self.log_buffer[task_id] = []
-        
-        if logs_to_save:
+        """Queue a log entry, never touches the database on the caller's thread"""
+        log_entry.setdefault("task_id", task_id)
+        if self.stop_flag:
+            # The writer is gone (or going), nothing would drain the queue
+            self._write_batch([log_entry])
+            return
+        urgent = log_entry.get("level") in self.URGENT_LEVELS
+        try:
+            self.log_queue.put_nowait(log_entry)
+            return
+        except queue.Full:
+            pass
+
+        if urgent or self.overflow_policy == "block":
             try:
-                for log in logs_to_save:
-                    # Build log record
-                    log_record = {
-                        "log_id": str(uuid.uuid4()),
-                        "task_id": log["task_id"],
-                        "factor_id": log["factor_id"],
-                        "message": log["message"],
-                        "level": log["level"],
-                        "timestamp": log["timestamp"],
-                        "stage": log.get("stage", "default"),
-                        "details": log.get("details"),
-                        "created_at": datetime.now().isoformat(),
-                        "updated_at": datetime.now().isoformat()
-                    }
-                    
-                    # Direct insert into database
-                    self.db_handler.mongo_insert("panda", "factor_analysis_stage_logs", log_record)
-                
-                # Update task status
-                if len(logs_to_save) > 0:
-                    latest_log = logs_to_save[-1]
-                    self.db_handler.mongo_update(
-                        "panda",
-                        "tasks",
-                        {"task_id": latest_log["task_id"]},
-                        {
-                            "current_stage": latest_log.get("stage", "unknown"),
-                            "last_log_message": latest_log["message"],
-                            "last_log_time": latest_log["timestamp"],
-                            "last_log_level": latest_log["level"],
-                            "updated_at": datetime.now().isoformat()
-                        }
-                    )
-            except Exception as e:
-                print(f"Error saving batch logs: {e}")
-    
-    def flush_all(self):
-        """Flush logs of all tasks"""
-        with self.buffer_lock:
-            task_ids = list(self.log_buffer.keys())
-        
-        for task_id in task_ids:
-            self._flush_task_logs(task_id)
-    
+                self.log_queue.put(log_entry, timeout=self.put_timeout)
+                return
+            except queue.Full:
+                pass
+        elif self.overflow_policy == "drop_oldest":
+            if self._replace_oldest(log_entry):
+                self._count_dropped()
+                return
+        self._count_dropped()
+
+    def _replace_oldest(self, log_entry: Dict[str, Any]) -> bool:
+        """Swap the oldest queued log entry for ``log_entry``, flush requests are never evicted"""
+        q = self.log_queue
+        with q.mutex:
+            for i, item in enumerate(q.queue):
+                if not isinstance(item, _FlushRequest):
+                    del q.queue[i]
+                    break
+            else:
+                return False
+            # One item out, one in: unfinished_tasks stays balanced
+            q.queue.append(log_entry)
+            q.not_empty.notify()
+        return True
+
+    def _count_dropped(self):
+        with self._dropped_lock:
+            self.dropped_count += 1
+
+    def _writer_loop(self):
+        """Background thread that drains the queue in batches"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self.log_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            flush_requests = []
+            urgent = False
+            if isinstance(item, _FlushRequest):
+                flush_requests.append(item)
+            elif item is not None:
+                batch.append(item)
+                urgent = item.get("level") in self.URGENT_LEVELS
+
+            # Drain whatever is already queued without waiting
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _FlushRequest):
+                    flush_requests.append(item)
+                    break
+                batch.append(item)
+                urgent = urgent or item.get("level") in self.URGENT_LEVELS
+
+            if batch and (urgent or flush_requests or len(batch) >= self.batch_size
+                          or time.monotonic() >= deadline or self.stop_flag):
+                self._write_batch(batch)
+                for _ in batch:
+                    self.log_queue.task_done()
+                batch = []
+            for request in flush_requests:
+                self.log_queue.task_done()
+                request.done.set()
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+                self._report_dropped()
+            if self.stop_flag and not batch and self.log_queue.empty():
+                break
+
+    def _write_batch(self, logs: List[Dict[str, Any]]):
+        """Insert a batch of logs and update each task once with its latest log"""
+        now = datetime.now().isoformat()
+        records = []
+        latest_by_task = {}
+        for log in logs:
+            records.append({
+                "log_id": log.get("log_id") or str(uuid.uuid4()),
+                "task_id": log["task_id"],
+                "factor_id": log["factor_id"],
+                "message": log["message"],
+                "level": log["level"],
+                "timestamp": log["timestamp"],
+                "stage": log.get("stage", "default"),
+                "details": log.get("details"),
+                "created_at": now,
+                "updated_at": now
+            })
+            latest_by_task[log["task_id"]] = log
+
+        try:
+            db = self.db_handler.mongo_client["panda"]
+            db["factor_analysis_stage_logs"].insert_many(records, ordered=False)
+            db["tasks"].bulk_write([
+                UpdateMany(
+                    {"task_id": task_id},
+                    {"$set": {
+                        "current_stage": latest_log.get("stage", "unknown"),
+                        "last_log_message": latest_log["message"],
+                        "last_log_time": latest_log["timestamp"],
+                        "last_log_level": latest_log["level"],
+                        "updated_at": now
+                    }}
+                )
+                for task_id, latest_log in latest_by_task.items()
+            ], ordered=False)
+        except Exception as e:
+            print(f"Error saving batch logs: {e}")
+
+    def _report_dropped(self):
+        with self._dropped_lock:
+            dropped = self.dropped_count - self._reported_dropped
+            self._reported_dropped = self.dropped_count
+        if dropped:
+            print(f"Log queue full, dropped {dropped} log entries ({self.overflow_policy})")
+
+    def flush_all(self, timeout: Optional[float] = 10) -> bool:
+        """
+        Block until every log queued before this call has been written
+
+        Returns:
+            bool: False if the writer did not catch up within ``timeout`` seconds
+        """
+        if not self.flush_thread.is_alive():
+            return self.log_queue.empty()
+        request = _FlushRequest()
+        try:
+            self.log_queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
     def shutdown(self):
         """Shutdown batch manager"""
         self.stop_flag = True
         if self.flush_thread.is_alive():
+            # Wake the writer so it does not sit out the rest of flush_interval
+            try:
+                self.log_queue.put_nowait(_FlushRequest())
+            except queue.Full:
+                pass
             self.flush_thread.join(timeout=10)
-        self.flush_all()  # Ensure all logs are saved
+        # Entries that raced with stop_flag after the writer's last drain
+        leftover = []
+        while True:
+            try:
+                item = self.log_queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            else:
+                leftover.append(item)
+        if leftover:
+            self._write_batch(leftover)
+        self._report_dropped()
 
 class FactorAnalysisLogHandler(logging.Handler):
     """Factor analysis log handler that saves logs to MongoDB"""
@@ -171,10 +301,7 @@ class FactorAnalysisLogHandler(logging.Handler):
                     }
                     self.batch_manager.add_log(self.task_id, debug_entry)
             
-            # For real-time response, important logs are written immediately
-            if record.levelname in ("ERROR", "CRITICAL", "WARNING"):
-                self.batch_manager.flush_all()
-                
+            # WARNING and above wake the background writer immediately (see LogBatchManager)
         except Exception as e:
             # Avoid application crash due to log processing exceptions
             print(f"Error saving log to MongoDB: {e}")
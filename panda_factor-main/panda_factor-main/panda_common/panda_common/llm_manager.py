@@ -4,13 +4,65 @@ LLM管理器 - 支持多API密钥负载均衡和故障转移
 
 import time
 import random
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator
+import httpx
+from openai import OpenAI, AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
 
+class _KeyState:
+    """
+    单个API密钥的连接池与运行状态
+
+    同步/异步客户端按密钥缓存并复用底层 HTTP keep-alive 连接池，
+    并发数由信号量限制，延迟以指数加权移动平均 (EWMA) 记录。
+    httpx.AsyncClient 和 asyncio.Semaphore 绑定创建时的事件循环，
+    所以异步客户端和信号量按事件循环分别缓存。
+    """
+
+    def __init__(self, api_key: str, max_concurrency: int):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.client: Optional[OpenAI] = None
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        # 事件循环 -> 异步客户端 / 信号量，事件循环被回收后对应条目自动删除
+        self.async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = \
+            weakref.WeakKeyDictionary()
+        self.async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.ewma_latency: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def end(self, latency: Optional[float] = None, error: bool = False, alpha: float = 0.3):
+        with self.lock:
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+                self.consecutive_errors += 1
+            else:
+                self.consecutive_errors = 0
+            if latency is not None:
+                if self.ewma_latency is None:
+                    self.ewma_latency = latency
+                else:
+                    self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+
 class LLMManager:
     """
     LLM管理器，支持：
@@ -18,6 +70,7 @@ class LLMManager:
     2. 自动故障转移
     3. 负载均衡
     4. 重试机制
+    5. 按密钥复用的连接池、并发限制和基于延迟的选择策略 (latency)
     """
     
     def __init__(self, config: Dict[str, Any]):
@@ -50,45 +103,135 @@ class LLMManager:
         self.max_retries = config.get('LLM_MAX_RETRIES', 3)
         self.retry_delay = config.get('LLM_RETRY_DELAY', 1)
         
+        # 连接池与并发配置
+        self.max_concurrency_per_key = config.get('LLM_MAX_CONCURRENCY_PER_KEY', 8)
+        # keep-alive连接数超过最大连接数没有意义
+        self.http_max_keepalive = min(config.get('LLM_HTTP_MAX_KEEPALIVE', self.max_concurrency_per_key),
+                                      self.max_concurrency_per_key)
+        self.timeout = config.get('LLM_TIMEOUT', 60)
+        
         # 密钥状态跟踪
         self.key_failures = {key: 0 for key in self.api_keys}
         self.key_last_success = {key: time.time() for key in self.api_keys}
+        self._key_states = {key: _KeyState(key, self.max_concurrency_per_key) for key in self.api_keys}
+        self._lock = threading.Lock()
         
         logger.info(f"LLM管理器初始化完成，共{len(self.api_keys)}个API密钥")
         logger.info(f"负载均衡策略: {self.strategy}")
         logger.info(f"默认模型: {self.default_model}")
     
-    def _get_next_api_key(self) -> str:
+    def _get_next_api_key(self, exclude: Optional[set] = None) -> str:
         """
         根据策略获取下一个API密钥
         
+        Args:
+            exclude: 本次调用中已经尝试过的密钥
+            
         Returns:
             API密钥
         """
+        candidates = [k for k in self.api_keys if not exclude or k not in exclude] or self.api_keys
+        
         if self.strategy == 'round_robin':
             # 轮询策略
-            key = self.api_keys[self.current_key_index]
-            self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-            return key
+            with self._lock:
+                for _ in range(len(self.api_keys)):
+                    key = self.api_keys[self.current_key_index]
+                    self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
+                    if key in candidates:
+                        return key
+            return candidates[0]
         
         elif self.strategy == 'random':
             # 随机策略
-            return random.choice(self.api_keys)
+            return random.choice(candidates)
         
         elif self.strategy == 'failover':
             # 故障转移策略：优先使用失败次数少的
             sorted_keys = sorted(
-                self.api_keys,
+                candidates,
                 key=lambda k: (self.key_failures[k], -self.key_last_success[k])
             )
             return sorted_keys[0]
         
+        elif self.strategy == 'latency':
+            # 延迟感知策略：连续失败少的优先，其次按 EWMA延迟 x (在途请求数 + 1) 选择，未测过延迟的密钥优先探测
+            def score(k):
+                state = self._key_states[k]
+                latency = state.ewma_latency or 0.0
+                return state.consecutive_errors, latency * (state.in_flight + 1), state.in_flight
+            return min(candidates, key=score)
+        
         else:
-            return self.api_keys[0]
+            return candidates[0]
+    
+    def _http_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_concurrency_per_key,
+            max_keepalive_connections=self.http_max_keepalive
+        )
+    
+    def get_client(self, api_key: str) -> OpenAI:
+        """
+        获取密钥对应的同步OpenAI客户端（按密钥缓存，复用连接池）
+        
+        Args:
+            api_key: API密钥
+            
+        Returns:
+            OpenAI客户端
+        """
+        state = self._key_states[api_key]
+        if state.client is None:
+            with state.lock:
+                if state.client is None:
+                    # 重试由管理器负责，客户端自身不再重试
+                    state.client = OpenAI(
+                        api_key=api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        timeout=self.timeout,
+                        http_client=httpx.Client(limits=self._http_limits(), timeout=self.timeout)
+                    )
+        return state.client
+    
+    def get_async_client(self, api_key: str) -> AsyncOpenAI:
+        """
+        获取密钥对应的异步OpenAI客户端（按密钥和当前事件循环缓存，复用连接池）
+        
+        Args:
+            api_key: API密钥
+            
+        Returns:
+            AsyncOpenAI客户端
+        """
+        state = self._key_states[api_key]
+        loop = asyncio.get_running_loop()
+        with state.lock:
+            client = state.async_clients.get(loop)
+            if client is None:
+                client = state.async_clients[loop] = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    timeout=self.timeout,
+                    http_client=httpx.AsyncClient(limits=self._http_limits(), timeout=self.timeout)
+                )
+        return client
+    
+    def _get_async_semaphore(self, api_key: str) -> asyncio.Semaphore:
+        """当前事件循环中该密钥的并发信号量"""
+        state = self._key_states[api_key]
+        loop = asyncio.get_running_loop()
+        with state.lock:
+            semaphore = state.async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = state.async_semaphores[loop] = asyncio.Semaphore(state.max_concurrency)
+        return semaphore
     
     def _create_client(self, api_key: str) -> OpenAI:
         """
-        创建OpenAI客户端
+        获取OpenAI客户端（兼容旧接口，返回缓存的客户端）
         
         Args:
             api_key: API密钥
@@ -96,10 +239,57 @@ class LLMManager:
         Returns:
             OpenAI客户端
         """
-        return OpenAI(
-            api_key=api_key,
-            base_url=self.base_url
-        )
+        return self.get_client(api_key)
+    
+    @contextmanager
+    def _track_call(self, api_key: str):
+        """
+        记录一次调用的在途数、延迟和失败次数
+        
+        在途数包含等待并发名额的请求，延迟从 ``call['start']`` 开始计算（获取名额后重置），
+        流式调用可以通过 ``call['latency']`` 指定首个分片的到达时间。
+        """
+        state = self._key_states[api_key]
+        call = {'start': time.perf_counter(), 'latency': None}
+        state.begin()
+        try:
+            yield call
+        except Exception:
+            state.end(error=True)
+            self.key_failures[api_key] += 1
+            raise
+        except BaseException:
+            # 任务被取消，不计入成功或失败
+            state.end()
+            raise
+        else:
+            latency = call['latency'] if call['latency'] is not None else time.perf_counter() - call['start']
+            state.end(latency=latency)
+            self.key_failures[api_key] = 0
+            self.key_last_success[api_key] = time.time()
+    
+    @staticmethod
+    def _response_to_dict(response) -> Dict[str, Any]:
+        return {
+            'id': response.id,
+            'model': response.model,
+            'choices': [
+                {
+                    'index': choice.index,
+                    'message': {
+                        'role': choice.message.role,
+                        'content': choice.message.content
+                    },
+                    'finish_reason': choice.finish_reason
+                }
+                for choice in response.choices
+            ],
+            'usage': {
+                'prompt_tokens': response.usage.prompt_tokens,
+                'completion_tokens': response.usage.completion_tokens,
+                'total_tokens': response.usage.total_tokens
+            }
+        }
     
     def chat_completion(
         self,
@@ -129,66 +319,35 @@ class LLMManager:
         last_error = None
         
         while len(tried_keys) < len(self.api_keys):
-            api_key = self._get_next_api_key()
-            
-            if api_key in tried_keys:
-                continue
-            
+            api_key = self._get_next_api_key(exclude=tried_keys)
             tried_keys.add(api_key)
+            state = self._key_states[api_key]
             
             # 重试当前密钥
             for attempt in range(self.max_retries):
+                logger.info(f"使用API密钥 {api_key[:20]}... 调用模型 {model} (尝试 {attempt + 1}/{self.max_retries})")
+                
                 try:
-                    logger.info(f"使用API密钥 {api_key[:20]}... 调用模型 {model} (尝试 {attempt + 1}/{self.max_retries})")
-                    
-                    client = self._create_client(api_key)
-                    
-                    response = client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        **kwargs
-                    )
-                    
-                    # 成功
-                    self.key_failures[api_key] = 0
-                    self.key_last_success[api_key] = time.time()
+                    with self._track_call(api_key) as call, state.semaphore:
+                        call['start'] = time.perf_counter()
+                        response = self.get_client(api_key).chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            **kwargs
+                        )
                     
                     logger.info(f"API调用成功，使用密钥 {api_key[:20]}...")
-                    
-                    # 转换为字典
-                    return {
-                        'id': response.id,
-                        'model': response.model,
-                        'choices': [
-                            {
-                                'index': choice.index,
-                                'message': {
-                                    'role': choice.message.role,
-                                    'content': choice.message.content
-                                },
-                                'finish_reason': choice.finish_reason
-                            }
-                            for choice in response.choices
-                        ],
-                        'usage': {
-                            'prompt_tokens': response.usage.prompt_tokens,
-                            'completion_tokens': response.usage.completion_tokens,
-                            'total_tokens': response.usage.total_tokens
-                        }
-                    }
+                    return self._response_to_dict(response)
                 
                 except Exception as e:
                     last_error = e
                     logger.warning(f"API调用失败 (密钥 {api_key[:20]}..., 尝试 {attempt + 1}/{self.max_retries}): {e}")
-                    
-                    # 记录失败
-                    self.key_failures[api_key] += 1
-                    
-                    # 如果不是最后一次尝试，等待后重试
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay)
+                
+                # 如果不是最后一次尝试，等待后重试
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
             
             logger.warning(f"API密钥 {api_key[:20]}... 所有重试均失败，切换到下一个密钥")
         
@@ -197,6 +356,122 @@ class LLMManager:
         logger.error(error_msg)
         raise Exception(error_msg)
     
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步聊天补全，重试和故障转移逻辑与 chat_completion 相同，不阻塞事件循环
+        
+        Returns:
+            响应字典
+        """
+        model = model or self.default_model
+        tried_keys = set()
+        last_error = None
+        
+        while len(tried_keys) < len(self.api_keys):
+            api_key = self._get_next_api_key(exclude=tried_keys)
+            tried_keys.add(api_key)
+            
+            for attempt in range(self.max_retries):
+                logger.info(f"使用API密钥 {api_key[:20]}... 调用模型 {model} (尝试 {attempt + 1}/{self.max_retries})")
+                
+                try:
+                    with self._track_call(api_key) as call:
+                        async with self._get_async_semaphore(api_key):
+                            call['start'] = time.perf_counter()
+                            response = await self.get_async_client(api_key).chat.completions.create(
+                                model=model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens,
+                                **kwargs
+                            )
+                    
+                    logger.info(f"API调用成功，使用密钥 {api_key[:20]}...")
+                    return self._response_to_dict(response)
+                
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"API调用失败 (密钥 {api_key[:20]}..., 尝试 {attempt + 1}/{self.max_retries}): {e}")
+                
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay)
+            
+            logger.warning(f"API密钥 {api_key[:20]}... 所有重试均失败，切换到下一个密钥")
+        
+        error_msg = f"所有API密钥均失败，最后错误: {last_error}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    async def achat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        异步流式聊天补全，逐段返回文本内容
+        
+        只在收到第一段内容之前进行重试和故障转移；记录的延迟为首个分片到达时间。
+        流式输出期间一直占用该密钥的一个并发名额。
+        """
+        model = model or self.default_model
+        tried_keys = set()
+        last_error = None
+        
+        while len(tried_keys) < len(self.api_keys):
+            api_key = self._get_next_api_key(exclude=tried_keys)
+            tried_keys.add(api_key)
+            
+            for attempt in range(self.max_retries):
+                streaming = False
+                try:
+                    with self._track_call(api_key) as call:
+                        async with self._get_async_semaphore(api_key):
+                            call['start'] = time.perf_counter()
+                            stream = await self.get_async_client(api_key).chat.completions.create(
+                                model=model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens,
+                                stream=True,
+                                **kwargs
+                            )
+                            async for chunk in stream:
+                                if not chunk.choices:
+                                    continue
+                                if not streaming:
+                                    streaming = True
+                                    call['latency'] = time.perf_counter() - call['start']
+                                content = chunk.choices[0].delta.content
+                                if content:
+                                    yield content
+                    return
+                
+                except Exception as e:
+                    if streaming:
+                        # 已经输出了部分内容，无法透明重试
+                        raise
+                    last_error = e
+                    logger.warning(f"流式API调用失败 (密钥 {api_key[:20]}..., 尝试 {attempt + 1}/{self.max_retries}): {e}")
+                
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay)
+            
+            logger.warning(f"API密钥 {api_key[:20]}... 所有重试均失败，切换到下一个密钥")
+        
+        error_msg = f"所有API密钥均失败，最后错误: {last_error}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
     def get_model(self, model_type: str) -> str:
         """
         获取指定类型的模型名称
@@ -219,18 +494,43 @@ class LLMManager:
         return {
             'total_keys': len(self.api_keys),
             'strategy': self.strategy,
+            'max_concurrency_per_key': self.max_concurrency_per_key,
             'default_model': self.default_model,
             'available_models': self.models,
             'key_status': [
                 {
                     'key': f"{key[:20]}...",
                     'failures': self.key_failures[key],
-                    'last_success': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.key_last_success[key]))
+                    'last_success': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.key_last_success[key])),
+                    'requests': self._key_states[key].requests,
+                    'errors': self._key_states[key].errors,
+                    'in_flight': self._key_states[key].in_flight,
+                    'ewma_latency_ms': (round(self._key_states[key].ewma_latency * 1000, 1)
+                                        if self._key_states[key].ewma_latency is not None else None)
                 }
                 for key in self.api_keys
             ]
         }
 
+    
+    def close(self):
+        """关闭所有同步客户端的连接池"""
+        for state in self._key_states.values():
+            if state.client is not None:
+                state.client.close()
+                state.client = None
+    
+    async def aclose(self):
+        """关闭同步客户端和当前事件循环的异步客户端的连接池"""
+        self.close()
+        loop = asyncio.get_running_loop()
+        for state in self._key_states.values():
+            with state.lock:
+                client = state.async_clients.pop(loop, None)
+                state.async_semaphores.pop(loop, None)
+            if client is not None:
+                await client.close()
+
 
 # 全局LLM管理器实例
 _llm_manager: Optional[LLMManager] = None
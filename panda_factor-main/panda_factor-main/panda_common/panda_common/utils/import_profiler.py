@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Import-time profiling report.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter and
+parses the output into a table of the slowest imports, e.g.::
+
+    python -m panda_common.utils.import_profiler panda_factor_server.__main__ --top 25
+    python -m panda_common.utils.import_profiler panda_factor.analysis --sort self
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+
+def parse_importtime(output: str) -> List[Dict]:
+    """
+    Parse ``-X importtime`` stderr into records
+
+    Returns:
+        List of dicts with ``module``, ``self_us``, ``cumulative_us`` and ``depth``
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            records.append({
+                'module': name.strip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(name) - len(name.lstrip())) // 2,
+            })
+        except ValueError:
+            continue
+    return records
+
+
+def profile_import(module: str, python: Optional[str] = None, env: Optional[Dict] = None) -> List[Dict]:
+    """Import ``module`` in a fresh interpreter with ``-X importtime`` and return parsed records"""
+    completed = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        env={**os.environ, **(env or {})},
+    )
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1:] or ['unknown error']
+        raise RuntimeError(f"Importing {module} failed: {tail[0]}")
+    return parse_importtime(completed.stderr)
+
+
+def format_report(records: List[Dict], top: int = 30, sort: str = 'cumulative', max_depth: Optional[int] = None) -> str:
+    """Format the slowest ``top`` imports as a text table"""
+    key = 'cumulative_us' if sort == 'cumulative' else 'self_us'
+    rows = [r for r in records if max_depth is None or r['depth'] <= max_depth]
+    rows = sorted(rows, key=lambda r: r[key], reverse=True)[:top]
+    total_us = sum(r['self_us'] for r in records)
+
+    lines = [
+        f"{'cumulative (ms)':>16} {'self (ms)':>10} {'share':>7}  module",
+        '-' * 72,
+    ]
+    for r in rows:
+        share = r['cumulative_us'] / total_us * 100 if total_us else 0.0
+        lines.append(f"{r['cumulative_us'] / 1000:>16.1f} {r['self_us'] / 1000:>10.1f} {share:>6.1f}%  {r['module']}")
+    lines.append('-' * 72)
+    lines.append(f"{len(records)} modules imported, {total_us / 1000:.1f} ms total")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report import time of a module (python -X importtime)')
+    parser.add_argument('module', type=str, help='Dotted module path to import, e.g. panda_factor_server.__main__')
+    parser.add_argument('--top', type=int, default=30, help='Number of rows to show')
+    parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative', help='Sort column')
+    parser.add_argument('--max-depth', type=int, help='Only show imports up to this nesting depth')
+    args = parser.parse_args()
+
+    try:
+        print(format_report(profile_import(args.module), top=args.top, sort=args.sort, max_depth=args.max_depth))
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
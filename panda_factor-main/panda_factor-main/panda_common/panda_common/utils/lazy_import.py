@@ -0,0 +1,88 @@
+"""
+Deferred loading of heavy optional dependencies.
+
+``lazy_module('matplotlib.pyplot')`` returns a proxy that imports the real module
+on first attribute access, so modules can keep their ``plt.`` / ``sm.`` call
+sites while importing them stays cheap for servers and worker processes that
+never plot or fit a model.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Module proxy that imports ``name`` on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._load(), key, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+class LazyAttribute:
+    """Proxy for ``from module import attr`` that resolves on first use"""
+
+    def __init__(self, module_name, attr, fallback=None):
+        self._module = LazyModule(module_name)
+        self._attr = attr
+        self._fallback = fallback
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            try:
+                self._target = getattr(self._module, self._attr)
+            except ImportError:
+                if self._fallback is None:
+                    raise
+                self._target = self._fallback
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self._resolve(), item)
+
+    def __repr__(self):
+        return f"<lazy attribute '{self._module.__dict__['_name']}.{self._attr}'>"
+
+
+def lazy_module(name):
+    """Return a proxy for module ``name`` that is imported on first use"""
+    return LazyModule(name)
+
+
+def lazy_attribute(module_name, attr, fallback=None):
+    """
+    Return a proxy for ``module_name.attr`` that is imported on first use
+
+    Args:
+        module_name: Dotted module path
+        attr: Attribute name in that module
+        fallback: Used instead when the module is not installed (e.g. ``print`` for IPython's display)
+    """
+    return LazyAttribute(module_name, attr, fallback)
@@ -0,0 +1,433 @@
+"""
+A股交易日历
+
+进程内只加载一次，依次使用本地文件、MongoDB ``trading_calendar`` 集合和数据源作为来源：
+
+1. 本地文件（默认 ``~/.panda_factor/trading_calendar.json``，可用 ``TRADING_CALENDAR_FILE`` 配置）
+2. MongoDB 集合，每个自然日一条 ``{date, is_open, source}`` 记录
+3. 数据源：调用方传入的 ``source(start, end)``（如 tushare trade_cal、rqdatac、xtdata），
+   未传入时使用 chinese_calendar 推算（工作日且非周末）
+
+只有数据源返回的、不晚于今天的区间是权威数据，会写回 MongoDB 和本地文件；
+chinese_calendar 推算的区间和今天之后的区间是临时数据，只保存在内存中，
+之后带数据源的查询覆盖到这些区间时会重新向数据源查询并替换。
+
+查询都是基于有序数组的向量化操作::
+
+    calendar = get_trading_calendar()
+    calendar.trading_days('20240101', '20240131')
+    calendar.previous_trading_day('20240102', n=5)
+    calendar.offset(['20240105', '20240108'], 3)
+"""
+import json
+import os
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from panda_common.logger_config import logger
+
+COLLECTION_NAME = 'trading_calendar'
+DEFAULT_FILE = os.path.join(os.path.expanduser('~'), '.panda_factor', 'trading_calendar.json')
+DATE_FORMAT = '%Y%m%d'
+FILE_VERSION = 2
+
+# 数据源签名: (start 'YYYYMMDD', end 'YYYYMMDD') -> 区间内的交易日
+CalendarSource = Callable[[str, str], Iterable]
+
+
+def _to_day(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(str(value) if isinstance(value, (int, np.integer)) else value).date(), 'D')
+
+
+def _to_days(values) -> np.ndarray:
+    series = pd.Series(np.atleast_1d(np.asarray(values, dtype=object)))
+    if series.empty:
+        return np.array([], dtype='datetime64[D]')
+    if isinstance(series.iloc[0], (int, np.integer)):
+        # 20240102 这样的整数日期按 YYYYMMDD 解析
+        series = series.astype(str)
+    try:
+        parsed = pd.to_datetime(series)
+    except ValueError:
+        parsed = pd.to_datetime(series, format='mixed')
+    return parsed.to_numpy().astype('datetime64[D]')
+
+
+def _format(days: np.ndarray, fmt: Optional[str]):
+    index = pd.DatetimeIndex(days.astype('datetime64[ns]'))
+    return index if fmt is None else list(index.strftime(fmt))
+
+
+def _day_str(day: np.datetime64) -> str:
+    return _format(np.array([day]), DATE_FORMAT)[0]
+
+
+def _today() -> np.datetime64:
+    return np.datetime64(pd.Timestamp.now().date(), 'D')
+
+
+def _runs(days: np.ndarray) -> List[Tuple[np.datetime64, np.datetime64]]:
+    """把有序的自然日数组拆成连续区间"""
+    if len(days) == 0:
+        return []
+    breaks = np.nonzero(np.diff(days).astype(int) > 1)[0]
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(days) - 1]])
+    return [(days[i], days[j]) for i, j in zip(starts, ends)]
+
+
+def chinese_calendar_source(start: str, end: str) -> List[str]:
+    """
+    用 chinese_calendar 推算交易日：法定工作日中的周一至周五（调休的周末股市不开市）
+
+    chinese_calendar 未安装或不支持该年份时退化为周一至周五，并记录警告。
+    结果只作为临时数据，不会持久化。
+    """
+    days = pd.date_range(start, end, freq='D')
+    weekdays = days[days.weekday < 5]
+    try:
+        from chinese_calendar import is_holiday
+        return [d.strftime(DATE_FORMAT) for d in weekdays if not is_holiday(d.date())]
+    except (ImportError, NotImplementedError) as e:
+        logger.warning(f"chinese_calendar 无法推算 {start}~{end} 的节假日({e})，按周一至周五处理")
+        return [d.strftime(DATE_FORMAT) for d in weekdays]
+
+
+class TradingCalendar:
+    """
+    交易日历，已知的交易日保存为有序 ``datetime64[D]`` 数组
+
+    ``_ranges`` 记录已覆盖的区间 ``(start, end, authoritative)``，互不重叠且有序；
+    覆盖区间之外的查询会先通过数据源补齐，只有权威区间会持久化到 MongoDB 和本地文件。
+    """
+
+    def __init__(self, config=None, file_path: Optional[str] = None, use_mongo: bool = True,
+                 default_source: CalendarSource = chinese_calendar_source):
+        self.config = config or {}
+        self.file_path = file_path or self.config.get('TRADING_CALENDAR_FILE') or DEFAULT_FILE
+        self.use_mongo = use_mongo
+        self.default_source = default_source
+        self._days = np.array([], dtype='datetime64[D]')
+        self._ranges: List[Tuple[np.datetime64, np.datetime64, bool]] = []
+        self._mongo_loaded = False
+        self._lock = threading.RLock()
+        self._load_file()
+
+    # ------------------------------------------------------------------ 覆盖区间
+
+    def _gaps(self, start: np.datetime64, end: np.datetime64,
+              authoritative: bool = False) -> List[Tuple[np.datetime64, np.datetime64]]:
+        """[start, end] 中未覆盖的部分；authoritative 为 True 时临时区间也算未覆盖"""
+        gaps = []
+        cursor = start
+        for range_start, range_end, range_authoritative in self._ranges:
+            if range_end < cursor or (authoritative and not range_authoritative):
+                continue
+            if range_start > end:
+                break
+            if range_start > cursor:
+                gaps.append((cursor, range_start - 1))
+            cursor = max(cursor, range_end + 1)
+            if cursor > end:
+                break
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def _covers(self, start: np.datetime64, end: np.datetime64, authoritative: bool = False) -> bool:
+        return not self._gaps(start, end, authoritative)
+
+    def _merge(self, start: np.datetime64, end: np.datetime64, days: np.ndarray, authoritative: bool):
+        """用 [start, end] 内的交易日替换已有数据，并更新覆盖区间"""
+        days = days[(days >= start) & (days <= end)]
+        keep = self._days[(self._days < start) | (self._days > end)]
+        self._days = np.unique(np.concatenate([keep, days]))
+
+        ranges = []
+        for range_start, range_end, range_authoritative in self._ranges:
+            if range_end < start or range_start > end:
+                ranges.append((range_start, range_end, range_authoritative))
+                continue
+            # 切掉与新区间重叠的部分
+            if range_start < start:
+                ranges.append((range_start, start - 1, range_authoritative))
+            if range_end > end:
+                ranges.append((end + 1, range_end, range_authoritative))
+        ranges.append((start, end, authoritative))
+        ranges.sort(key=lambda item: item[0])
+
+        # 合并相邻且类型相同的区间
+        merged = []
+        for item in ranges:
+            if merged and merged[-1][2] == item[2] and merged[-1][1] + 1 >= item[0]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], item[1]), item[2])
+            else:
+                merged.append(item)
+        self._ranges = merged
+
+    def _authoritative_days(self) -> Tuple[List[Tuple[np.datetime64, np.datetime64]], np.ndarray]:
+        ranges = [(start, end) for start, end, authoritative in self._ranges if authoritative]
+        mask = np.zeros(len(self._days), dtype=bool)
+        for start, end in ranges:
+            mask |= (self._days >= start) & (self._days <= end)
+        return ranges, self._days[mask]
+
+    # ------------------------------------------------------------------ 加载与持久化
+
+    def _load_file(self):
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            days = _to_days(data['trading_days'])
+            if data.get('version') == FILE_VERSION:
+                ranges = [(_to_day(start), _to_day(end)) for start, end in data['ranges']]
+                for start, end in ranges:
+                    self._merge(start, end, days, authoritative=True)
+            else:
+                # 旧版本文件可能包含推算出来的区间，只作为临时数据使用
+                self._merge(_to_day(data['start']), _to_day(data['end']), days, authoritative=False)
+            logger.debug(f"从 {self.file_path} 加载交易日历")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取交易日历文件失败 {self.file_path}: {e}")
+
+    def _save_file(self):
+        ranges, days = self._authoritative_days()
+        try:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            tmp_path = f"{self.file_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': FILE_VERSION,
+                    'ranges': [[_day_str(start), _day_str(end)] for start, end in ranges],
+                    'trading_days': _format(days, DATE_FORMAT),
+                }, f)
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            logger.warning(f"写入交易日历文件失败 {self.file_path}: {e}")
+
+    def _collection(self):
+        from panda_common.handlers.database_handler import DatabaseHandler
+        return DatabaseHandler(self.config).mongo_client[self.config['MONGO_DB']][COLLECTION_NAME]
+
+    def _load_mongo(self):
+        self._mongo_loaded = True
+        if not self.use_mongo or 'MONGO_DB' not in self.config:
+            return
+        try:
+            records = list(self._collection().find({}, {'_id': 0, 'date': 1, 'is_open': 1, 'source': 1}))
+        except Exception as e:
+            logger.warning(f"从MongoDB加载交易日历失败: {e}")
+            return
+        if not records:
+            return
+        frame = pd.DataFrame(records)
+        if 'source' not in frame:
+            frame['source'] = None
+        frame['day'] = _to_days(frame['date'].to_numpy())
+        frame = frame.sort_values('day')
+        # 推算的记录和今天之后的记录（旧版本写入的）不作为权威数据
+        default_name = getattr(self.default_source, '__name__', None)
+        trusted = frame[(frame['source'] != default_name) & (frame['day'] <= _today())]
+        all_days = trusted['day'].to_numpy().astype('datetime64[D]')
+        open_days = all_days[trusted['is_open'].to_numpy().astype(bool)]
+        for start, end in _runs(all_days):
+            if self._covers(start, end, authoritative=True):
+                continue
+            self._merge(start, end, open_days, authoritative=True)
+            logger.debug(f"从MongoDB加载交易日历 {start}~{end}")
+
+    def _save_mongo(self, start: np.datetime64, end: np.datetime64, open_days: np.ndarray, source_name: str):
+        if not self.use_mongo or 'MONGO_DB' not in self.config:
+            return
+        try:
+            from pymongo import UpdateOne
+            collection = self._collection()
+            collection.create_index('date', unique=True, name='date_idx')
+            open_set = set(open_days.tolist())
+            operations = [
+                UpdateOne(
+                    {'date': day.strftime(DATE_FORMAT)},
+                    {'$set': {'date': day.strftime(DATE_FORMAT), 'is_open': int(day in open_set), 'source': source_name}},
+                    upsert=True
+                )
+                for day in np.arange(start, end + 1).tolist()
+            ]
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"写入MongoDB交易日历失败: {e}")
+
+    def ensure_range(self, start, end, source: Optional[CalendarSource] = None):
+        """
+        确保 [start, end] 在覆盖区间内，不足的部分从数据源补齐
+
+        传入数据源时，区间内的临时数据（推算的或今天之后的）也会重新查询并替换；
+        数据源返回的不晚于今天的部分持久化到 MongoDB 和本地文件。
+
+        Args:
+            start: 开始日期 (YYYYMMDD / YYYY-MM-DD / datetime)
+            end: 结束日期
+            source: 数据源，默认使用 chinese_calendar 推算
+        """
+        start, end = _to_day(start), _to_day(end)
+        vendor = source is not None
+        today = _today()
+        # 今天之后的区间无论来源都是临时数据，数据源只需要为今天及以前的部分重新查询
+        refresh_end = min(end, today) if vendor else end
+        if start > end or (self._covers(start, end) and (
+                start > refresh_end or self._covers(start, refresh_end, authoritative=vendor))):
+            return
+        with self._lock:
+            if not self._mongo_loaded:
+                self._load_mongo()
+
+            gaps = self._gaps(start, end)
+            if vendor and start <= refresh_end:
+                gaps += self._gaps(start, refresh_end, authoritative=True)
+            if not gaps:
+                return
+
+            source = source or self.default_source
+            source_name = getattr(source, '__name__', 'custom')
+            persisted = False
+            for gap_start, gap_end in _runs(np.unique(np.concatenate(
+                    [np.arange(gap_start, gap_end + 1) for gap_start, gap_end in gaps]))):
+                gap_start_str, gap_end_str = _day_str(gap_start), _day_str(gap_end)
+                days = list(source(gap_start_str, gap_end_str))
+                open_days = _to_days(days) if days else np.array([], dtype='datetime64[D]')
+                if vendor and gap_start <= today:
+                    # 数据源返回的历史部分是权威数据，今天之后的部分仍是临时数据
+                    past_end = min(gap_end, today)
+                    self._merge(gap_start, past_end, open_days, authoritative=True)
+                    self._save_mongo(gap_start, past_end, open_days[open_days <= past_end], source_name)
+                    persisted = True
+                    if gap_end > today:
+                        self._merge(today + 1, gap_end, open_days, authoritative=False)
+                else:
+                    self._merge(gap_start, gap_end, open_days, authoritative=False)
+                logger.info(f"交易日历已补齐 {gap_start_str}~{gap_end_str} "
+                            f"(来源: {source_name}, {len(open_days)} 个交易日)")
+            if persisted:
+                self._save_file()
+
+    def _ensure_around(self, days: np.ndarray, n: int):
+        # 每周至少3个交易日，按 n 个交易日约 7/3*n 个自然日留出余量
+        pad = np.timedelta64(abs(n) * 7 // 3 + 15, 'D')
+        self.ensure_range(days.min() - pad, days.max() + pad)
+
+    # ------------------------------------------------------------------ 查询
+
+    def trading_days(self, start, end, fmt: Optional[str] = DATE_FORMAT, source: Optional[CalendarSource] = None):
+        """
+        区间 [start, end] 内的交易日
+
+        Args:
+            fmt: 返回的日期格式，None 时返回 DatetimeIndex
+            source: 覆盖区间不足时使用的数据源
+
+        Returns:
+            日期字符串列表（或 DatetimeIndex）
+        """
+        self.ensure_range(start, end, source=source)
+        start, end = _to_day(start), _to_day(end)
+        days = self._days[(self._days >= start) & (self._days <= end)]
+        return _format(days, fmt)
+
+    def is_trading_day(self, date) -> bool:
+        """判断单个日期是否为交易日"""
+        return bool(self.is_trading_days([date])[0])
+
+    def is_trading_days(self, dates) -> np.ndarray:
+        """向量化判断多个日期是否为交易日，返回布尔数组"""
+        days = _to_days(dates)
+        if len(days) == 0:
+            return np.array([], dtype=bool)
+        self.ensure_range(days.min(), days.max())
+        positions = np.searchsorted(self._days, days)
+        found = positions < len(self._days)
+        found[found] = self._days[positions[found]] == days[found]
+        return found
+
+    def offset(self, dates, n: int, fmt: Optional[str] = DATE_FORMAT):
+        """
+        向量化交易日偏移
+
+        n > 0 返回之后第 n 个交易日，n < 0 返回之前第 |n| 个交易日（都不含当日）；
+        n == 0 时交易日返回自身，非交易日返回下一个交易日。
+
+        Args:
+            dates: 单个日期或日期序列
+            n: 偏移的交易日数
+            fmt: 返回的日期格式，None 时返回 DatetimeIndex
+
+        Returns:
+            与输入对应的日期列表（单个日期输入时返回单个值）
+        """
+        scalar = np.ndim(dates) == 0
+        days = _to_days(dates)
+        self._ensure_around(days, n)
+
+        if n > 0:
+            positions = np.searchsorted(self._days, days, side='right') + n - 1
+        elif n < 0:
+            positions = np.searchsorted(self._days, days, side='left') + n
+        else:
+            positions = np.searchsorted(self._days, days, side='left')
+
+        valid = (positions >= 0) & (positions < len(self._days))
+        result = np.full(len(days), np.datetime64('NaT'), dtype='datetime64[D]')
+        result[valid] = self._days[positions[valid]]
+        formatted = _format(result, None)
+        if fmt is not None:
+            formatted = [None if pd.isna(d) else d.strftime(fmt) for d in formatted]
+        return formatted[0] if scalar else formatted
+
+    def previous_trading_day(self, date, n: int = 1, fmt: Optional[str] = DATE_FORMAT):
+        """之前第 n 个交易日（不含当日）"""
+        return self.offset(date, -n, fmt=fmt)
+
+    def next_trading_day(self, date, n: int = 1, fmt: Optional[str] = DATE_FORMAT):
+        """之后第 n 个交易日（不含当日）"""
+        return self.offset(date, n, fmt=fmt)
+
+    def get_status(self):
+        """日历覆盖范围"""
+        return {
+            'start': _day_str(self._ranges[0][0]) if self._ranges else None,
+            'end': _day_str(self._ranges[-1][1]) if self._ranges else None,
+            'ranges': [
+                {'start': _day_str(start), 'end': _day_str(end), 'authoritative': authoritative}
+                for start, end, authoritative in self._ranges
+            ],
+            'trading_days': len(self._days),
+            'file_path': self.file_path,
+        }
+
+
+# 全局交易日历实例
+_trading_calendar: Optional[TradingCalendar] = None
+_trading_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar(config=None) -> TradingCalendar:
+    """
+    获取进程内共享的交易日历
+
+    Args:
+        config: 配置字典（首次调用时使用，默认 panda_common.config）
+    """
+    global _trading_calendar
+
+    if _trading_calendar is None:
+        with _trading_calendar_lock:
+            if _trading_calendar is None:
+                if config is None:
+                    from panda_common.config import config as default_config
+                    config = default_config
+                _trading_calendar = TradingCalendar(config)
+    return _trading_calendar
@@ -57,6 +57,7 @@ from panda_common.logger_config import logger
 import concurrent.futures
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
+from panda_common.utils.trading_calendar import get_trading_calendar
 
 
 class MarketStockCnMinReaderV3:
@@ -68,7 +69,12 @@ class MarketStockCnMinReaderV3:
         self.golang_cutoff = datetime(2025, 1, 1)
 
     def _gen_date_sequence(self, start_date: str, end_date: str) -> List[str]:
-        """生成YYYYMMDD格式的日期序列"""
+        """生成YYYYMMDD格式的交易日序列，非交易日没有分钟数据，不再为其发起查询"""
+        try:
+            return get_trading_calendar(self.config).trading_days(start_date, end_date)
+        except Exception as e:
+            logger.warning(f"交易日历不可用，按自然日查询: {e}")
+
         start = datetime.strptime(start_date, "%Y%m%d")
         end = datetime.strptime(end_date, "%Y%m%d")
         delta = end - start
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Reproducible offline benchmark suite for the panda_data readers.
+
+Loads a synthetic dataset (see ``synthetic_market_data.py``) into a local
+MongoDB or an in-process ``mongomock`` client, times ``MarketDataReader``,
+``PartitionedMarketDataReader``, ``FactorReader`` and
+``MarketStockCnMinReaderV3`` on canonical workloads, writes the results as
+JSON and compares them against a stored baseline.
+
+Example:
+    python -m panda_data.scripts.benchmark_suite --backend mongomock --output bench.json
+    python -m panda_data.scripts.benchmark_suite --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_data.scripts.synthetic_market_data import load_synthetic_dataset
+
+
+def use_mongo_client(client) -> DatabaseHandler:
+    """
+    Install ``client`` as the connection behind the DatabaseHandler singleton,
+    so every reader constructed afterwards talks to the benchmark database
+    """
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = client
+    handler.initialized = True
+    return handler
+
+
+def build_workloads(config: Dict, dataset: Dict) -> List[Dict]:
+    """Build the canonical reader workloads for a loaded dataset"""
+    from panda_data.factor.factor_reader import FactorReader
+    from panda_data.market_data.market_data_reader import MarketDataReader
+    from panda_data.market_data.market_stock_cn_minute_reader import MarketStockCnMinReaderV3
+    from panda_data.market_data.partitioned_market_data_reader import PartitionedMarketDataReader
+
+    market_reader = MarketDataReader(config)
+    partitioned_reader = PartitionedMarketDataReader(config)
+    factor_reader = FactorReader(config)
+    minute_reader = MarketStockCnMinReaderV3(config)
+
+    dates = dataset['dates']
+    first, last = dates[0], dates[-1]
+    few_symbols = dataset['symbols'][:5]
+    minute_dates = dataset['minute_dates']
+
+    def reset_partitioned():
+        # 只清内存缓存，避免删除磁盘缓存目录中的真实数据
+        partitioned_reader._cache = {}
+
+    workloads = [
+        {
+            'name': 'market_data.single_day_all_symbols',
+            'run': lambda: market_reader.get_market_data(start_date=first, end_date=first),
+        },
+        {
+            'name': 'market_data.range_all_symbols_ohlcv',
+            'run': lambda: market_reader.get_market_data(
+                start_date=first, end_date=last, fields=['open', 'high', 'low', 'close', 'volume']),
+        },
+        {
+            'name': 'market_data.range_hs300_no_st',
+            'run': lambda: market_reader.get_market_data(
+                start_date=first, end_date=last, indicator='000300', st=False, fields=['close']),
+        },
+        {
+            'name': 'partitioned.range_few_symbols',
+            'setup': reset_partitioned,
+            'run': lambda: partitioned_reader.get_market_data(
+                few_symbols, first, last, fields=['close', 'volume'], use_disk_cache=False),
+        },
+        {
+            'name': 'partitioned.range_all_symbols',
+            'setup': reset_partitioned,
+            'run': lambda: partitioned_reader.get_market_data(
+                dataset['symbols'], first, last, fields=['close'], use_disk_cache=False),
+        },
+        {
+            'name': 'factor.base_range_all_symbols',
+            'run': lambda: factor_reader.get_factor(None, ['close', 'volume', 'market_cap'], first, last),
+        },
+    ]
+    if minute_dates:
+        workloads += [
+            {
+                'name': 'minute.single_day_all_symbols',
+                'run': lambda: minute_reader.get_data(start_date=minute_dates[0], end_date=minute_dates[0]),
+            },
+            {
+                'name': 'minute.range_single_symbol',
+                'run': lambda: minute_reader.get_data(
+                    symbol=dataset['minute_symbols'][0], start_date=minute_dates[0], end_date=minute_dates[-1],
+                    fields=['close', 'volume']),
+            },
+        ]
+    return workloads
+
+
+def time_workload(run: Callable, setup: Optional[Callable] = None, iterations: int = 3,
+                  warmup: int = 1) -> Dict:
+    """Time a workload, returns per-iteration timings and summary statistics"""
+    rows = 0
+    for _ in range(warmup):
+        if setup:
+            setup()
+        run()
+
+    times = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+        rows = 0 if result is None else len(result)
+
+    return {
+        'rows': rows,
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+    }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Dict]:
+    """
+    Compare workload medians against a baseline result file
+
+    A workload regresses when its median exceeds the baseline median by more
+    than its tolerance. Per-workload overrides are read from the baseline's
+    ``thresholds`` section, e.g. ``{"minute.range_single_symbol": {"tolerance": 0.5,
+    "max_seconds": 2.0}}``; ``max_seconds`` is an absolute ceiling.
+
+    Returns:
+        List of regression descriptions (empty when everything is within limits)
+    """
+    regressions = []
+    thresholds = baseline.get('thresholds', {})
+    baseline_workloads = baseline.get('workloads', {})
+
+    for name, current in results['workloads'].items():
+        limits = thresholds.get(name, {})
+        allowed = limits.get('tolerance', tolerance)
+        reference = baseline_workloads.get(name)
+
+        if reference is None:
+            current['status'] = 'new'
+        else:
+            ratio = current['median'] / reference['median'] if reference['median'] else float('inf')
+            current['baseline_median'] = reference['median']
+            current['ratio'] = ratio
+            current['status'] = 'regression' if ratio > 1 + allowed else 'ok'
+            if current['status'] == 'regression':
+                regressions.append({'workload': name, 'ratio': ratio, 'allowed': 1 + allowed})
+
+        max_seconds = limits.get('max_seconds')
+        if max_seconds is not None and current['median'] > max_seconds:
+            current['status'] = 'regression'
+            regressions.append({'workload': name, 'median': current['median'], 'max_seconds': max_seconds})
+
+    return regressions
+
+
+def run_suite(client, db_name: str = 'panda_bench', symbols: int = 300, days: int = 60, extra_fields: int = 0,
+              minute_symbols: int = 20, minute_days: int = 3, minutes_per_day: int = 240, iterations: int = 3,
+              seed: int = 0, only: Optional[List[str]] = None) -> Dict:
+    """
+    Load the synthetic dataset through ``client`` and time every workload
+
+    Returns:
+        Result dict with ``meta`` and ``workloads`` sections (JSON serialisable)
+    """
+    use_mongo_client(client)
+    config = {'MONGO_DB': db_name}
+
+    load_start = time.perf_counter()
+    dataset = load_synthetic_dataset(
+        client[db_name],
+        symbols=symbols,
+        days=days,
+        extra_fields=extra_fields,
+        minute_symbols=minute_symbols,
+        minute_days=minute_days,
+        minutes_per_day=minutes_per_day,
+        seed=seed,
+    )
+    load_seconds = time.perf_counter() - load_start
+
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': type(client).__module__.split('.')[0],
+            'scale': {
+                'symbols': symbols,
+                'days': days,
+                'extra_fields': extra_fields,
+                'minute_symbols': minute_symbols,
+                'minute_days': minute_days,
+                'minutes_per_day': minutes_per_day,
+            },
+            'documents': dataset['counts'],
+            'load_seconds': load_seconds,
+            'iterations': iterations,
+            'seed': seed,
+        },
+        'workloads': {},
+    }
+
+    for workload in build_workloads(config, dataset):
+        if only and not any(workload['name'].startswith(prefix) for prefix in only):
+            continue
+        print(f"Running {workload['name']} ...")
+        stats = time_workload(workload['run'], workload.get('setup'), iterations=iterations)
+        results['workloads'][workload['name']] = stats
+        print(f"  rows={stats['rows']} median={stats['median']:.4f}s min={stats['min']:.4f}s")
+
+    return results
+
+
+def _make_client(backend: str, mongo_uri: str):
+    if backend == 'mongomock':
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("mongomock is not installed, run `pip install mongomock` or use --backend mongodb")
+        return mongomock.MongoClient()
+    from pymongo import MongoClient
+    return MongoClient(mongo_uri)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline benchmark suite for panda_data readers')
+    parser.add_argument('--backend', choices=['mongomock', 'mongodb'], default='mongomock',
+                        help='Run against an in-process mongomock client or a local MongoDB server')
+    parser.add_argument('--mongo-uri', type=str, default='mongodb://127.0.0.1:27017/',
+                        help='MongoDB connection string (mongodb backend only)')
+    parser.add_argument('--db-name', type=str, default='panda_bench',
+                        help='Scratch database name, its benchmark collections are dropped and reloaded')
+    parser.add_argument('--symbols', type=int, default=300, help='Number of symbols')
+    parser.add_argument('--days', type=int, default=60, help='Number of trading days')
+    parser.add_argument('--extra-fields', type=int, default=0, help='Additional float fields per document')
+    parser.add_argument('--minute-symbols', type=int, default=20, help='Number of symbols with minute bars')
+    parser.add_argument('--minute-days', type=int, default=3, help='Number of days with minute bars')
+    parser.add_argument('--minutes-per-day', type=int, default=240, help='Minute bars per symbol per day')
+    parser.add_argument('--iterations', type=int, default=3, help='Timed iterations per workload')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--only', type=str, nargs='+', help='Only run workloads with these name prefixes')
+    parser.add_argument('--output', type=str, help='Write results JSON to this path')
+    parser.add_argument('--baseline', type=str, help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown of the median versus the baseline')
+    args = parser.parse_args()
+
+    results = run_suite(
+        _make_client(args.backend, args.mongo_uri),
+        db_name=args.db_name,
+        symbols=args.symbols,
+        days=args.days,
+        extra_fields=args.extra_fields,
+        minute_symbols=args.minute_symbols,
+        minute_days=args.minute_days,
+        minutes_per_day=args.minutes_per_day,
+        iterations=args.iterations,
+        seed=args.seed,
+        only=args.only,
+    )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), tolerance=args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    print("\n=== BENCHMARK SUMMARY ===")
+    for name, stats in results['workloads'].items():
+        status = stats.get('status', '')
+        ratio = f" x{stats['ratio']:.2f}" if 'ratio' in stats else ''
+        print(f"{name:<40} {stats['median']:>9.4f}s {stats['rows']:>10} rows {status}{ratio}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) detected:")
+        for item in regressions:
+            print(f"  {item}")
+        sys.exit(1)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Synthetic market data generator for offline reader benchmarks.
+
+Generates ``stock_market``, ``factor_base`` and minute-bar collections with the
+same document layout the data hub cleaners write, at a configurable scale
+(symbols x days x fields), and loads them into a MongoDB database (a real
+server or a ``mongomock`` client).
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING
+
+# 与 MarketDataReader / FactorReader 的 index_component 过滤保持一致
+INDEX_COMPONENT_CODES = ['100', '010', '001', '000']
+INDEX_COMPONENT_WEIGHTS = [0.06, 0.10, 0.20, 0.64]
+
+MARKET_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'pre_close', 'limit_up', 'limit_down']
+FACTOR_BASE_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'market_cap', 'turnover', 'amount']
+MINUTE_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'total_turnover', 'num_trades']
+
+
+def make_symbols(count: int) -> List[str]:
+    """Generate ``count`` A-share style symbols spread across SZ/SH boards"""
+    prefixes = [('000', 'SZ'), ('300', 'SZ'), ('600', 'SH'), ('688', 'SH')]
+    symbols = []
+    for i in range(count):
+        prefix, suffix = prefixes[i % len(prefixes)]
+        symbols.append(f"{prefix}{i // len(prefixes) + 1:03d}.{suffix}")
+    return symbols
+
+
+def make_trading_dates(start_date: str, days: int) -> List[str]:
+    """Generate ``days`` weekday dates (YYYYMMDD) starting at ``start_date``"""
+    return [d.strftime('%Y%m%d') for d in pd.bdate_range(start=start_date, periods=days)]
+
+
+def generate_stock_market(symbols: List[str], dates: List[str], extra_fields: int = 0,
+                          seed: int = 0) -> pd.DataFrame:
+    """
+    Generate daily bars shaped like the ``stock_market`` collection
+
+    Args:
+        symbols: Stock symbols
+        dates: Trading dates in YYYYMMDD format
+        extra_fields: Number of additional float columns (``field_0`` ...) per document
+        seed: Random seed
+
+    Returns:
+        DataFrame with one row per (date, symbol)
+    """
+    rng = np.random.default_rng(seed)
+    n_symbols, n_days = len(symbols), len(dates)
+
+    # 按股票生成随机游走收盘价，保证 pre_close 与前一日 close 一致
+    returns = rng.normal(0.0, 0.02, size=(n_days, n_symbols))
+    base_price = rng.uniform(3.0, 150.0, size=n_symbols)
+    close = np.round(base_price * np.exp(np.cumsum(returns, axis=0)), 2)
+    pre_close = np.vstack([np.round(base_price, 2)[None, :], close[:-1]])
+    open_ = np.round(pre_close * (1 + rng.normal(0.0, 0.005, size=close.shape)), 2)
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0.0, 0.01, size=close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0.0, 0.01, size=close.shape)))
+
+    df = pd.DataFrame({
+        'date': np.repeat(dates, n_symbols),
+        'symbol': np.tile(symbols, n_days),
+        'open': open_.ravel(),
+        'high': np.round(high, 2).ravel(),
+        'low': np.round(low, 2).ravel(),
+        'close': close.ravel(),
+        'volume': rng.integers(1_000, 50_000_000, size=n_days * n_symbols).astype(float),
+        'pre_close': pre_close.ravel(),
+    })
+    df['limit_up'] = np.round(df['pre_close'] * 1.1, 2)
+    df['limit_down'] = np.round(df['pre_close'] * 0.9, 2)
+
+    # 指数成分与名称按股票固定，少量股票标记为 ST
+    components = rng.choice(INDEX_COMPONENT_CODES, size=n_symbols, p=INDEX_COMPONENT_WEIGHTS)
+    names = np.array([f"{'ST' if i % 50 == 0 else ''}股票{i:04d}" for i in range(n_symbols)])
+    df['index_component'] = np.tile(components, n_days)
+    df['name'] = np.tile(names, n_days)
+
+    for i in range(extra_fields):
+        df[f'field_{i}'] = rng.normal(size=len(df))
+    return df
+
+
+def generate_factor_base(market_df: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Derive ``factor_base`` documents from synthetic ``stock_market`` rows"""
+    rng = np.random.default_rng(seed + 1)
+    df = market_df[['date', 'symbol', 'open', 'high', 'low', 'close', 'volume']].copy()
+    shares = rng.uniform(1e8, 5e9, size=len(df))
+    df['market_cap'] = df['close'] * shares
+    df['turnover'] = df['volume'] / shares * 100
+    df['amount'] = df['volume'] * df['close']
+    return df
+
+
+def generate_minute_bars(symbols: List[str], dates: List[str], minutes_per_day: int = 240,
+                         seed: int = 0) -> pd.DataFrame:
+    """
+    Generate minute bars shaped like the ``stock_market_ticket_*`` collections
+
+    Args:
+        symbols: Stock symbols
+        dates: Trading dates in YYYYMMDD format
+        minutes_per_day: Bars per symbol per day (240 for a full A-share session)
+        seed: Random seed
+
+    Returns:
+        DataFrame with ``datetime`` (datetime), ``date`` (YYYYMMDDHHMM) and OHLCV columns
+    """
+    rng = np.random.default_rng(seed + 2)
+    # 上午 09:31-11:30，下午 13:01-15:00
+    session = [timedelta(hours=9, minutes=31 + i) for i in range(120)] + \
+              [timedelta(hours=13, minutes=1 + i) for i in range(120)]
+    offsets = [session[int(i * len(session) / minutes_per_day)] for i in range(minutes_per_day)]
+
+    stamps = [datetime.strptime(d, '%Y%m%d') + off for d in dates for off in offsets]
+    n_bars = len(stamps) * len(symbols)
+    close = np.round(rng.uniform(3.0, 150.0, size=n_bars), 2)
+    df = pd.DataFrame({
+        'datetime': np.repeat(stamps, len(symbols)),
+        'symbol': np.tile(symbols, len(stamps)),
+        'open': close,
+        'high': np.round(close * 1.002, 2),
+        'low': np.round(close * 0.998, 2),
+        'close': close,
+        'volume': rng.integers(100, 1_000_000, size=n_bars),
+        'num_trades': rng.integers(0, 500, size=n_bars),
+    })
+    df['total_turnover'] = df['volume'] * df['close']
+    df['date'] = df['datetime'].dt.strftime('%Y%m%d%H%M')
+    return df
+
+
+def _insert_frame(collection, df: pd.DataFrame, chunk_size: int = 50_000) -> int:
+    """Insert a DataFrame into ``collection`` in chunks, returns inserted count"""
+    inserted = 0
+    for start in range(0, len(df), chunk_size):
+        records = df.iloc[start:start + chunk_size].to_dict('records')
+        if records:
+            collection.insert_many(records, ordered=False)
+            inserted += len(records)
+    return inserted
+
+
+def load_synthetic_dataset(db, symbols: int = 300, days: int = 60, extra_fields: int = 0,
+                           start_date: str = '20240102', minute_symbols: int = 20, minute_days: int = 3,
+                           minutes_per_day: int = 240, partition_by_year: bool = True,
+                           minute_collection_for: Optional[Callable[[str], str]] = None,
+                           seed: int = 0) -> Dict:
+    """
+    Generate and load a synthetic dataset into ``db``
+
+    Args:
+        db: pymongo (or mongomock) database object
+        symbols: Number of stocks in ``stock_market``/``factor_base``
+        days: Number of trading days
+        extra_fields: Additional float columns per ``stock_market`` document
+        start_date: First trading date (YYYYMMDD)
+        minute_symbols: Number of stocks with minute bars
+        minute_days: Number of days with minute bars (taken from the start of the range)
+        minutes_per_day: Bars per stock per day
+        partition_by_year: Also write ``stock_market_{year}`` collections for PartitionedMarketDataReader
+        minute_collection_for: Maps a YYYYMMDD date to its minute collection name,
+            defaults to ``MarketStockCnMinReaderV3`` routing
+        seed: Random seed
+
+    Returns:
+        dict describing the generated dataset
+    """
+    symbol_list = make_symbols(symbols)
+    dates = make_trading_dates(start_date, days)
+    market_df = generate_stock_market(symbol_list, dates, extra_fields=extra_fields, seed=seed)
+    factor_df = generate_factor_base(market_df, seed=seed)
+
+    counts = {}
+    for name in ['stock_market', 'factor_base']:
+        db[name].drop()
+    counts['stock_market'] = _insert_frame(db['stock_market'], market_df)
+    counts['factor_base'] = _insert_frame(db['factor_base'], factor_df)
+    for name in ['stock_market', 'factor_base']:
+        db[name].create_index([('symbol', ASCENDING), ('date', ASCENDING)], name='symbol_date_idx')
+        db[name].create_index([('date', ASCENDING)])
+
+    if partition_by_year:
+        for year, year_df in market_df.groupby(market_df['date'].str[:4]):
+            name = f'stock_market_{year}'
+            db[name].drop()
+            counts[name] = _insert_frame(db[name], year_df)
+            db[name].create_index([('symbol', ASCENDING), ('date', ASCENDING)])
+
+    if minute_collection_for is None:
+        # 与 MarketStockCnMinReaderV3._get_collection_name 的路由规则一致
+        golang_cutoff = datetime(2025, 1, 1)
+        minute_collection_for = lambda d: ("stock_market_ticket_by_golang"
+                                           if datetime.strptime(d, '%Y%m%d') <= golang_cutoff
+                                           else "stock_market_ticket_zstd")
+    minute_dates = dates[:minute_days]
+    if minute_symbols and minute_dates:
+        minute_df = generate_minute_bars(symbol_list[:minute_symbols], minute_dates, minutes_per_day, seed=seed)
+        day_keys = minute_df['date'].str[:8]
+        for name in {minute_collection_for(d) for d in minute_dates}:
+            db[name].drop()
+        for day, day_df in minute_df.groupby(day_keys):
+            name = minute_collection_for(day)
+            counts[name] = counts.get(name, 0) + _insert_frame(db[name], day_df)
+        for name in {minute_collection_for(d) for d in minute_dates}:
+            db[name].create_index([('datetime', ASCENDING), ('symbol', ASCENDING)])
+
+    return {
+        'symbols': symbol_list,
+        'dates': dates,
+        'minute_symbols': symbol_list[:minute_symbols],
+        'minute_dates': minute_dates,
+        'fields': MARKET_FIELDS + [f'field_{i}' for i in range(extra_fields)],
+        'counts': counts,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load synthetic market data into MongoDB')
+    parser.add_argument('--mongo-uri', type=str, default='mongodb://127.0.0.1:27017/',
+                        help='MongoDB connection string')
+    parser.add_argument('--db-name', type=str, default='panda_bench', help='Target database name')
+    parser.add_argument('--symbols', type=int, default=300, help='Number of symbols')
+    parser.add_argument('--days', type=int, default=60, help='Number of trading days')
+    parser.add_argument('--extra-fields', type=int, default=0, help='Additional float fields per document')
+    parser.add_argument('--start-date', type=str, default='20240102', help='First trading date (YYYYMMDD)')
+    parser.add_argument('--minute-symbols', type=int, default=20, help='Number of symbols with minute bars')
+    parser.add_argument('--minute-days', type=int, default=3, help='Number of days with minute bars')
+    parser.add_argument('--minutes-per-day', type=int, default=240, help='Minute bars per symbol per day')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    dataset = load_synthetic_dataset(
+        MongoClient(args.mongo_uri)[args.db_name],
+        symbols=args.symbols,
+        days=args.days,
+        extra_fields=args.extra_fields,
+        start_date=args.start_date,
+        minute_symbols=args.minute_symbols,
+        minute_days=args.minute_days,
+        minutes_per_day=args.minutes_per_day,
+        seed=args.seed,
+    )
+    for name, count in dataset['counts'].items():
+        print(f"{name}: {count} documents")
@@ -1,5 +1,4 @@
 from datetime import datetime
-from pymongo import UpdateOne
 import pandas as pd
 import traceback
 from abc import ABC
@@ -8,6 +7,7 @@ from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
+from panda_data_hub.utils.write_strategies import write_records
 
 
 class RQStockMarketCleaner(ABC):
@@ -74,17 +74,8 @@ class RQStockMarketCleaner(ABC):
             merged_data = merged_data[desired_order]
             ensure_collection_and_indexes("stock_market")
             # 插入数据库
-            upsert_operations = []
-            for record in merged_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted market data for date: {date_str}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          merged_data.to_dict('records'), self.config)
         except Exception as e:
             logger.error({e})
 
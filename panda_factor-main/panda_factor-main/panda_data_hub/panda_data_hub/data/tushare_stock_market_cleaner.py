@@ -1,14 +1,14 @@
 import calendar
 from abc import ABC
 import tushare as ts
-from pymongo import UpdateOne
 import traceback
 from datetime import datetime
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
-from panda_data_hub.utils.ts_utils import calculate_upper_limit, calculate_lower_limit
+from panda_data_hub.utils.write_strategies import write_records
+from panda_data_hub.utils.market_clean_utils import calculate_limit_prices
 
 
 class TSStockMarketCleaner(ABC):
@@ -67,15 +67,8 @@ class TSStockMarketCleaner(ABC):
             price_data['ts_code'] = price_data['ts_code'].apply(get_exchange_suffix)
             price_data = price_data.rename(columns={'ts_code': 'symbol'})
             # 计算涨跌停价格
-            price_data['limit_up'] = None
-            price_data['limit_down'] = None
-            price_data['limit_up'] = price_data.apply(
-                lambda row: calculate_upper_limit(stock_code = row['symbol'], prev_close = row['pre_close'], stock_name = row['name']),
-                axis=1
-            )
-            price_data['limit_down'] = price_data.apply(
-                lambda row: calculate_lower_limit(stock_code = row['symbol'], prev_close = row['pre_close'], stock_name = row['name']),
-                axis=1
+            price_data['limit_up'], price_data['limit_down'] = calculate_limit_prices(
+                price_data['symbol'], price_data['pre_close'], price_data['name']
             )
             price_data['volume'] = price_data['volume'] * 100
             desired_order = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'pre_close',
@@ -84,17 +77,8 @@ class TSStockMarketCleaner(ABC):
             # 过滤掉北交所的股票
             price_data = price_data[~price_data['symbol'].str.contains('BJ')]
             ensure_collection_and_indexes(table_name='stock_market')
-            upsert_operations = []
-            for record in price_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted market data for date: {date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          price_data.to_dict('records'), self.config)
 
         except Exception as e:
             logger.error({e})
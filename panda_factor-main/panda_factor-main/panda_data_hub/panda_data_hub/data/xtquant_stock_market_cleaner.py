@@ -1,6 +1,5 @@
 from datetime import datetime
 
-from pymongo import UpdateOne
 import pandas as pd
 import traceback
 from abc import ABC
@@ -11,6 +10,7 @@ from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
+from panda_data_hub.utils.write_strategies import write_records
 from panda_data_hub.utils.xt_utils import xt_is_trading_day, XTQuantManager
 
 
@@ -107,17 +107,8 @@ class XTStockMarketCleaner(ABC):
             # 入库前创建集合及索引
             ensure_collection_and_indexes("stock_market")
             # 入库
-            upsert_operations = []
-            for record in final_df.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted market data for date: {date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          final_df.to_dict('records'), self.config)
 
         except Exception as e:
             logger.error({e})
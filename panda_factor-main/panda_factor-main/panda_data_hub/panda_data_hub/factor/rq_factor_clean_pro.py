@@ -4,11 +4,11 @@ from datetime import datetime
 import pandas as pd
 import rqdatac
 import traceback
-from pymongo import UpdateOne
 
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
+from panda_data_hub.utils.write_strategies import write_records
 from panda_data_hub.utils.rq_utils import get_ricequant_suffix
 
 
@@ -59,17 +59,8 @@ class RQFactorCleaner(ABC):
             desired_order = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'market_cap', 'turnover','amount']
             result_data = result_data[desired_order]
             ensure_collection_and_indexes(table_name='factor_base')
-            upsert_operations = []
-            for record in result_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['factor_base'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted factor data for date: {date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'factor_base',
+                          result_data.to_dict('records'), self.config)
 
         except Exception as e:
             error_msg = f"Failed to process market data for quarter : {str(e)}\nStack trace:\n{traceback.format_exc()}"
@@ -2,13 +2,13 @@ import traceback
 from abc import ABC
 
 import pandas as pd
-from pymongo import UpdateOne
 
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from datetime import datetime
 
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
+from panda_data_hub.utils.write_strategies import write_records
 from panda_data_hub.utils.xt_utils import xt_is_trading_day, get_xt_suffix, xt_get_total_volume, \
     xt_get_amount, XTQuantManager
 
@@ -61,16 +61,8 @@ class XTFactorCleaner(ABC):
             data['amount'] = data['stock_code'].apply(lambda code: xt_get_amount(code, date))
             data = data.drop(columns=['TotalVolume', 'stock_code'])
             ensure_collection_and_indexes(table_name='factor_base')
-            upsert_operations = []
-            for record in data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['factor_base'].bulk_write(upsert_operations)
-                logger.info(f"Successfully upserted factor data for date:{date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'factor_base',
+                          data.to_dict('records'), self.config)
         except Exception as e:
             error_msg = f"Failed to process factor for quanter: {e}"
             logger.error(error_msg)
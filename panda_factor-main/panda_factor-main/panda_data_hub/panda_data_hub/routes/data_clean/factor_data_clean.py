@@ -4,12 +4,26 @@ from typing import Dict
 
 from panda_data_hub.services.rq_factor_clean_pro_service import FactorCleanerProService
 from panda_data_hub.services.ts_factor_clean_pro_service import FactorCleanerTSProService
+from panda_data_hub.utils.backfill import BackfillJob
 # from panda_data_hub.services.xt_factor_clean_pro_service import FactorCleanerXTProService
 
 router = APIRouter()
 
+
+def _clean_factor(service, clean_range, data_source, start_date, end_date, force, progress_callback):
+    if force:
+        service.set_progress_callback(progress_callback)
+        clean_range(start_date, end_date)
+        return
+    # 以 stock_market 为参照，只回补因子记录缺失或少于行情记录的交易日
+    service.set_progress_callback(None)
+    job = BackfillJob(config, 'factor_base', job_name=f'factor_base:{data_source}', reference_table='stock_market')
+    job.run(start_date, end_date, clean_range, progress_callback)
+
+
 @router.get('/upsert_factor_final')
-async def upsert_factor(start_date: str, end_date: str, background_tasks: BackgroundTasks):
+async def upsert_factor(start_date: str, end_date: str, background_tasks: BackgroundTasks, force: bool = False):
+    """ 清洗区间内的因子数据，默认只回补缺失的交易日并记录检查点，force=True 时重洗整个区间 """
     global current_progress
     current_progress = 0  # 重置进度
 
@@ -21,19 +35,28 @@ async def upsert_factor(start_date: str, end_date: str, background_tasks: Backgr
 
     if data_source == 'ricequant':
         rice_quant_service = FactorCleanerProService(config)
-        rice_quant_service.set_progress_callback(progress_callback)
         background_tasks.add_task(
+            _clean_factor,
+            rice_quant_service,
             rice_quant_service.clean_history_data,
+            data_source,
             start_date,
-            end_date
+            end_date,
+            force,
+            progress_callback
         )
     elif data_source == 'tushare':
         tushare_service = FactorCleanerTSProService(config)
-        tushare_service.set_progress_callback(progress_callback)
         background_tasks.add_task(
+            _clean_factor,
+            tushare_service,
             tushare_service.clean_history_data,
-           start_date,
-            end_date)
+            data_source,
+            start_date,
+            end_date,
+            force,
+            progress_callback
+        )
     # elif data_source == 'xuntou':
     #     xt_quant_service = FactorCleanerXTProService(config)
     #     xt_quant_service.set_progress_callback(progress_callback)
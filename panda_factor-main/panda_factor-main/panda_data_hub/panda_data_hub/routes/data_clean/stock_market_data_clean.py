@@ -6,14 +6,33 @@ from panda_common.config import config
 
 from panda_data_hub.services.rq_stock_market_clean_service import StockMarketCleanRQServicePRO
 from panda_data_hub.services.ts_stock_market_clean_service import StockMarketCleanTSServicePRO
+from panda_data_hub.utils.backfill import BackfillJob
 # from panda_data_hub.services.xt_download_service import XTDownloadService
 
 # from panda_data_hub.services.xt_stock_market_clean_service import StockMarketCleanXTServicePRO
 
 router = APIRouter()
 
+
+def _clean_stock_market(service, clean_range, data_source, start_date, end_date, force, progress_callback):
+    if force:
+        service.set_progress_callback(progress_callback)
+        clean_range(start_date, end_date)
+        return
+    # 回补时进度由任务按已处理的交易日汇报，不使用服务内按区段计算的进度
+    service.set_progress_callback(None)
+    job = BackfillJob(config, 'stock_market', job_name=f'stock_market:{data_source}')
+    job.run(start_date, end_date, clean_range, progress_callback)
+
+
 @router.get('/upsert_stockmarket_final')
-async def upsert_stockmarket(start_date: str, end_date: str, background_tasks: BackgroundTasks):
+async def upsert_stockmarket(start_date: str, end_date: str, background_tasks: BackgroundTasks, force: bool = False):
+    """
+    清洗区间内的行情数据
+
+    默认只回补缺失或不完整的交易日，并在 backfill_jobs 中记录检查点，中断后重新请求同一区间会从检查点继续；
+    force=True 时重洗整个区间。
+    """
     global current_progress
     current_progress = 0  # 重置进度
 
@@ -25,20 +44,28 @@ async def upsert_stockmarket(start_date: str, end_date: str, background_tasks: B
 
     if data_source  == 'ricequant':
         rice_quant_service = StockMarketCleanRQServicePRO(config)
-        rice_quant_service.set_progress_callback(progress_callback)
         # 在后台运行数据清洗任务
         background_tasks.add_task(
+            _clean_stock_market,
+            rice_quant_service,
             rice_quant_service.stock_market_clean_by_time,
+            data_source,
             start_date,
-            end_date
+            end_date,
+            force,
+            progress_callback
         )
     elif data_source == 'tushare':
         tushare_service = StockMarketCleanTSServicePRO(config)
-        tushare_service.set_progress_callback(progress_callback)
         background_tasks.add_task(
+            _clean_stock_market,
+            tushare_service,
             tushare_service.stock_market_history_clean,
+            data_source,
             start_date,
-            end_date
+            end_date,
+            force,
+            progress_callback
         )
     # elif data_source == 'xuntou':
     #     xt_quant_service = StockMarketCleanXTServicePRO(config)
@@ -1,11 +1,10 @@
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-import pandas as pd
-from chinese_calendar import is_holiday
-from chinese_calendar import is_workday
 from datetime import datetime
 from panda_common.handlers.database_handler import DatabaseHandler
-
+from panda_common.utils.trading_calendar import get_trading_calendar
+from panda_data_hub.utils.mongo_utils import count_documents_by_date, daily_count_cache
 
 
 class StockStatisticQuery(ABC):
@@ -59,30 +58,23 @@ class StockStatisticQuery(ABC):
                 date_list.append(current_date.strftime("%Y%m%d"))
             current_date += timedelta(days=1)
 
-        # 初始化集合连接
-        collections = {
-            table: self.db_handler.mongo_client[self.config["MONGO_DB"]][table]
-            for table in table_list
-        }
+        # 每个表一次聚合取当前页所有日期的记录数，各表并发查询
+        db = self.db_handler.mongo_client[self.config["MONGO_DB"]]
+        with ThreadPoolExecutor(max_workers=len(table_list)) as executor:
+            counts = dict(zip(table_list, executor.map(
+                lambda table: self.get_daily_counts(db, table, date_list), table_list
+            )))
 
-        # 查询所有表的记录数
         result = []
         for date in date_list:
             date_stats = {"date": date}
-            stock_market_count = None
-
-            # 查询每个表的记录数
+            stock_market_count = counts[table_list[0]].get(date, 0)
             for i, table in enumerate(table_list):
-                count = collections[table].count_documents({"date": date})
+                count = counts[table].get(date, 0)
                 date_stats[f"{table}_count"] = count
-
-                # 保存stock_market的count
-                if i == 0:
-                    stock_market_count = count
                 # 计算其他表与stock_market的差值
-                elif stock_market_count is not None:
+                if i > 0:
                     date_stats[f"{table}_difference"] = stock_market_count - count
-
             result.append(date_stats)
 
         # 排序功能实现
@@ -106,33 +98,25 @@ class StockStatisticQuery(ABC):
             }
         }
 
-    def get_trading_days(self, start_date, end_date):
-        """
-        完全基于中国日历的实现
+    def get_daily_counts(self, db, table, dates):
         """
-        # 转换日期格式
-        start = datetime.strptime(start_date, '%Y%m%d')
-        end = datetime.strptime(end_date, '%Y%m%d')
+        统计 table 在 dates 中每天的记录数
 
-        # 获取所有日期
-        all_days = pd.date_range(start, end)
+        已收盘日期优先取缓存，其余日期用一次 $match + $group 聚合查询
 
-        trading_days = []
-
-        for day in all_days:
-            day_date = day.to_pydatetime()
-
-            # 基本过滤条件
-            if day_date.weekday() >= 5:  # 周六周日
-                # 特别处理调休日：虽然是周末但是工作日
-                if is_workday(day_date):
-                    continue  # 股市周末休市，即使调休
-                else:
-                    continue  # 正常周末
-            else:  # 周一至周五
-                if is_holiday(day_date):
-                    continue  # 法定节假日
+        :return: {日期: 记录数}，没有记录的日期不在结果中
+        """
+        counts, missing = daily_count_cache.get_many(db.name, table, dates)
+        if not missing:
+            return counts
 
-            trading_days.append(day_date.strftime('%Y%m%d'))
+        fetched = count_documents_by_date(db, table, missing)
+        counts.update(fetched)
+        daily_count_cache.put_many(db.name, table, fetched)
+        return counts
 
-        return trading_days
\ No newline at end of file
+    def get_trading_days(self, start_date, end_date):
+        """
+        获取区间内的交易日 (YYYYMMDD)，基于进程内共享的交易日历
+        """
+        return get_trading_calendar(self.config).trading_days(start_date, end_date)
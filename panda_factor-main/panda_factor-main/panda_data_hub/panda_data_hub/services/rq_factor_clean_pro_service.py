@@ -1,16 +1,13 @@
 from abc import ABC
-from concurrent.futures import ThreadPoolExecutor
-from pymongo import UpdateOne
-from tqdm import tqdm
 
 import pandas as pd
 import rqdatac
 import traceback
-from datetime import datetime
-import time
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
-from panda_data_hub.utils.mongo_utils import  ensure_collection_and_indexes
+from panda_data_hub.utils.factor_clean_utils import code_map, load_stock_market, log_windows_result, run_windows, \
+    write_factor_partitions
+from panda_data_hub.utils.fetch_scheduler import get_endpoint
 from panda_data_hub.utils.rq_utils import get_ricequant_suffix
 
 
@@ -24,6 +21,7 @@ class FactorCleanerProService(ABC):
             rqdatac.init(config['MUSER'], config['MPASSWORD'])
             logger.info("RiceQuant initialized successfully")
             rqdatac.info()
+            self.endpoint = get_endpoint('ricequant', config)
         except Exception as e:
             error_msg = f"Failed to initialize RiceQuant: {str(e)}\nStack trace:\n{traceback.format_exc()}"
             logger.error(error_msg)
@@ -34,99 +32,57 @@ class FactorCleanerProService(ABC):
         self.progress_callback = callback
 
     def clean_history_data(self, start_date, end_date):
-        """补全历史数据"""
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        trading_days = []
-        for date in date_range:
-            date_str = datetime.strftime(date, "%Y-%m-%d")
-            trading_days.append(date_str)
-        total_days = len(trading_days)
-        processed_days = 0
-        with tqdm(total=len(trading_days), desc="Processing Trading Days") as pbar:
-            # 分批处理，每批5天
-            batch_size = 5
-            for i in range(0, len(trading_days), batch_size):
-                batch_days = trading_days[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=8) as executor:
-                    futures = []
-                    for date in batch_days:
-                        futures.append(
-                            executor.submit(
-                                self.clean_daily_data,
-                                date_str=date,
-                                pbar=pbar
-                            ))
-                    # 等待当前批次的所有任务完成
-                    for future in futures:
-                        try:
-                            future.result()
-                            processed_days += 1
-                            progress = int((processed_days / total_days) * 100)
-                            # 更新进度
-                            if self.progress_callback:
-                                self.progress_callback(progress)
-                            pbar.update(1)
-                        except Exception as e:
-                            logger.error(f"Task failed: {e}")
-                            pbar.update(1)  # 即使任务失败也更新进度条
+        """补全历史数据：按时间窗口整段读取行情、合并基本面并按日批量写入"""
+        _, failures = run_windows(start_date, end_date, self.clean_range_data,
+                                  progress_callback=self.progress_callback)
+        log_windows_result(failures)
 
-                # 批次之间添加短暂延迟，避免连接数超限
-                if i + batch_size < len(trading_days):
-                    logger.info(
-                        f"完成批次 {i // batch_size + 1}/{(len(trading_days) - 1) // batch_size + 1}，等待10秒后继续...")
-                    time.sleep(10)
-        logger.info("因子数据清洗全部完成！！！")
-
-    def clean_daily_data(self, date_str, pbar):
+    def clean_daily_data(self, date_str, pbar=None):
         """补全当日数据"""
+        date = date_str.replace('-', '')
+        self.clean_range_data(date, date)
+
+    def clean_range_data(self, start_date, end_date):
+        """
+        清洗 [start_date, end_date] (YYYYMMDD) 内的因子数据
+
+        stock_market 一次区间查询读出，市值、成交额、换手率各用一次区间请求取回，
+        再与行情做一次 (date, order_book_id) 合并。
+        """
         try:
-            date = date_str.replace('-', '')
-            query = {"date": date}
-            records = self.db_handler.mongo_find(self.config["MONGO_DB"], 'stock_market', query)
-            if records is None or len(records) == 0:
-                logger.info(f"records none for {date}")
-                return
+            db = self.db_handler.mongo_client[self.config["MONGO_DB"]]
+            data = load_stock_market(db, start_date, end_date)
+            if data.empty:
+                logger.info(f"records none for {start_date}~{end_date}")
+                return 0
+            data['order_book_id'] = code_map(data['symbol'], get_ricequant_suffix)
+            order_book_id_list = data['order_book_id'].drop_duplicates().tolist()
 
-            data = pd.DataFrame(list(records))
-            data = data[['date', 'symbol', 'open','high','low','close','volume']]
-            data['order_book_id'] = data['symbol'].apply(get_ricequant_suffix)
-            order_book_id_list = data['order_book_id'].tolist()
             logger.info("正在获取市值数据......")
-            market_cap_data = rqdatac.get_factor(order_book_ids=order_book_id_list, factor=['market_cap'], start_date=date,
-                                          end_date=date)
-            merge_1 = data.merge(market_cap_data['market_cap'], on='order_book_id', how='left')
+            market_cap_data = self.endpoint.call(rqdatac.get_factor, order_book_ids=order_book_id_list,
+                                                 factor=['market_cap'], start_date=start_date, end_date=end_date)
             logger.info("正在获取成交额数据......")
-            price_data = rqdatac.get_price(order_book_ids=order_book_id_list, start_date=date, end_date=date,
-                                           adjust_type='none')
-            merge_2 = merge_1.merge(price_data['total_turnover'], on='order_book_id', how='left')
+            price_data = self.endpoint.call(rqdatac.get_price, order_book_ids=order_book_id_list,
+                                            start_date=start_date, end_date=end_date, fields=['total_turnover'],
+                                            adjust_type='none')
             logger.info("正在获取换手率数据......")
-            turnover_data = rqdatac.get_turnover_rate(
+            turnover_data = self.endpoint.call(
+                rqdatac.get_turnover_rate,
                 order_book_ids=order_book_id_list,
-                start_date=date,
-                end_date=date,
+                start_date=start_date,
+                end_date=end_date,
                 fields=['today']
             )
-            result_data = merge_2.merge(turnover_data['today'], on='order_book_id', how='left')
-            result_data = result_data.drop(columns=['order_book_id'])
-            result_data = result_data.rename(columns={'today': 'turnover'})
+
+            result_data = data
+            for vendor_data in (market_cap_data[['market_cap']], price_data[['total_turnover']],
+                                turnover_data[['today']]):
+                result_data = result_data.merge(_by_order_book_id_and_date(vendor_data),
+                                                on=['order_book_id', 'date'], how='left')
+            result_data = result_data.rename(columns={'today': 'turnover', 'total_turnover': 'amount'})
             result_data['market_cap'] = result_data['market_cap'].fillna(0)
             result_data['turnover'] = result_data['turnover'].fillna(0)
-            result_data = result_data.rename(columns={'total_turnover': 'amount'})
-            desired_order = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'market_cap', 'turnover','amount']
-            result_data = result_data[desired_order]
-            ensure_collection_and_indexes(table_name='factor_base')
-            upsert_operations = []
-            for record in result_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['factor_base'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted factor data for date: {date}")
-
+            return write_factor_partitions(db, result_data, self.config)
 
         except Exception as e:
             error_msg = f"Failed to process market data for quarter : {str(e)}\nStack trace:\n{traceback.format_exc()}"
@@ -134,19 +90,10 @@ class FactorCleanerProService(ABC):
             raise
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def _by_order_book_id_and_date(frame):
+    """把米筐 (order_book_id, 日期) 双层索引的结果展开成 order_book_id、date(YYYYMMDD) 两列"""
+    frame = frame.reset_index()
+    id_column, date_column = frame.columns[:2]
+    frame = frame.rename(columns={id_column: 'order_book_id'})
+    frame['date'] = pd.to_datetime(frame.pop(date_column)).dt.strftime('%Y%m%d')
+    return frame
@@ -1,19 +1,20 @@
-import time
 from datetime import datetime
 
-from pymongo import UpdateOne
 
-from tqdm import tqdm
 import pandas as pd
 import traceback
 from abc import ABC
 import rqdatac
-from concurrent.futures import ThreadPoolExecutor
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
+from panda_common.utils.trading_calendar import get_trading_calendar
+from panda_data_hub.utils.fetch_scheduler import run_tasks
+from panda_data_hub.utils.market_clean_utils import asof_stock_names, components_to_frame, fill_missing_limit_prices, \
+    log_market_clean_result, mark_index_components, partition_by_date
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
-from panda_data_hub.utils.rq_utils import get_index_components, rq_is_trading_day
+from panda_data_hub.utils.write_strategies import write_records
+from panda_data_hub.utils.rq_utils import get_index_components, rq_get_trading_dates
 
 
 class StockMarketCleanRQServicePRO(ABC):
@@ -24,6 +25,8 @@ class StockMarketCleanRQServicePRO(ABC):
         self.hs300_components = None
         self.zz500_components = None
         self.zz1000_components = None
+        self.index_constituents = []
+        self.current_names = None
         self.progress_callback = None
         try:
             rqdatac.init(config['MUSER'], config['MPASSWORD'])
@@ -41,95 +44,76 @@ class StockMarketCleanRQServicePRO(ABC):
 
         logger.info("Starting market data cleaning for rqdatac")
         # 获取所有股票代码
-        symbol_list = rqdatac.all_instruments(type='CS', market='cn', date=None)
-        symbol_list = symbol_list['order_book_id']
+        instruments = rqdatac.all_instruments(type='CS', market='cn', date=None)
+        symbol_list = instruments['order_book_id']
+        # 股票当前名称，用于没有换名记录的股票
+        self.current_names = instruments.drop_duplicates('order_book_id').set_index('order_book_id')['symbol']
         #  获取所有日期股票的历史行情
         price_data = rqdatac.get_price(order_book_ids=symbol_list, start_date=start_date, end_date=end_date,adjust_type='none')
+        # 按日期切分一次，各线程只拿到当日的只读切片，不再逐日复制整段行情
+        price_data.reset_index(drop=False, inplace=True)
+        daily_price_data = partition_by_date(price_data, 'date')
+        del price_data
         # 获取所有日期的所有股票的历史名称变更信息
         symbol_change_info = rqdatac.get_symbol_change_info(symbol_list)
+        symbol_change_info.reset_index(drop=False, inplace=True)
         # 获取所有日期的指数成分股票
         self.hs300_components,self.zz500_components,self.zz1000_components = get_index_components(start_date, end_date)
-        # 获取交易日
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        trading_days = []
-        for date in date_range:
-            date_str = datetime.strftime(date, "%Y-%m-%d")
-            if rq_is_trading_day(date_str):
-                trading_days.append(date_str)
-            else:
-                logger.info(f"跳过非交易日: {date_str}")
+        # 整理成 (date, symbol) 长表，按日清洗时直接做集合匹配
+        self.index_constituents = [components_to_frame(components) for components in
+                                   (self.hs300_components, self.zz500_components, self.zz1000_components)]
+        # 获取交易日：使用共享交易日历，整段区间最多查询一次数据源
+        trading_days = get_trading_calendar(self.config).trading_days(
+            start_date, end_date, fmt='%Y-%m-%d', source=rq_get_trading_dates)
         logger.info(f"找到 {len(trading_days)} 个交易日需要处理")
-        # 根据交易日去循环
-        total_days = len(trading_days)
-        processed_days = 0
-        with tqdm(total=len(trading_days), desc="Processing Trading Days") as pbar:
-            # 分批处理，每批8天
-            batch_size = 8
-            for i in range(0, len(trading_days), batch_size):
-                batch_days = trading_days[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = []
-                    for date in batch_days:
-                        futures.append(executor.submit(
-                            self.clean_meta_market_data,
-                            price_data_origin = price_data,
-                            symbol_change_info_origin = symbol_change_info,
-                            date = date
-                        ))
-
-                    # 等待当前批次的所有任务完成
-                    for future in futures:
-                        try:
-                            future.result()
-                            processed_days += 1
-                            progress = int((processed_days / total_days) * 100)
-
-                            # 更新进度
-                            if self.progress_callback:
-                                self.progress_callback(progress)
-                            pbar.update(1)
-                        except Exception as e:
-                            logger.error(f"Task failed: {e}")
-                            pbar.update(1)  # 即使任务失败也更新进度条
-
-                # 批次之间添加短暂延迟，避免连接数超限
-                if i + batch_size < len(trading_days):
-                    logger.info(
-                        f"完成批次 {i // batch_size + 1}/{(len(trading_days) - 1) // batch_size + 1}，等待5秒后继续...")
-                    time.sleep(5)
-
-        logger.info("所有交易日数据处理完成")
-
-    def clean_meta_market_data(self,price_data_origin, symbol_change_info_origin,date):
+        # 行情已整段取回，按日任务不再调用数据源，无需批次间等待
+        def clean_day(date):
+            self.clean_meta_market_data(
+                price_daily_data=daily_price_data.get(pd.Timestamp(date)),
+                symbol_change_info=symbol_change_info,
+                date=date
+            )
+
+        failures = run_tasks(clean_day, trading_days, max_workers=10, progress_callback=self.progress_callback)
+        log_market_clean_result(failures)
+        return failures
+
+    def clean_meta_market_data(self, price_daily_data, symbol_change_info, date):
+        """
+        清洗并写入一个交易日的行情
+
+        Args:
+            price_daily_data: 当日行情切片（由 partition_by_date 生成，只读，多个线程共享同一底层数据）
+            symbol_change_info: 全部股票的名称变更历史（只读）
+            date: 日期字符串，格式为 "YYYY-MM-DD"
+        """
         try:
-            # 为保证线程安全，特此加上副本
-            price_data = price_data_origin.copy()
-            symbol_change_info =symbol_change_info_origin.copy()
-            # 重置股票行情数据索引
-            price_data.reset_index(drop=False,inplace=True)
-            symbol_change_info.reset_index(drop=False, inplace=True)
-            # 获得指定日期的股票行情数据
-            price_daily_data = price_data[price_data['date'] == date]
-
-            # 洗 index_components列
-            price_daily_data['index_component'] = None
-            for idx, row in price_daily_data.iterrows():
-                try:
-                    component = self.clean_index_components(data_symbol=row['order_book_id'],date=date)
-                    price_daily_data.at[idx, 'index_component'] = component
-                except Exception as e:
-                    logger.error(f"Failed to clean index for {row['order_book_id']} on {date}: {str(e)}")
-                    continue
+            if price_daily_data is None or price_daily_data.empty:
+                logger.info(f"无行情数据: {date}")
+                return
+
+            # 洗 index_components列，新增列只复制当日切片，不修改共享数据
+            price_daily_data = price_daily_data.assign(index_component=mark_index_components(
+                price_daily_data,
+                symbol_col='order_book_id',
+                date_col='date',
+                constituents=self.index_constituents
+            ))
 
             # 洗name列
-            price_daily_data['name'] = None
-            for idx, row in price_daily_data.iterrows():
-                try:
-                    stock_name = self.clean_stock_name(symbol_change_info = symbol_change_info,data_symbol=row['order_book_id'], date=date)
-                    price_daily_data.at[idx, 'name'] = stock_name
-                except Exception as e:
-                    logger.error(f"Failed to clean index for {row['order_book_id']} on {date}: {str(e)}")
-                    continue
+            price_daily_data['name'] = asof_stock_names(
+                price_daily_data,
+                symbol_col='order_book_id',
+                date_col='date',
+                changes=symbol_change_info,
+                change_symbol_col='order_book_id',
+                change_date_col='change_date',
+                change_name_col='symbol',
+                current_names=self.current_names
+            )
+
+            # 米筐未给出涨跌停价的记录按规则补齐
+            price_daily_data = fill_missing_limit_prices(price_daily_data, 'order_book_id', 'prev_close', 'name')
 
             # 洗其他列
             price_daily_data = price_daily_data.drop(columns=['num_trades', 'total_turnover'])
@@ -143,56 +127,10 @@ class StockMarketCleanRQServicePRO(ABC):
             # 检索数据库索引
             ensure_collection_and_indexes(table_name = 'stock_market')
             # 执行插入操作
-            upsert_operations = []
-            for record in price_daily_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted market data for date: {date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          price_daily_data.to_dict('records'), self.config)
 
         except Exception as e:
-            logger.error({e})
-
-    def clean_index_components(self,data_symbol,date):
-        try:
-            target_date = pd.to_datetime(date)
-            # 初始化标记
-            # index_mark = '000'
-            if self.hs300_components and target_date in self.hs300_components and data_symbol in self.hs300_components[target_date]:
-                index_mark = '100'
-            elif  self.zz500_components and target_date in self.zz500_components and data_symbol in self.zz500_components[target_date]:
-                index_mark = '010'
-            elif self.zz1000_components and target_date in self.zz1000_components and data_symbol in self.zz1000_components[target_date]:
-                index_mark = '001'
-            else:
-                index_mark = '000'
-            return index_mark
-        except Exception as e:
-            logger.error(f"Error checking if {data_symbol} is in index components on {date}: {str(e)}")
-            return None  # 或者返回其他默认值
-
-
-    def clean_stock_name(self,symbol_change_info,data_symbol,date):
-        try:
-            daily_info = symbol_change_info[symbol_change_info['order_book_id'] == data_symbol]
-
-            valid_changes = daily_info[daily_info['change_date'] <= date]
-            if not valid_changes.empty:
-                # 按开始日期排序，获取最新的变更记录
-                # valid_changes.reset_index(inplace=True, drop=False)
-                latest_change = valid_changes.sort_values('change_date', ascending=False).iloc[0]
-                latest_symbol = latest_change['symbol']
-                return latest_symbol
-            else:
-                stock_info = rqdatac.instruments(order_book_ids=data_symbol)
-                current_name = stock_info.symbol
-                return current_name
-
-        except Exception as e:
-            logger.error(f"Error checking if {data_symbol} is in index components on {date}: {str(e)}")
-            return None  # 或者返回其他默认值
\ No newline at end of file
+            # 抛给 run_tasks 记为失败日期，便于汇总和回补
+            logger.error(f"清洗 {date} 行情失败: {str(e)}")
+            raise
@@ -1,16 +1,13 @@
 from abc import ABC
 import tushare as ts
-from pymongo import UpdateOne
 import traceback
 
 import pandas as pd
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
-import time
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
-from panda_data_hub.utils.mongo_utils import  ensure_collection_and_indexes
+from panda_data_hub.utils.factor_clean_utils import WindowCleanError, code_map, load_stock_market, \
+    log_windows_result, run_windows, write_factor_partitions
+from panda_data_hub.utils.fetch_scheduler import get_endpoint, run_tasks
 from panda_data_hub.utils.ts_utils import get_tushare_suffix
 
 
@@ -23,6 +20,7 @@ class FactorCleanerTSProService(ABC):
         try:
             ts.set_token(config['TS_TOKEN'])
             self.pro = ts.pro_api()
+            self.endpoint = get_endpoint('tushare', config)
         except Exception as e:
             error_msg = f"Failed to initialize tushare: {str(e)}\nStack trace:\n{traceback.format_exc()}"
             logger.error(error_msg)
@@ -32,92 +30,62 @@ class FactorCleanerTSProService(ABC):
         self.progress_callback = callback
 
     def clean_history_data(self, start_date, end_date):
-        """补全历史数据"""
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        trading_days = []
-        for date in date_range:
-            date_str = datetime.strftime(date, "%Y-%m-%d")
-            trading_days.append(date_str)
-        total_days = len(trading_days)
-        processed_days = 0
-        with tqdm(total=len(trading_days), desc="Processing Trading Days") as pbar:
-            # 分批处理，每批10天
-            batch_size = 10
-            for i in range(0, len(trading_days), batch_size):
-                batch_days = trading_days[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=8) as executor:
-                    futures = []
-                    for date in batch_days:
-                        futures.append(
-                            executor.submit(
-                                self.clean_daily_data,
-                                date_str=date,
-                                pbar=pbar
-                            ))
-                    # 等待当前批次的所有任务完成
-                    for future in futures:
-                        try:
-                            future.result()
-                            processed_days += 1
-                            progress = int((processed_days / total_days) * 100)
+        """补全历史数据：按时间窗口整段读取行情、合并基本面并按日批量写入"""
+        _, failures = run_windows(start_date, end_date, self.clean_range_data,
+                                  progress_callback=self.progress_callback)
+        log_windows_result(failures)
 
-                            # 更新进度
-                            if self.progress_callback:
-                                self.progress_callback(progress)
-                            pbar.update(1)
-                        except Exception as e:
-                            logger.error(f"Task failed: {e}")
-                            pbar.update(1)  # 即使任务失败也更新进度条
+    def clean_daily_data(self, date_str, pbar=None):
+        """补全当日数据"""
+        date = date_str.replace('-', '')
+        self.clean_range_data(date, date)
 
-                # 批次之间添加短暂延迟，避免连接数超限
-                if i + batch_size < len(trading_days):
-                    logger.info(
-                        f"完成批次 {i // batch_size + 1}/{(len(trading_days) - 1) // batch_size + 1}，等待10秒后继续...")
-                    time.sleep(10)
-        logger.info("因子数据清洗全部完成！！！")
+    def clean_range_data(self, start_date, end_date):
+        """
+        清洗 [start_date, end_date] (YYYYMMDD) 内的因子数据
 
-    def clean_daily_data(self, date_str, pbar):
-        """补全当日数据(历史循环补充)"""
+        stock_market 一次区间查询读出；tushare 的 daily_basic/daily 只能按交易日拉全市场，
+        各日请求经 tushare 端点限流并发获取，拼接后与行情做一次 (date, ts_code) 合并。
+        获取失败的交易日不写入，其余交易日写入后抛出 WindowCleanError。
+        """
         try:
-            date = date_str.replace('-', '')
-            query = {"date": date}
-            records = self.db_handler.mongo_find(self.config["MONGO_DB"], 'stock_market', query)
-            if records is None or len(records) == 0:
-                logger.info(f"records none for {date}")
-                return
+            db = self.db_handler.mongo_client[self.config["MONGO_DB"]]
+            data = load_stock_market(db, start_date, end_date)
+            if data.empty:
+                logger.info(f"records none for {start_date}~{end_date}")
+                return 0
+            data['ts_code'] = code_map(data['symbol'], get_tushare_suffix)
+            trading_days = sorted(data['date'].unique())
 
-            data = pd.DataFrame(list(records))
-            data = data[['date', 'symbol', 'open','high','low','close','volume']]
-            data['ts_code'] = data['symbol'].apply(get_tushare_suffix)
+            logger.info(f"正在获取 {len(trading_days)} 个交易日的市值、换手率和成交额数据......")
+            vendor_frames = {}
 
-            logger.info("正在获取市值和换手率数据......")
-            factor_data = self.pro.query('daily_basic', trade_date=date,fields=['ts_code','turnover_rate','total_mv'])
-            temp_data = data.merge(factor_data[['ts_code','turnover_rate','total_mv']], on='ts_code', how='left')
-            temp_data = temp_data.rename(columns={'total_mv': 'market_cap'})
-            temp_data = temp_data.rename(columns={'turnover_rate': 'turnover'})
-            logger.info("正在获取成交额数据......")
-            price_data = self.pro.query("daily", trade_date=date, fields=['ts_code', 'amount'])
-            result_data = temp_data.merge(price_data[['ts_code', 'amount']], on='ts_code', how='left')
-            result_data = result_data.drop(columns=['ts_code'])
-            # tushare的成交额是以千元为单位的
-            result_data['amount'] = result_data['amount']*1000
-            result_data['market_cap'] = result_data['market_cap'] * 10000
-            desired_order = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'market_cap', 'turnover','amount']
-            result_data = result_data[desired_order]
-            ensure_collection_and_indexes(table_name='factor_base')
-            upsert_operations = []
-            for record in result_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['factor_base'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted factor data for date: {date}")
+            def fetch_day(date):
+                factor_data = self.endpoint.call(self.pro.query, 'daily_basic', trade_date=date,
+                                                 fields=['ts_code', 'trade_date', 'turnover_rate', 'total_mv'])
+                price_data = self.endpoint.call(self.pro.query, "daily", trade_date=date,
+                                                fields=['ts_code', 'trade_date', 'amount'])
+                vendor_frames[date] = factor_data.merge(price_data, on=['ts_code', 'trade_date'], how='outer')
+
+            failures = run_tasks(fetch_day, trading_days, max_workers=4, desc="Fetching daily_basic")
+            if failures:
+                data = data[~data['date'].isin(failures)]
+                if not vendor_frames:
+                    raise WindowCleanError(failures)
 
+            vendor_data = pd.concat(vendor_frames.values(), ignore_index=True).rename(
+                columns={'trade_date': 'date', 'total_mv': 'market_cap', 'turnover_rate': 'turnover'})
+            result_data = data.merge(vendor_data, on=['date', 'ts_code'], how='left')
+            # tushare的成交额是以千元为单位的，市值以万元为单位
+            result_data['amount'] = result_data['amount'] * 1000
+            result_data['market_cap'] = result_data['market_cap'] * 10000
+            written = write_factor_partitions(db, result_data, self.config)
+            if failures:
+                raise WindowCleanError(failures, written)
+            return written
 
+        except WindowCleanError:
+            raise
         except Exception as e:
             error_msg = f"Failed to process market data for quarter : {str(e)}\nStack trace:\n{traceback.format_exc()}"
             logger.error(error_msg)
@@ -2,21 +2,21 @@ from abc import ABC
 
 
 import tushare as ts
-from pymongo import UpdateOne
 import traceback
 
 import pandas as pd
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
-import time
 
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
+from panda_common.utils.trading_calendar import get_trading_calendar
+from panda_data_hub.utils.fetch_scheduler import get_endpoint, run_tasks
+from panda_data_hub.utils.market_clean_utils import asof_stock_names, calculate_limit_prices, components_to_frame, \
+    log_market_clean_result, mark_index_components
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
-from panda_data_hub.utils.ts_utils import calculate_upper_limit, ts_is_trading_day, get_previous_month_dates, \
-    calculate_lower_limit
+from panda_data_hub.utils.write_strategies import write_records
+from panda_data_hub.utils.ts_utils import ts_get_trading_dates, get_previous_month_dates
 
 """
        使用须知：因tushare对于接口返回数据条数具有严格限制，故无法一次拉取全量数据。此限制会导致接口运行效率偏低，请耐心等待。
@@ -37,6 +37,7 @@ class StockMarketCleanTSServicePRO(ABC):
         try:
             ts.set_token(config['TS_TOKEN'])
             self.pro = ts.pro_api()
+            self.endpoint = get_endpoint('tushare', config)
         except Exception as e:
             error_msg = f"Failed to initialize tushare: {str(e)}\nStack trace:\n{traceback.format_exc()}"
             logger.error(error_msg)
@@ -49,97 +50,55 @@ class StockMarketCleanTSServicePRO(ABC):
 
         logger.info("Starting market data cleaning for tushare")
 
-        # 获取交易日
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        trading_days = []
-        for date in date_range:
-            date_str = datetime.strftime(date, "%Y-%m-%d")
-            if ts_is_trading_day(date_str):
-                trading_days.append(date_str)
-            else:
-                logger.info(f"跳过非交易日: {date_str}")
+        # 获取交易日：使用共享交易日历，整段区间最多查询一次数据源
+        trading_days = get_trading_calendar(self.config).trading_days(
+            start_date, end_date, fmt='%Y-%m-%d', source=ts_get_trading_dates)
         logger.info(f"找到 {len(trading_days)} 个交易日需要处理")
-        total_days = len(trading_days)
-        processed_days = 0
-        # 根据交易日去循环
-        with tqdm(total=len(trading_days), desc="Processing Trading Days") as pbar:
-            # 分批处理，每批8天
-            batch_size = 8
-            for i in range(0, len(trading_days), batch_size):
-                batch_days = trading_days[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = []
-                    for date in batch_days:
-                        futures.append(executor.submit(
-                            self.clean_meta_market_data,
-                            date_str=date
-                        ))
-
-                    # 等待当前批次的所有任务完成
-                    for future in futures:
-                        try:
-                            future.result()
-                            processed_days += 1
-                            progress = int((processed_days / total_days) * 100)
-
-                            # 更新进度
-                            if self.progress_callback:
-                                self.progress_callback(progress)
-                            pbar.update(1)
-                        except Exception as e:
-                            logger.error(f"Task failed: {e}")
-                            pbar.update(1)  # 即使任务失败也更新进度条
-
-                # 批次之间添加短暂延迟，避免连接数超限
-                if i + batch_size < len(trading_days):
-                    logger.info(
-                        f"完成批次 {i // batch_size + 1}/{(len(trading_days) - 1) // batch_size + 1}，等待10秒后继续...")
-                    time.sleep(10)
-        logger.info("所有交易日数据处理完成")
+        # 并发处理各交易日，接口调用速率由 tushare 端点的令牌桶和自适应并发控制
+        failures = run_tasks(self.clean_meta_market_data, trading_days, max_workers=10,
+                             progress_callback=self.progress_callback)
+        log_market_clean_result(failures)
+        return failures
 
     def clean_meta_market_data(self,date_str):
         try:
             date = date_str.replace("-", "")
             #  获取当日股票的历史行情
-            price_data = self.pro.query('daily', trade_date=date)
+            price_data = self.endpoint.call(self.pro.query, 'daily', trade_date=date)
             # 重置股票行情数据索引
             price_data.reset_index(drop=False, inplace=True)
             # 洗 index_components列
-            price_data['index_component'] = None
-
             # tushare关于中证500和中证1000这两个指数只有每月的最后一个交易日才有数据，对于沪深300成分股是每月的第一个交易日和最后一个交易日才有数据
             # 根据日期获取当月三个指数的
             mid_date,last_date = get_previous_month_dates(date_str = date)
             # 沪深300
-            hs_300 = self.pro.query('index_weight', index_code='399300.SZ', start_date=mid_date, end_date=last_date)
+            hs_300 = self.endpoint.call(self.pro.query, 'index_weight', index_code='399300.SZ', start_date=mid_date, end_date=last_date)
             # 中证500
-            zz_500 = self.pro.query('index_weight', index_code='000905.SH', start_date=mid_date, end_date=last_date)
+            zz_500 = self.endpoint.call(self.pro.query, 'index_weight', index_code='000905.SH', start_date=mid_date, end_date=last_date)
             # 中证1000
-            zz_1000 = self.pro.query('index_weight', index_code='000852.SH', start_date=mid_date, end_date=last_date)
-            for idx, row in price_data.iterrows():
-                try:
-                    component = self.clean_index_components(data_symbol=row['ts_code'], date=date,hs_300 =hs_300,zz_500 = zz_500,zz_1000 = zz_1000)
-                    price_data.at[idx, 'index_component'] = component
-                    logger.info(f"Success to clean index for {row['ts_code']} on {date}")
-                except Exception as e:
-                    logger.error(f"Failed to clean index for {row['ts_code']} on {date}: {str(e)}")
-                    continue
+            zz_1000 = self.endpoint.call(self.pro.query, 'index_weight', index_code='000852.SH', start_date=mid_date, end_date=last_date)
+            price_data['index_component'] = mark_index_components(
+                price_data,
+                symbol_col='ts_code',
+                constituents=[components_to_frame(table['con_code']) for table in (hs_300, zz_500, zz_1000)]
+            )
             # 洗name列
-            # 报错ERROR - Error checking if ****** on date: single positional indexer is out-of-bounds，说明该股票已经退市
-            price_data['name'] = None
+            # 没有换名记录且不在当前股票列表中的股票（已经退市）名称为 None
             # 获取历史名称变更信息
             # end_date = 20250423的数据条数一共是7413,接口最多返回10000条数据，目前是足够的
-            namechange_info = self.pro.query('namechange', end_date=date)
+            namechange_info = self.endpoint.call(self.pro.query, 'namechange', end_date=date)
             #获取目前所有股票的名称
-            stock_info = self.pro.query('stock_basic')
-            for idx, row in price_data.iterrows():
-                try:
-                    stock_name = self.clean_stock_name(data_symbol=row['ts_code'], date=date,namechange_info = namechange_info,stock_info = stock_info)
-                    price_data.at[idx, 'name'] = stock_name
-                    # logger.info(f"Success to clean name for {row['ts_code']} on {date}")
-                except Exception as e:
-                    logger.error(f"Failed to clean name for {row['ts_code']} on {date}: {str(e)}")
-                    continue
+            stock_info = self.endpoint.call(self.pro.query, 'stock_basic')
+            price_data['name'] = asof_stock_names(
+                price_data,
+                symbol_col='ts_code',
+                date_col='trade_date',
+                changes=namechange_info,
+                change_symbol_col='ts_code',
+                change_date_col='ann_date',
+                change_name_col='name',
+                current_names=stock_info.drop_duplicates('ts_code').set_index('ts_code')['name']
+            )
             price_data = price_data.drop(columns=['index','change','pct_chg','amount'])
             price_data = price_data.rename(columns={'vol': 'volume'})
             price_data = price_data.rename(columns={'trade_date': 'date'})
@@ -147,15 +106,8 @@ class StockMarketCleanTSServicePRO(ABC):
             price_data = price_data.rename(columns={'ts_code': 'symbol'})
 
             # 计算涨跌停价格时对于已经退市的股票，因无法获取当日股票名称，故无法计算涨跌停价格
-            price_data['limit_up'] = None
-            price_data['limit_down'] = None
-            price_data['limit_up'] = price_data.apply(
-                lambda row: calculate_upper_limit(stock_code = row['symbol'], prev_close = row['pre_close'], stock_name = row['name']),
-                axis=1
-            )
-            price_data['limit_down'] = price_data.apply(
-                lambda row: calculate_lower_limit(stock_code = row['symbol'], prev_close = row['pre_close'], stock_name = row['name']),
-                axis=1
+            price_data['limit_up'], price_data['limit_down'] = calculate_limit_prices(
+                price_data['symbol'], price_data['pre_close'], price_data['name']
             )
             price_data['volume'] = price_data['volume']*100
             # 过滤掉北交所的股票
@@ -167,59 +119,10 @@ class StockMarketCleanTSServicePRO(ABC):
             # 检索数据库索引
             ensure_collection_and_indexes(table_name='stock_market')
             # 执行插入操作
-            upsert_operations = []
-            for record in price_data.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                # logger.info(f"Successfully upserted market data for date: {date}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          price_data.to_dict('records'), self.config)
 
         except Exception as e:
-            logger.error({e})
-
-    def clean_index_components(self, date,data_symbol, hs_300,zz_500 ,zz_1000):
-        try:
-            # 首先查询沪深300
-            if data_symbol in hs_300['con_code'].values:
-                return '100'
-
-            # 如果不在沪深300中，查询中证500
-            if data_symbol in zz_500['con_code'].values:
-                return '010'
-
-            # 如果不在中证500中，查询中证1000
-            if data_symbol in zz_1000['con_code'].values:
-                return '001'
-
-            # 如果都不在其中
-            return '000'
-
-        except Exception as e:
-            logger.error(f"Error checking if {data_symbol} is in index components on {date}: {str(e)}")
-            return None
-
-    def clean_stock_name(self, data_symbol, date,namechange_info,stock_info):
-        try:
-            # 获取某只股票的换名历史
-            valid_changes = namechange_info[(namechange_info['ann_date'] <= date) &(namechange_info['ts_code'] == data_symbol)]
-            if not valid_changes.empty:
-                # 按开始日期排序，获取最新的变更记录
-                latest_change = valid_changes.sort_values('ann_date', ascending=False).iloc[0]
-                latest_symbol = latest_change['name']
-                return latest_symbol
-            else:
-                current_info = stock_info[stock_info['ts_code'] == data_symbol]
-                current_name = current_info['name'].iloc[0]
-                return current_name
-
-        except Exception as e:
-            logger.error(f"Error checking if {data_symbol} on {date}: {str(e)}")
-            return None  # 或者返回其他默认值
-
-
-
+            # 抛给 run_tasks 记为失败日期，便于汇总和回补
+            logger.error(f"清洗 {date_str} 行情失败: {str(e)}")
+            raise
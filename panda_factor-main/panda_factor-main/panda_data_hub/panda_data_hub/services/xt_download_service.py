@@ -1,8 +1,8 @@
 import traceback
 from abc import ABC
 from xtquant import xtdata
-import time
 from panda_common.logger_config import logger
+from panda_data_hub.utils.fetch_scheduler import get_endpoint, run_tasks
 from panda_data_hub.utils.xt_utils import XTQuantManager
 
 
@@ -12,6 +12,7 @@ class XTDownloadService(ABC):
         self.progress_callback = None
         try:
             XTQuantManager.get_instance(config)
+            self.endpoint = get_endpoint('xtquant', config)
             logger.info("XtQuant ready to use")
         except Exception as e:
             error_msg = f"Failed to initialize XtQuant: {str(e)}\nStack trace:\n{traceback.format_exc()}"
@@ -23,31 +24,24 @@ class XTDownloadService(ABC):
         self.progress_callback = callback
 
     def xt_price_data_download(self, start_date, end_date):
-        """单线程顺序下载数据（带进度回调）"""
+        """并发下载数据（带进度回调），调用速率由 xtquant 端点限流"""
         try:
             # 获取股票列表
             hs_list = xtdata.get_stock_list_in_sector("沪深A股")
-            total = len(hs_list)
-            completed = 0
-            
-            for stock_code in hs_list:
-                try:
-                    # 下载历史K线
-                    xtdata.download_history_data(stock_code, '1d', start_time=start_date, end_time=end_date)
-                    # 下载涨跌停价格
-                    xtdata.download_history_data(stock_code, 'stoppricedata', start_time=start_date, end_time=end_date)
-                    
-                    # 更新进度
-                    completed += 1
-                    progress = int((completed / total) * 100)
-                    if self.progress_callback:
-                        self.progress_callback(progress)
-
-                    logger.info(f"已下载 {stock_code}，进度: {progress}%")
-                    time.sleep(0.1)  # 避免请求过于频繁
-                except Exception as e:
-                    logger.error(f"下载 {stock_code} 失败: {e}")
-                    continue  # 继续下载下一个股票
+
+            def download_stock(stock_code):
+                # 下载历史K线
+                self.endpoint.call(xtdata.download_history_data, stock_code, '1d',
+                                   start_time=start_date, end_time=end_date)
+                # 下载涨跌停价格
+                self.endpoint.call(xtdata.download_history_data, stock_code, 'stoppricedata',
+                                   start_time=start_date, end_time=end_date)
+
+            # 单只股票失败只记录日志，继续下载其余股票
+            failures = run_tasks(download_stock, hs_list, max_workers=4, desc="Downloading Stocks",
+                                 progress_callback=self.progress_callback)
+            if failures:
+                logger.warning(f"{len(failures)} 只股票下载失败: {list(failures)[:20]}")
 
             logger.info("全部下载完成！")
             if self.progress_callback:
@@ -57,4 +51,4 @@ class XTDownloadService(ABC):
             logger.error(f"下载过程发生错误: {e}")
             if self.progress_callback:
                 self.progress_callback(-1)  # 错误信号
-            raise  # 重新抛出异常以便上层处理
\ No newline at end of file
+            raise  # 重新抛出异常以便上层处理
@@ -1,18 +1,18 @@
-import time
 from datetime import datetime
-from pymongo import UpdateOne
-from tqdm import tqdm
 import pandas as pd
 import traceback
 from abc import ABC
-from concurrent.futures import ThreadPoolExecutor
 from xtquant import xtdata
 
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_common.utils.stock_utils import get_exchange_suffix
+from panda_common.utils.trading_calendar import get_trading_calendar
+from panda_data_hub.utils.fetch_scheduler import run_tasks
+from panda_data_hub.utils.market_clean_utils import fill_missing_limit_prices, log_market_clean_result
 from panda_data_hub.utils.mongo_utils import ensure_collection_and_indexes
-from panda_data_hub.utils.xt_utils import xt_is_trading_day, XTQuantManager
+from panda_data_hub.utils.write_strategies import write_records
+from panda_data_hub.utils.xt_utils import xt_get_trading_dates, XTQuantManager
 
 
 class StockMarketCleanXTServicePRO(ABC):
@@ -33,20 +33,12 @@ class StockMarketCleanXTServicePRO(ABC):
 
         logger.info("Starting market data cleaning for XTQuant")
 
-        # 1. 获取交易日
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        trading_days = []
-        for date in date_range:
-            date_str = datetime.strftime(date, "%Y-%m-%d")
-            if xt_is_trading_day(date_str):
-                trading_days.append(date_str)
-            else:
-                logger.info(f"跳过非交易日: {date_str}")
+        # 1. 获取交易日：使用共享交易日历，整段区间最多查询一次数据源
+        trading_days = get_trading_calendar(self.config).trading_days(
+            start_date, end_date, fmt='%Y-%m-%d', source=xt_get_trading_dates)
         if len(trading_days) == 0:
             logger.info("该时间范围内没有找到交易日")
             return
-        total_days = len(trading_days)
-        processed_days = 0
         logger.info(f"找到 {len(trading_days)} 个交易日需要处理")
         # 2. 获取股票交易行情
         hs_list = xtdata.get_stock_list_in_sector("沪深A股")
@@ -87,46 +79,19 @@ class StockMarketCleanXTServicePRO(ABC):
         combined_limit = combined_limit[['stock_code', 'time', '涨停价', '跌停价']]
         # 获取股票名称
         name_data = self.clean_stock_market_name(hs_list = hs_list)
-        # 根据交易日去循环
-        with tqdm(total=len(trading_days), desc="Processing Trading Days") as pbar:
-            # 分批处理，每批10天
-            batch_size = 10
-            for i in range(0, len(trading_days), batch_size):
-                batch_days = trading_days[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = []
-                    for date in batch_days:
-                        date_str = date.replace("-","")
-                        price_daily_data = combined_price[combined_price['date'] == date_str]
-                        limit_daily_data = combined_limit[combined_limit['time'] == date_str]
-                        futures.append(executor.submit(
-                            self.clean_meta_market_data,
-                            price_data = price_daily_data,
-                            limit_data = limit_daily_data,
-                            name_data=name_data,
-                            date_str = date_str
-                        ))
-
-                    # 等待当前批次的所有任务完成
-                    for future in futures:
-                        try:
-                            future.result()
-                            processed_days += 1
-                            progress = int((processed_days / total_days) * 100)
-                            # 更新进度
-                            if self.progress_callback:
-                                self.progress_callback(progress)
-                            pbar.update(1)  # 更新进度条
-                        except Exception as e:
-                            logger.error(f"Task failed: {e}")
-                            pbar.update(1)  # 即使任务失败也更新进度条
+        # 行情已整段取回，按日任务不再调用数据源，无需批次间等待
+        def clean_day(date):
+            date_str = date.replace("-", "")
+            self.clean_meta_market_data(
+                price_data=combined_price[combined_price['date'] == date_str],
+                limit_data=combined_limit[combined_limit['time'] == date_str],
+                name_data=name_data,
+                date_str=date_str
+            )
 
-                # 批次之间添加短暂延迟，避免连接数超限
-                if i + batch_size < len(trading_days):
-                    logger.info(
-                        f"完成批次 {i // batch_size + 1}/{(len(trading_days) - 1) // batch_size + 1}，等待10秒后继续...")
-                    time.sleep(3)
-        logger.info("所有交易日数据处理完成")
+        failures = run_tasks(clean_day, trading_days, max_workers=10, progress_callback=self.progress_callback)
+        log_market_clean_result(failures)
+        return failures
 
 
     def clean_meta_market_data(self, price_data,limit_data,name_data,date_str):
@@ -153,6 +118,8 @@ class StockMarketCleanXTServicePRO(ABC):
             final_df['symbol'] = final_df['symbol'].apply(get_exchange_suffix)
             final_df = final_df.rename(columns={'InstrumentName': 'name'})
             final_df = final_df.rename(columns={'preClose': 'pre_close'})
+            # 迅投未给出涨跌停价的记录按规则补齐
+            final_df = fill_missing_limit_prices(final_df, 'symbol', 'pre_close', 'name')
             final_df['volume'] = final_df['volume']*100
             desired_order = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'pre_close',
                              'limit_up', 'limit_down', 'index_component', 'name']
@@ -160,19 +127,12 @@ class StockMarketCleanXTServicePRO(ABC):
             # 入库前创建集合及索引
             ensure_collection_and_indexes("stock_market")
             # 入库
-            upsert_operations = []
-            for record in final_df.to_dict('records'):
-                upsert_operations.append(UpdateOne(
-                    {'date': record['date'], 'symbol': record['symbol']},
-                    {'$set': record},
-                    upsert=True
-                ))
-            if upsert_operations:
-                self.db_handler.mongo_client[self.config["MONGO_DB"]]['stock_market'].bulk_write(
-                    upsert_operations)
-                logger.info(f"Successfully upserted market data for date: {date_str}")
+            write_records(self.db_handler.mongo_client[self.config["MONGO_DB"]], 'stock_market',
+                          final_df.to_dict('records'), self.config)
         except Exception as e:
-            logger.error({e})
+            # 抛给 run_tasks 记为失败日期，便于汇总和回补
+            logger.error(f"清洗 {date_str} 行情失败: {str(e)}")
+            raise
 
     def clean_stock_market_name(self,hs_list):
         try:
@@ -11,6 +11,9 @@ from panda_data_hub.data.ricequant_stock_market_cleaner import RQStockMarketClea
 from panda_data_hub.data.ricequant_stocks_cleaner import RQStockCleaner
 from panda_data_hub.data.tushare_stocks_cleaner import TSStockCleaner
 from panda_data_hub.data.tushare_stock_market_cleaner import TSStockMarketCleaner
+from panda_data_hub.services.rq_stock_market_clean_service import StockMarketCleanRQServicePRO
+from panda_data_hub.services.ts_stock_market_clean_service import StockMarketCleanTSServicePRO
+from panda_data_hub.utils.backfill import BackfillJob
 # from panda_data_hub.data.xtquant_stock_market_cleaner import XTStockMarketCleaner
 # from panda_data_hub.data.xtquant_stocks_cleaner import XTStockCleaner
 
@@ -54,6 +57,24 @@ class DataScheduler:
             #     stock_market_cleaner.stock_market_clean_daily()
         except Exception as e:
             logger.error(f"Error _process_data : {str(e)}")
+        self._backfill_gaps()
+
+    def _backfill_gaps(self):
+        """回补最近 BACKFILL_LOOKBACK_DAYS 天内缺失或不完整的交易日"""
+        try:
+            data_source = config['DATAHUBSOURCE']
+            if data_source == 'ricequant':
+                clean_range = StockMarketCleanRQServicePRO(self.config).stock_market_clean_by_time
+            elif data_source == 'tushare':
+                clean_range = StockMarketCleanTSServicePRO(self.config).stock_market_history_clean
+            else:
+                return
+            end_date = datetime.datetime.now()
+            start_date = end_date - datetime.timedelta(days=int(self.config.get('BACKFILL_LOOKBACK_DAYS', 30)))
+            job = BackfillJob(self.config, 'stock_market', job_name=f'stock_market:{data_source}:daily')
+            job.run(start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d'), clean_range)
+        except Exception as e:
+            logger.error(f"Error _backfill_gaps : {str(e)}")
     
     def schedule_data(self):
         time = self.config["STOCKS_UPDATE_TIME"]
@@ -5,6 +5,9 @@ from panda_common.config import config, logger
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_data_hub.factor.rq_factor_clean_pro import RQFactorCleaner
 from panda_data_hub.factor.ts_factor_clean_pro import TSFactorCleaner
+from panda_data_hub.services.rq_factor_clean_pro_service import FactorCleanerProService
+from panda_data_hub.services.ts_factor_clean_pro_service import FactorCleanerTSProService
+from panda_data_hub.utils.backfill import BackfillJob
 # from panda_data_hub.factor.xt_factor_clean_pro import XTFactorCleaner
 
 
@@ -37,6 +40,25 @@ class FactorCleanerScheduler():
 
         except Exception as e:
             logger.error(f"Error _process_data : {str(e)}")
+        self._backfill_gaps()
+
+    def _backfill_gaps(self):
+        """回补最近 BACKFILL_LOOKBACK_DAYS 天内因子记录少于行情记录的交易日"""
+        try:
+            data_source = config['DATAHUBSOURCE']
+            if data_source == 'ricequant':
+                clean_range = FactorCleanerProService(self.config).clean_history_data
+            elif data_source == 'tushare':
+                clean_range = FactorCleanerTSProService(self.config).clean_history_data
+            else:
+                return
+            end_date = datetime.datetime.now()
+            start_date = end_date - datetime.timedelta(days=int(self.config.get('BACKFILL_LOOKBACK_DAYS', 30)))
+            job = BackfillJob(self.config, 'factor_base', job_name=f'factor_base:{data_source}:daily',
+                              reference_table='stock_market')
+            job.run(start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d'), clean_range)
+        except Exception as e:
+            logger.error(f"Error _backfill_gaps : {str(e)}")
 
     def schedule_data(self):
         time = self.config["FACTOR_UPDATE_TIME"]
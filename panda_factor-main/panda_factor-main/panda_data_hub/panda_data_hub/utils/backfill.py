@@ -0,0 +1,181 @@
+"""
+缺口检测 + 断点续跑的历史数据回补
+
+BackfillJob 先用交易日历和每日记录数找出区间内缺失或不完整的交易日，只清洗这些日期；
+每处理完一段连续交易日就把结果写入 backfill_jobs 集合，进程重启后再次发起同一任务时
+从上次的检查点继续，而不是从头重洗整个区间::
+
+    job = BackfillJob(config, 'stock_market', job_name='stock_market:tushare')
+    job.run('20240101', '20241231', service.stock_market_history_clean, progress_callback)
+
+完整性判断：
+- 指定 reference_table（如 factor_base 以 stock_market 为参照）时，记录数低于参照表同日记录数的 min_ratio 视为不完整
+- 否则与前后若干交易日记录数的中位数比较，记录数为 0 的日期一律视为缺失
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_common.logger_config import logger
+from panda_common.utils.trading_calendar import get_trading_calendar
+from panda_data_hub.utils.mongo_utils import count_documents_by_date, daily_count_cache
+
+BACKFILL_JOB_COLLECTION = 'backfill_jobs'
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_PARTIAL = 'partial'
+
+
+def find_incomplete_days(db, table: str, days: List[str], reference_table: Optional[str] = None,
+                         min_ratio: float = 0.95, window: int = 10) -> List[str]:
+    """
+    找出 days（YYYYMMDD 交易日）中 table 缺失或记录数不足的日期
+
+    Args:
+        db: pymongo Database
+        table: 待检查的表
+        days: 交易日列表
+        reference_table: 参照表，同日记录数作为期望值；参照表当天没有数据的日期不检查
+        min_ratio: 记录数低于期望值的该比例视为不完整
+        window: 不指定参照表时，用前后 window 个交易日记录数的中位数作为期望值
+    """
+    if not days:
+        return []
+    counts = pd.Series(count_documents_by_date(db, table, days), dtype='float64').reindex(days).fillna(0)
+
+    if reference_table:
+        expected = pd.Series(count_documents_by_date(db, reference_table, days), dtype='float64').reindex(days)
+        incomplete = expected.notna() & (counts < expected * min_ratio)
+    else:
+        expected = counts.where(counts > 0).rolling(2 * window + 1, center=True, min_periods=1).median()
+        incomplete = (counts == 0) | (counts < expected * min_ratio)
+    return [day for day, flag in zip(days, incomplete) if flag]
+
+
+def split_runs(days: List[str], all_days: List[str], max_run_days: int) -> List[List[str]]:
+    """把待处理日期按交易日历切分成连续的区段，每段不超过 max_run_days 个交易日"""
+    position = {day: i for i, day in enumerate(all_days)}
+    runs = []
+    for day in sorted(days, key=position.get):
+        if runs and len(runs[-1]) < max_run_days and position[day] == position[runs[-1][-1]] + 1:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+class BackfillJob:
+    """
+    可断点续跑的回补任务
+
+    任务文档以 "{job_name}:{start}:{end}" 为 _id 保存在 backfill_jobs 中，记录计划处理的日期、
+    已完成日期、失败日期和进度。状态为 running 的任务说明上次运行被中断，再次 run() 时只处理
+    剩余日期；已结束的任务再次 run() 时重新检测缺口。
+    """
+
+    def __init__(self, config, table: str, job_name: Optional[str] = None, reference_table: Optional[str] = None,
+                 min_ratio: float = 0.95, max_run_days: int = 20):
+        self.config = config
+        self.table = table
+        self.job_name = job_name or table
+        self.reference_table = reference_table
+        self.min_ratio = min_ratio
+        self.max_run_days = max_run_days
+        self.db_handler = DatabaseHandler(config)
+        self.db = self.db_handler.mongo_client[config["MONGO_DB"]]
+        self.jobs = self.db[BACKFILL_JOB_COLLECTION]
+
+    def _job_id(self, start_date: str, end_date: str) -> str:
+        return f"{self.job_name}:{start_date}:{end_date}"
+
+    def plan(self, start_date: str, end_date: str) -> List[str]:
+        """区间内需要回补的交易日 (YYYYMMDD)"""
+        trading_days = get_trading_calendar(self.config).trading_days(start_date, end_date)
+        return find_incomplete_days(self.db, self.table, trading_days, reference_table=self.reference_table,
+                                    min_ratio=self.min_ratio)
+
+    def get_job(self, start_date: str, end_date: str) -> Optional[Dict]:
+        return self.jobs.find_one({'_id': self._job_id(start_date, end_date)})
+
+    def run(self, start_date: str, end_date: str, clean_range: Callable[[str, str], None],
+            progress_callback: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        回补 [start_date, end_date] 内缺失的交易日
+
+        Args:
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            clean_range: 清洗函数 clean_range(start_date, end_date)，日期格式 YYYYMMDD，
+                按连续交易日区段调用
+            progress_callback: 进度回调，参数为 0-100 的整数
+
+        Returns:
+            dict: 任务文档
+        """
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        job_id = self._job_id(start_date, end_date)
+        job = self.jobs.find_one({'_id': job_id})
+
+        if job and job.get('status') == STATUS_RUNNING:
+            completed = set(job.get('completed', []))
+            pending = [day for day in job['planned'] if day not in completed]
+            logger.info(f"回补任务 {job_id} 从检查点继续，已完成 {len(completed)} 天，剩余 {len(pending)} 天")
+        else:
+            pending = self.plan(start_date, end_date)
+            now = datetime.now()
+            job = {
+                '_id': job_id,
+                'table': self.table,
+                'start_date': start_date,
+                'end_date': end_date,
+                'planned': pending,
+                'completed': [],
+                'failed': {},
+                'progress': 0,
+                'status': STATUS_RUNNING,
+                'created_at': now,
+                'updated_at': now,
+            }
+            self.jobs.replace_one({'_id': job_id}, job, upsert=True)
+            logger.info(f"回补任务 {job_id} 检测到 {len(pending)} 个缺失或不完整的交易日")
+
+        total = len(job['planned'])
+        done = total - len(pending)
+        all_days = get_trading_calendar(self.config).trading_days(start_date, end_date)
+        for run in split_runs(pending, all_days, self.max_run_days):
+            try:
+                clean_range(run[0], run[-1])
+            except Exception as e:
+                logger.error(f"回补 {self.table} {run[0]}~{run[-1]} 失败: {str(e)}")
+            # 清洗函数不一定经过 write_records 写入，回补过的日期统一清除记录数缓存
+            daily_count_cache.invalidate(self.db.name, self.table, run)
+
+            # 以实际写入的记录数为准确定检查点，清洗函数内部吞掉的错误也能发现
+            still_missing = set(find_incomplete_days(self.db, self.table, run, reference_table=self.reference_table,
+                                                     min_ratio=self.min_ratio))
+            finished = [day for day in run if day not in still_missing]
+            done += len(run)
+            progress = int(done / total * 100) if total else 100
+            update = {'$set': {'progress': progress, 'updated_at': datetime.now()}}
+            update['$set'].update({f'failed.{day}': 'incomplete after clean' for day in still_missing})
+            if finished:
+                update['$addToSet'] = {'completed': {'$each': finished}}
+                update['$unset'] = {f'failed.{day}': '' for day in finished}
+            self.jobs.update_one({'_id': job_id}, update)
+            if progress_callback:
+                progress_callback(progress)
+
+        job = self.jobs.find_one({'_id': job_id})
+        status = STATUS_PARTIAL if job.get('failed') else STATUS_COMPLETED
+        self.jobs.update_one({'_id': job_id}, {'$set': {'status': status, 'progress': 100,
+                                                        'updated_at': datetime.now()}})
+        job.update(status=status, progress=100)
+        if progress_callback:
+            progress_callback(100)
+        logger.info(f"回补任务 {job_id} 结束: 完成 {len(job.get('completed', []))} 天，"
+                    f"仍不完整 {len(job.get('failed') or {})} 天")
+        return job
@@ -0,0 +1,115 @@
+"""
+因子表 (factor_base) 的区间清洗工具
+
+各数据源的因子清洗服务按时间窗口处理：每个窗口从 stock_market 一次读出全部行情，
+与数据源的基本面数据做一次 (date, 代码) 合并，再按日期分区批量写入 factor_base，
+不再逐日读 stock_market、逐日合并。
+
+单个窗口失败不影响其他窗口；窗口内部分交易日失败时，清洗函数写入其余交易日后抛出
+WindowCleanError，由 run_windows 记录失败的交易日并继续下一个窗口。
+"""
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from panda_common.logger_config import logger
+from panda_data_hub.utils.mongo_utils import DATE_INDEX, ensure_collection_and_indexes, index_registry
+from panda_data_hub.utils.write_strategies import write_records
+
+STOCK_MARKET_FIELDS = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume']
+FACTOR_BASE_COLUMNS = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'market_cap', 'turnover', 'amount']
+
+# 每个窗口包含的自然日数，控制单次读入内存的行情量（约 60 个交易日 × 全市场）
+DEFAULT_WINDOW_DAYS = 90
+
+
+class WindowCleanError(RuntimeError):
+    """窗口内部分交易日清洗失败，其余交易日已写入"""
+
+    def __init__(self, failed_days: Dict[str, Exception], written: int = 0):
+        self.failed_days = failed_days
+        self.written = written
+        super().__init__(f"{len(failed_days)} 个交易日清洗失败: {sorted(failed_days)[:10]}")
+
+
+def date_windows(start_date: str, end_date: str, window_days: int = DEFAULT_WINDOW_DAYS) -> List[Tuple[str, str]]:
+    """把 [start_date, end_date] 切成不超过 window_days 个自然日的窗口，返回 YYYYMMDD 起止日期"""
+    start = pd.Timestamp(str(start_date))
+    end = pd.Timestamp(str(end_date))
+    windows = []
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        windows.append((start.strftime('%Y%m%d'), window_end.strftime('%Y%m%d')))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+def load_stock_market(db, start_date: str, end_date: str, fields: List[str] = STOCK_MARKET_FIELDS) -> pd.DataFrame:
+    """按日期区间一次读出 stock_market 的指定字段（走 date 索引，只返回需要的字段）"""
+    index_registry.ensure(db, 'stock_market', [DATE_INDEX])
+    cursor = db['stock_market'].find(
+        {'date': {'$gte': start_date, '$lte': end_date}},
+        {**{field: 1 for field in fields}, '_id': 0},
+        batch_size=10000,
+    )
+    return pd.DataFrame(list(cursor), columns=fields)
+
+
+def code_map(symbols: pd.Series, to_vendor_code: Callable[[str], str]) -> pd.Series:
+    """把 symbol 列转换成数据源代码，每个代码只转换一次"""
+    unique = symbols.drop_duplicates()
+    return symbols.map(dict(zip(unique, unique.map(to_vendor_code))))
+
+
+def write_factor_partitions(db, frame: pd.DataFrame, config: Optional[Dict] = None) -> int:
+    """按日期分区把 factor_base 记录批量写入，返回写入的文档数"""
+    if frame.empty:
+        return 0
+    ensure_collection_and_indexes(table_name='factor_base')
+    written = 0
+    # 迅投没有历史市值和换手率，缺少的列不写入
+    frame = frame[[column for column in FACTOR_BASE_COLUMNS if column in frame.columns]]
+    for _, day_frame in frame.groupby('date', sort=True):
+        written += write_records(db, 'factor_base', day_frame.to_dict('records'), config)
+    return written
+
+
+def run_windows(start_date: str, end_date: str, clean_window: Callable[[str, str], int],
+                window_days: int = DEFAULT_WINDOW_DAYS,
+                progress_callback: Optional[Callable[[int], None]] = None) -> Tuple[int, Dict[str, Exception]]:
+    """
+    依次清洗各时间窗口，按完成的窗口数汇报进度
+
+    窗口失败时记录后继续下一个窗口。
+
+    Returns:
+        (写入的文档总数, 失败的 {交易日或 "起始~结束" 窗口: 异常})
+    """
+    windows = date_windows(start_date.replace('-', ''), end_date.replace('-', ''), window_days)
+    total = 0
+    failures = {}
+    for i, (window_start, window_end) in enumerate(windows, 1):
+        try:
+            written = clean_window(window_start, window_end) or 0
+            logger.info(f"因子窗口 {window_start}~{window_end} 完成，写入 {written} 条 ({i}/{len(windows)})")
+        except WindowCleanError as e:
+            written = e.written
+            failures.update(e.failed_days)
+            logger.error(f"因子窗口 {window_start}~{window_end} 写入 {written} 条，{e} ({i}/{len(windows)})")
+        except Exception as e:
+            written = 0
+            failures[f"{window_start}~{window_end}"] = e
+            logger.error(f"因子窗口 {window_start}~{window_end} 清洗失败，继续下一个窗口: {e} ({i}/{len(windows)})")
+        total += written
+        if progress_callback:
+            progress_callback(int(i / len(windows) * 100))
+    return total, failures
+
+
+def log_windows_result(failures: Dict[str, Exception]):
+    """汇总 run_windows 的失败情况"""
+    if failures:
+        logger.warning(f"因子数据清洗结束，{len(failures)} 个交易日/窗口失败，可稍后回补: {sorted(failures)[:20]}")
+    else:
+        logger.info("因子数据清洗全部完成！！！")
@@ -0,0 +1,275 @@
+"""
+数据源调用限流与并发调度
+
+- TokenBucket: 令牌桶，按每分钟配额限制调用速率，允许一定突发
+- AIMDLimiter: 自适应并发，被限流时并发减半，连续成功后逐步加一 (AIMD)
+- VendorEndpoint: 组合以上两者，对单个数据源接口的调用做限流、带抖动的指数退避重试
+- run_tasks: 把按日（或按股票）拆分的任务提交到线程池并汇报进度，替代固定批次 + sleep
+
+同一数据源的端点在进程内共享（get_endpoint），多个服务同时回补时共用配额::
+
+    endpoint = get_endpoint('tushare', config)
+    df = endpoint.call(pro.query, 'daily', trade_date='20240102')
+    run_tasks(clean_one_day, trading_days, max_workers=10, progress_callback=callback)
+"""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from tqdm import tqdm
+
+from panda_common.logger_config import logger
+
+# 各数据源默认配额，可通过配置 FETCH_LIMITS 覆盖，例如 {'tushare': {'rate_per_minute': 500}}
+DEFAULT_ENDPOINT_LIMITS = {
+    'tushare': {'rate_per_minute': 200, 'burst': 10, 'concurrency': 4, 'max_concurrency': 10},
+    'ricequant': {'rate_per_minute': 600, 'burst': 20, 'concurrency': 4, 'max_concurrency': 10},
+    'xtquant': {'rate_per_minute': 1200, 'burst': 20, 'concurrency': 4, 'max_concurrency': 8},
+    'default': {'rate_per_minute': 300, 'burst': 10, 'concurrency': 4, 'max_concurrency': 8},
+}
+
+# 数据源限流报错中的关键字
+THROTTLE_PATTERNS = (
+    '每分钟最多访问', '每小时最多访问', '每天最多访问', '访问频率', '访问过于频繁', '请求过于频繁',
+    'rate limit', 'rate-limited', 'too many requests', 'quota exceeded', 'exceeded your quota',
+)
+
+THROTTLE_STATUS = 429
+
+# 报错文本里的 HTTP 状态码，如 "HTTP 429"、"status code: 429"、"429 Client Error"
+_STATUS_TEXT = re.compile(r'(?:\bhttp(?:\s*error)?|\bstatus(?:[ _]?code)?)\W{0,3}429\b|^\s*429\b', re.IGNORECASE)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """从异常的 status_code / status / response.status_code 属性取 HTTP 状态码"""
+    for source in (error, getattr(error, 'response', None)):
+        if source is None:
+            continue
+        for attr in ('status_code', 'status'):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """判断是否为数据源限流：优先看 HTTP 状态码，再匹配报错中的状态码和数据源限流提示"""
+    status = _status_code(error)
+    if status == THROTTLE_STATUS:
+        return True
+    message = str(error)
+    if status is None and _STATUS_TEXT.search(message):
+        return True
+    message = message.lower()
+    return any(pattern.lower() in message for pattern in THROTTLE_PATTERNS)
+
+
+class TokenBucket:
+    """线程安全的令牌桶，rate_per_minute 为持续速率，burst 为桶容量"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+    def drain(self):
+        """清空令牌，被限流后让后续调用重新按速率排队"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class AIMDLimiter:
+    """
+    自适应并发上限
+
+    被限流时上限乘以 decrease_factor（不低于 minimum），
+    每累计 limit 次成功上限加一（不超过 maximum）。
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16, decrease_factor: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, int(self.limit * self.decrease_factor))
+            self._successes = 0
+
+
+class VendorEndpoint:
+    """单个数据源接口的限流调用器：令牌桶 + AIMD 并发 + 带抖动的指数退避重试"""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int = 10, concurrency: int = 4,
+                 max_concurrency: int = 10, max_retries: int = 3, base_delay: float = 1.0,
+                 throttle_delay: float = 5.0, max_delay: float = 60.0,
+                 is_throttle: Callable[[Exception], bool] = is_throttle_error,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute, burst, clock=clock, sleep=sleep)
+        self.limiter = AIMDLimiter(concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.throttle_delay = throttle_delay
+        self.max_delay = max_delay
+        self.is_throttle = is_throttle
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+        self.stats = {'calls': 0, 'successes': 0, 'throttled': 0, 'retries': 0, 'failures': 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff(self, attempt: int, throttled: bool) -> float:
+        """第 attempt 次重试前的等待时间（指数退避，乘以 0.5~1.5 的随机抖动）"""
+        base = self.throttle_delay if throttled else self.base_delay
+        return min(self.max_delay, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        限流调用 func(*args, **kwargs)，失败时退避重试，重试耗尽后抛出最后一次异常
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.limiter.acquire()
+            self._count('calls')
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = self.is_throttle(e)
+                if throttled:
+                    self._count('throttled')
+                    self.limiter.on_throttle()
+                    self.bucket.drain()
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                delay = self.backoff(attempt, throttled)
+                logger.warning(f"{self.name} 调用{'被限流' if throttled else '失败'}: {e}，"
+                               f"{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries})，当前并发上限 {self.limiter.limit}")
+            else:
+                self._count('successes')
+                self.limiter.on_success()
+                return result
+            finally:
+                self.limiter.release()
+            self._sleep(delay)
+
+    def get_status(self) -> Dict:
+        return {
+            'name': self.name,
+            'rate_per_minute': self.bucket.rate * 60,
+            'concurrency_limit': self.limiter.limit,
+            'in_flight': self.limiter.in_flight,
+            **self.stats,
+        }
+
+
+_endpoints: Dict[str, VendorEndpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def endpoint_limits(name: str, config: Optional[Dict] = None) -> Dict:
+    """合并默认配额与配置覆盖；'tushare.index_weight' 依次继承 default、tushare 的设置"""
+    overrides = (config or {}).get('FETCH_LIMITS') or {}
+    vendor = name.split('.')[0]
+    limits = dict(DEFAULT_ENDPOINT_LIMITS['default'])
+    for key in (vendor, name):
+        limits.update(DEFAULT_ENDPOINT_LIMITS.get(key, {}))
+        limits.update(overrides.get(key, {}))
+    return limits
+
+
+def get_endpoint(name: str, config: Optional[Dict] = None) -> VendorEndpoint:
+    """获取进程内共享的数据源端点"""
+    endpoint = _endpoints.get(name)
+    if endpoint is None:
+        with _endpoints_lock:
+            endpoint = _endpoints.get(name)
+            if endpoint is None:
+                endpoint = VendorEndpoint(name, **endpoint_limits(name, config))
+                _endpoints[name] = endpoint
+    return endpoint
+
+
+def run_tasks(func: Callable[[Any], Any], items: Iterable, max_workers: int = 8, desc: str = "Processing Trading Days",
+              progress_callback: Optional[Callable[[int], None]] = None) -> Dict[Any, Exception]:
+    """
+    并发执行 func(item)，按完成顺序更新进度条和进度回调
+
+    速率由任务内部通过 VendorEndpoint 发起的数据源调用控制，这里不再做固定批次和等待。
+
+    Returns:
+        dict: 失败的任务 {item: 异常}
+    """
+    items = list(items)
+    total = len(items)
+    failures = {}
+    if total == 0:
+        return failures
+
+    completed = 0
+    with tqdm(total=total, desc=desc) as pbar, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[item] = e
+                logger.error(f"Task failed for {item}: {e}")
+            completed += 1
+            if progress_callback:
+                progress_callback(int(completed / total * 100))
+            pbar.update(1)
+    return failures
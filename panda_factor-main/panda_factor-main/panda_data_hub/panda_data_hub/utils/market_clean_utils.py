@@ -0,0 +1,240 @@
+"""
+行情清洗的向量化工具：指数成分标记、历史名称 (as-of) 匹配和涨跌停价计算。
+
+各数据源的清洗服务把原始数据整理成 (date, symbol) 形式的表后调用这里的函数，
+一次性得到整列结果，不再逐行过滤换名表和成分股表。
+"""
+import numpy as np
+import pandas as pd
+
+from panda_common.logger_config import logger
+
+# 指数成分标记，按优先级排列：沪深300 > 中证500 > 中证1000
+INDEX_COMPONENT_MARKS = ('100', '010', '001')
+NO_INDEX_COMPONENT_MARK = '000'
+
+
+def components_to_frame(components):
+    """
+    把成分股数据整理成 (date, symbol) 长表
+
+    Args:
+        components: 以下任一种形式
+            - dict: {日期: [股票代码, ...]}，如 rqdatac.index_components 按区间返回的结果
+            - list / set / Series: 不区分日期的股票代码集合
+            - None: 视为空集合
+
+    Returns:
+        DataFrame，dict 输入时包含 date 和 symbol 两列，否则只有 symbol 列
+    """
+    if components is None:
+        return pd.DataFrame({'symbol': pd.Series(dtype=object)})
+    if isinstance(components, dict):
+        frame = pd.DataFrame(
+            [(date, symbol) for date, symbols in components.items() for symbol in (symbols or [])],
+            columns=['date', 'symbol']
+        )
+        frame['date'] = pd.to_datetime(frame['date'])
+        return frame
+    return pd.DataFrame({'symbol': pd.Series(list(components), dtype=object)}).drop_duplicates()
+
+
+def mark_index_components(frame, symbol_col, constituents, date_col=None):
+    """
+    向量化计算 index_component 列
+
+    Args:
+        frame: 行情表
+        symbol_col: 股票代码列名
+        constituents: 按优先级排列的成分股表列表（沪深300、中证500、中证1000），
+            每个表由 components_to_frame 生成；带 date 列的表按 (日期, 代码) 匹配，否则只按代码匹配
+        date_col: 行情表中的日期列名，按日期匹配时必填
+
+    Returns:
+        Series: 与 frame 同索引的 '100' / '010' / '001' / '000' 标记
+    """
+    symbols = frame[symbol_col]
+    conditions = []
+    for table in constituents:
+        if table is None or table.empty:
+            conditions.append(np.zeros(len(frame), dtype=bool))
+        elif 'date' in table.columns and date_col is not None:
+            keys = pd.MultiIndex.from_arrays([pd.to_datetime(frame[date_col]).astype('datetime64[ns]'), symbols])
+            members = pd.MultiIndex.from_arrays([table['date'].astype('datetime64[ns]'), table['symbol']])
+            conditions.append(keys.isin(members))
+        else:
+            conditions.append(symbols.isin(table['symbol']).to_numpy())
+    marks = np.select(conditions, INDEX_COMPONENT_MARKS[:len(conditions)], default=NO_INDEX_COMPONENT_MARK)
+    return pd.Series(marks, index=frame.index, dtype=object)
+
+
+def asof_stock_names(frame, symbol_col, date_col, changes, change_symbol_col, change_date_col, change_name_col,
+                     current_names=None):
+    """
+    向量化计算 name 列：取每只股票在当日及之前最近一次变更后的名称
+
+    通过按股票分组的 as-of merge 实现；没有历史变更记录的股票回退到 current_names 中的当前名称，
+    仍找不到的为 None（通常是已退市股票）。
+
+    Args:
+        frame: 行情表
+        symbol_col: 行情表中的股票代码列名
+        date_col: 行情表中的日期列名（YYYYMMDD / YYYY-MM-DD 字符串或日期）
+        changes: 名称变更历史表
+        change_symbol_col: 变更表中的股票代码列名
+        change_date_col: 变更表中的生效日期列名
+        change_name_col: 变更表中的名称列名
+        current_names: 可选，股票代码到当前名称的映射 (dict 或 Series)
+
+    Returns:
+        Series: 与 frame 同索引的名称
+    """
+    left = pd.DataFrame({
+        '_symbol': frame[symbol_col].to_numpy(),
+        '_date': pd.to_datetime(frame[date_col]).to_numpy(dtype='datetime64[ns]'),
+        '_row': np.arange(len(frame)),
+    }).sort_values('_date', kind='stable')
+
+    right = pd.DataFrame({
+        '_symbol': changes[change_symbol_col].to_numpy(),
+        '_date': pd.to_datetime(changes[change_date_col], errors='coerce').to_numpy(dtype='datetime64[ns]'),
+        '_name': changes[change_name_col].to_numpy(),
+    }).dropna(subset=['_date']).sort_values('_date', kind='stable')
+
+    merged = pd.merge_asof(left, right, on='_date', by='_symbol', direction='backward')
+    names = merged.sort_values('_row')['_name'].to_numpy()
+    names = pd.Series(names, index=frame.index, dtype=object)
+
+    if current_names is not None:
+        missing = names.isna()
+        if missing.any():
+            names[missing] = frame.loc[missing, symbol_col].map(current_names)
+    return names.where(names.notna(), None)
+
+
+def partition_by_date(frame, date_col):
+    """
+    按日期把行情表切分一次，返回 {日期: 当日切片}
+
+    表按日期稳定排序一次后按连续区间切片，各切片共享排序后表的数据（不逐日复制整表），
+    适合把同一份区间行情分发给多个按日处理的线程；调用方应把切片视为只读。
+
+    Args:
+        frame: 行情表，date_col 为日期列
+        date_col: 日期列名
+
+    Returns:
+        dict: {pd.Timestamp: DataFrame}
+    """
+    dates = pd.to_datetime(frame[date_col])
+    order = np.argsort(dates.to_numpy(dtype='datetime64[ns]'), kind='stable')
+    ordered = frame.iloc[order]
+    ordered_dates = dates.to_numpy(dtype='datetime64[ns]')[order]
+    unique_dates, starts = np.unique(ordered_dates, return_index=True)
+    ends = np.append(starts[1:], len(ordered))
+    return {
+        pd.Timestamp(day): ordered.iloc[start:end]
+        for day, start, end in zip(unique_dates, starts, ends)
+    }
+
+
+# 板块代码前缀（纯数字代码部分）
+BOARD_PREFIXES = {
+    'main': ("600", "601", "603", "605", "900", "000", "001", "002", "003", "200", "201"),
+    'star': ("688", "689"),
+    'chinext': ("300", "301", "302"),
+    'bse': ("43", "83", "87", "920"),
+}
+# 各板块涨跌幅限制，主板 ST 股为 5%
+BOARD_LIMIT_RATIOS = {'main': 0.10, 'star': 0.20, 'chinext': 0.20, 'bse': 0.30}
+ST_LIMIT_RATIO = 0.05
+# 新股上市后不适用常规涨跌幅的交易日数（主板/北交所上市首日，科创板/创业板前 5 日）
+NEW_LISTING_DAYS = {'main': 1, 'star': 5, 'chinext': 5, 'bse': 1}
+
+
+def classify_boards(symbols):
+    """
+    按代码前缀向量化判断板块
+
+    Args:
+        symbols: 股票代码 Series，可带交易所后缀（如 '600000.SH'）
+
+    Returns:
+        ndarray: 'main' / 'star' / 'chinext' / 'bse'，无法识别的为空字符串
+    """
+    codes = pd.Series(symbols, dtype=object).fillna('').astype(str).str.split('.').str[0]
+    conditions = [codes.str.startswith(prefixes).to_numpy() for prefixes in BOARD_PREFIXES.values()]
+    return np.select(conditions, list(BOARD_PREFIXES), default='')
+
+
+def _round_price(values):
+    # 交易所价格按四舍五入保留两位小数，加一个极小量抵消 x.xx5 在二进制下略小于真实值的误差
+    return np.floor(values * 100 + 0.5 + 1e-6) / 100
+
+
+def calculate_limit_prices(symbols, prev_close, names, listing_days=None):
+    """
+    向量化计算涨停价和跌停价
+
+    板块规则与 ts_utils.calculate_upper_limit / calculate_lower_limit 相同：主板 ±10%（ST ±5%），
+    科创板/创业板 ±20%，北交所 ±30%；价格按交易所规则四舍五入到分（内置 round 在 x.xx5 时可能舍去）。
+    前收盘价无效、名称缺失（已退市）或板块无法识别时结果为 NaN。
+
+    Args:
+        symbols: 股票代码 Series
+        prev_close: 前收盘价 Series
+        names: 股票名称 Series，名称含 'ST' 视为 ST 股
+        listing_days: 可选，上市以来的交易日数（上市首日为 1），新股不适用常规涨跌幅的日期结果为 NaN
+
+    Returns:
+        (ndarray, ndarray): 涨停价, 跌停价
+    """
+    boards = classify_boards(symbols)
+    prev_close = pd.to_numeric(pd.Series(prev_close), errors='coerce').to_numpy(dtype='float64')
+    names = pd.Series(names, dtype=object)
+    is_st = names.str.contains('ST', regex=False, na=False).to_numpy()
+
+    ratios = np.select(
+        [boards == board for board in BOARD_LIMIT_RATIOS],
+        list(BOARD_LIMIT_RATIOS.values()),
+        default=np.nan
+    )
+    ratios = np.where((boards == 'main') & is_st, ST_LIMIT_RATIO, ratios)
+
+    valid = (prev_close > 0) & names.notna().to_numpy() & ~np.isnan(ratios)
+    if listing_days is not None:
+        listing_days = pd.to_numeric(pd.Series(listing_days), errors='coerce').to_numpy(dtype='float64')
+        no_limit_days = np.select(
+            [boards == board for board in NEW_LISTING_DAYS], list(NEW_LISTING_DAYS.values()), default=0
+        )
+        valid &= ~(listing_days <= no_limit_days)
+
+    upper = np.where(valid, _round_price(prev_close * (1 + ratios)), np.nan)
+    lower = np.where(valid, _round_price(prev_close * (1 - ratios)), np.nan)
+    return upper, lower
+
+
+def log_market_clean_result(failures):
+    """汇总按日清洗行情的失败情况（run_tasks 的返回值）"""
+    if failures:
+        logger.warning(f"行情数据清洗结束，{len(failures)} 个交易日失败，可稍后回补: {sorted(failures)[:20]}")
+    else:
+        logger.info("所有交易日数据处理完成")
+
+
+def fill_missing_limit_prices(frame, symbol_col, prev_close_col, name_col):
+    """
+    用 calculate_limit_prices 补齐数据源未给出（空值或 0）的 limit_up / limit_down，返回新表
+    """
+    missing_up = frame['limit_up'].isna() | (frame['limit_up'] == 0)
+    missing_down = frame['limit_down'].isna() | (frame['limit_down'] == 0)
+    rows = missing_up | missing_down
+    if not rows.any():
+        return frame
+    upper, lower = calculate_limit_prices(
+        frame.loc[rows, symbol_col], frame.loc[rows, prev_close_col], frame.loc[rows, name_col]
+    )
+    frame = frame.copy()
+    frame.loc[rows & missing_up, 'limit_up'] = upper[missing_up[rows].to_numpy()]
+    frame.loc[rows & missing_down, 'limit_down'] = lower[missing_down[rows].to_numpy()]
+    return frame
@@ -1,72 +1,244 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
 from panda_common.config import config
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 
+# 索引规格版本，修改下面的索引定义时加一，进程内已校验过的集合会重新校验
+INDEX_SCHEMA_VERSION = 1
 
-def ensure_collection_and_indexes(table_name):
-    """ 确保集合存在并创建所需的索引 """
-    try:
-        # 获取数据库对象
-        db = DatabaseHandler(config).mongo_client[config["MONGO_DB"]]
-        collection_name = table_name
-        # 检查集合是否存在
-        if collection_name not in db.list_collection_names():
-            # 创建集合
-            db.create_collection(collection_name)
-            logger.info(f"成功创建集合 {collection_name}")
-        # 获取集合对象
-        collection = db[collection_name]
-        # 获取现有的索引信息
-        existing_indexes = collection.index_information()
-        # 检查是否已存在所需的索引
-        if 'symbol_date_idx' not in existing_indexes:
-            # 创建复合索引
+# 行情/因子表的 (symbol, date) 复合索引
+SYMBOL_DATE_INDEX = {'name': 'symbol_date_idx', 'keys': [('symbol', 1), ('date', 1)]}
+SYMBOL_DATE_INDEX_TM = {'name': 'symbol_1_date_1', 'keys': [('symbol', 1), ('date', 1)]}
+# 按日期统计/查询用的单字段索引，按日计数时可只扫描索引
+DATE_INDEX = {'name': 'date_idx', 'keys': [('date', 1)]}
+
+
+def unique_key_index(fields: Sequence[str]) -> Dict:
+    """fields 上的唯一索引规格，$merge 写入的目标表需要（如 ('date', 'symbol') -> date_symbol_unique_idx）"""
+    return {'name': f"{'_'.join(fields)}_unique_idx", 'keys': [(field, 1) for field in fields], 'unique': True}
+
+
+class IndexRegistry:
+    """
+    进程内的集合与索引校验缓存
+
+    每个 (数据库, 集合) 只在第一次使用时校验一次：检查集合是否存在、列出索引，
+    缺失的索引交给后台线程创建，不阻塞写入。之后同一规格、同一版本的调用直接返回，
+    不再向 MongoDB 发送管理命令。调用 invalidate() 或规格/版本变化时重新校验。
+    """
+
+    def __init__(self):
+        self._verified: Dict[Tuple[str, str], set] = {}
+        self._pending: Dict[Tuple, threading.Thread] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _signature(indexes: Sequence[Dict], version: int) -> Tuple:
+        return version, tuple(
+            (spec['name'], tuple(map(tuple, spec['keys'])), bool(spec.get('unique'))) for spec in indexes
+        )
+
+    def ensure(self, db, collection_name: str, indexes: Sequence[Dict], version: int = INDEX_SCHEMA_VERSION,
+               background: bool = True, force: bool = False):
+        """
+        确保集合存在且包含 indexes 中的索引
+
+        Args:
+            db: pymongo Database
+            collection_name: 集合名
+            indexes: 索引规格列表，每项形如 {'name': 'symbol_date_idx', 'keys': [('symbol', 1), ('date', 1)]}
+            version: 规格版本，与缓存中的版本不同则重新校验
+            background: True 时缺失索引由后台线程创建，False 时在当前线程创建完再返回
+            force: True 时忽略缓存重新校验
+        """
+        key = (db.name, collection_name)
+        signature = self._signature(indexes, version)
+        if not force and signature in self._verified.get(key, ()):
+            return
+
+        with self._key_lock(key):
+            # 等锁期间其他线程可能已经完成校验
+            if not force and signature in self._verified.get(key, ()):
+                return
+
+            if not db.list_collection_names(filter={'name': collection_name}):
+                db.create_collection(collection_name)
+                logger.info(f"成功创建集合 {collection_name}")
+
+            collection = db[collection_name]
+            existing = collection.index_information()
+            existing_keys = {
+                (tuple(map(tuple, info['key'])), bool(info.get('unique'))) for info in existing.values()
+            }
+            # 同名或键与唯一性完全相同（可能由其他脚本以不同名称创建）的索引都视为已存在
+            missing = [
+                spec for spec in indexes
+                if spec['name'] not in existing
+                and (tuple(map(tuple, spec['keys'])), bool(spec.get('unique'))) not in existing_keys
+            ]
+
+            if not missing:
+                self._mark_verified(key, signature)
+                return
+
+            if not background:
+                self._create_indexes(collection, missing)
+                self._mark_verified(key, signature)
+                return
+
+            # 先记为已校验，避免其他线程重复发起创建；创建失败时再清除
+            self._mark_verified(key, signature)
+            thread = threading.Thread(
+                target=self._create_in_background,
+                args=(key, signature, collection, missing),
+                name=f"create-index-{collection_name}",
+                daemon=True,
+            )
+            self._pending[(key, signature)] = thread
+            thread.start()
+
+    def _mark_verified(self, key, signature):
+        # 同一集合可以有多组索引规格（如写入用的 symbol_date 和统计用的 date），分别缓存
+        self._verified.setdefault(key, set()).add(signature)
+
+    @staticmethod
+    def _create_indexes(collection, indexes: Sequence[Dict]):
+        for spec in indexes:
             collection.create_index(
-                [
-                    ('symbol', 1),
-                    ('date', 1)
-                ],
-                name='symbol_date_idx',  # 指定索引名称
+                spec['keys'],
+                name=spec['name'],  # 指定索引名称
+                unique=bool(spec.get('unique')),
                 background=True  # 后台创建索引，不阻塞其他数据库操作
             )
-            logger.info("成功创建索引 symbol_date_idx")
-        else:
-            logger.info("索引 symbol_date_idx 已存在")
+            logger.info(f"成功创建索引 {collection.name}.{spec['name']}")
+
+    def _create_in_background(self, key, signature, collection, indexes):
+        try:
+            self._create_indexes(collection, indexes)
+        except Exception as e:
+            logger.error(f"后台创建索引失败 {collection.name}: {str(e)}")
+            self._verified.get(key, set()).discard(signature)
+        finally:
+            self._pending.pop((key, signature), None)
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待所有后台索引创建完成"""
+        for thread in list(self._pending.values()):
+            thread.join(timeout)
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        """清除校验缓存（集合被删除或重建后调用），不指定集合时清除全部"""
+        for key in list(self._verified):
+            if collection_name is None or key[1] == collection_name:
+                self._verified.pop(key, None)
 
+    def get_status(self) -> Dict[str, List[str]]:
+        return {
+            'verified': [f"{db_name}.{name}" for db_name, name in self._verified],
+            'pending': sorted({f"{db_name}.{name}" for (db_name, name), _ in self._pending}),
+        }
+
+
+index_registry = IndexRegistry()
+
+
+class DailyCountCache:
+    """
+    每日记录数缓存 {(数据库, 表名, 日期): (记录数, 缓存时间)}
+
+    只缓存今天之前且有数据的日期（记录数为 0 的日期可能稍后被回补）。write_records 和
+    BackfillJob 写入后调用 invalidate() 清除对应日期；超过 ttl 秒的缓存视为失效，
+    兜底不经过这些写入路径的数据修改。
+    """
+
+    def __init__(self, ttl: float = 3600, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, db_name: str, table: str, dates) -> Tuple[Dict[str, int], List[str]]:
+        """返回 (已缓存的 {日期: 记录数}, 未缓存的日期)"""
+        now = self._clock()
+        counts, missing = {}, []
+        with self._lock:
+            for date in dates:
+                entry = self._entries.get((db_name, table, date))
+                if entry is None or now - entry[1] > self.ttl:
+                    missing.append(date)
+                else:
+                    counts[date] = entry[0]
+        return counts, missing
+
+    def put_many(self, db_name: str, table: str, counts: Dict[str, int]):
+        today = datetime.now().strftime("%Y%m%d")
+        now = self._clock()
+        with self._lock:
+            for date, count in counts.items():
+                if date < today and count > 0:
+                    self._entries[(db_name, table, date)] = (count, now)
+
+    def invalidate(self, db_name: Optional[str] = None, table: Optional[str] = None, dates=None):
+        """清除匹配的缓存，参数为 None 时不按该项过滤"""
+        dates = None if dates is None else set(dates)
+        with self._lock:
+            for key in list(self._entries):
+                if ((db_name is None or key[0] == db_name) and (table is None or key[1] == table)
+                        and (dates is None or key[2] in dates)):
+                    del self._entries[key]
+
+
+daily_count_cache = DailyCountCache(ttl=float((config or {}).get('DAILY_COUNT_CACHE_TTL') or 3600))
+
+
+def count_documents_by_date(db, table, dates):
+    """
+    用一次 $match + $group 聚合统计 table 在 dates 中每天的记录数
+
+    date 上的索引在首次调用时后台创建，建好后聚合只需扫描索引。
+
+    :return: {日期: 记录数}，没有记录的日期不在结果中
+    """
+    if not dates:
+        return {}
+    try:
+        index_registry.ensure(db, table, [DATE_INDEX])
+    except Exception as e:
+        # 索引只影响速度，不影响统计结果
+        logger.warning(f"确保 {table} 的日期索引失败: {str(e)}")
+    pipeline = [
+        {"$match": {"date": {"$in": list(dates)}}},
+        {"$group": {"_id": "$date", "count": {"$sum": 1}}},
+    ]
+    return {doc["_id"]: doc["count"] for doc in db[table].aggregate(pipeline)}
+
+
+def ensure_collection_and_indexes(table_name, force=False):
+    """ 确保集合存在并创建所需的索引（每个进程每个集合只校验一次） """
+    try:
+        # 获取数据库对象
+        db = DatabaseHandler(config).mongo_client[config["MONGO_DB"]]
+        index_registry.ensure(db, table_name, [SYMBOL_DATE_INDEX], force=force)
     except Exception as e:
         logger.error(f"创建集合或索引失败: {str(e)}")
         raise  # 抛出异常，因为这是初始化的关键步骤
 
 
-def ensure_collection_and_indexes_tm(table_name):
-    """ 确保集合存在并创建所需的索引 """
+def ensure_collection_and_indexes_tm(table_name, force=False):
+    """ 确保集合存在并创建所需的索引（每个进程每个集合只校验一次） """
     try:
         # 获取数据库对象
         db = DatabaseHandler(config).mongo_client[config["MONGO_DB"]]
-        collection_name = table_name
-        # 检查集合是否存在
-        if collection_name not in db.list_collection_names():
-            # 创建集合
-            db.create_collection(collection_name)
-            logger.info(f"成功创建集合 {collection_name}")
-        # 获取集合对象
-        collection = db[collection_name]
-        # 获取现有的索引信息
-        existing_indexes = collection.index_information()
-        # 检查是否已存在所需的索引
-        if 'symbol_1_date_1' not in existing_indexes:
-            # 创建复合索引
-            collection.create_index(
-                [
-                    ('symbol', 1),
-                    ('date', 1)
-                ],
-                name='symbol_1_date_1',  # 指定索引名称
-                background=True  # 后台创建索引，不阻塞其他数据库操作
-            )
-            logger.info("成功创建索引 symbol_1_date_1")
-        else:
-            logger.info("索引 symbol_1_date_1 已存在")
+        index_registry.ensure(db, table_name, [SYMBOL_DATE_INDEX_TM], force=force)
     except Exception as e:
         logger.error(f"创建集合或索引失败: {str(e)}")
         raise  # 抛出异常，因为这是初始化的关键步骤
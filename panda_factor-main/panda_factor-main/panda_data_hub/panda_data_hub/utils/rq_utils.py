@@ -15,6 +15,10 @@ def rq_is_trading_day(date):
         logger.error(f"检查交易日失败 {date}: {str(e)}")
         return False
 
+def rq_get_trading_dates(start_date, end_date):
+    """一次查询区间内的全部交易日，作为共享交易日历的数据源"""
+    return rqdatac.get_trading_dates(start_date=start_date, end_date=end_date)
+
 def get_index_components(start_date, end_date):
     try:
         # 沪深300
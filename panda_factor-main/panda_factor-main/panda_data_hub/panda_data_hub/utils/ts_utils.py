@@ -122,6 +122,22 @@ def ts_is_trading_day(date):
         logger.error(f"检查交易日失败 {date}: {str(e)}")
         return False
 
+def ts_get_trading_dates(start_date, end_date):
+    """
+    一次查询区间内的全部交易日，作为共享交易日历的数据源
+
+    参数:
+    start_date, end_date: 日期字符串，格式为 "YYYYMMDD"
+
+    返回:
+    list: 区间内的交易日 (YYYYMMDD)
+    """
+    cal_df = ts.pro_api().query('trade_cal',
+                                exchange='SSE',
+                                start_date=start_date.replace('-', ''),
+                                end_date=end_date.replace('-', ''))
+    return cal_df.loc[cal_df['is_open'].astype(int) == 1, 'cal_date'].tolist()
+
 def get_previous_month_dates(date_str):
     """
     根据日期字符串获取上个月的中间日和最后一日
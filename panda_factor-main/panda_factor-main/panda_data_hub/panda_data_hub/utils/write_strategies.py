@@ -0,0 +1,217 @@
+"""
+行情/因子表的批量写入策略
+
+清洗服务把一天的全市场记录交给 write_records()，由配置决定写入方式：
+
+- upsert: 按 (date, symbol) 的 UpdateOne upsert，无序 bulk_write（默认，保留 $set 合并语义）
+- ordered_upsert: 同上但有序写入，即改造前的行为
+- replace_day: 先删除记录涉及的日期，再 insert_many，适合整日重灌的历史回补
+- merge: 写入临时集合后用 $merge 合并进目标表，$merge 要求目标表在 (date, symbol) 上有唯一索引，
+  首次写入时创建 date_symbol_unique_idx；已有重复记录导致无法创建时退回 upsert
+
+配置示例（config.yaml）::
+
+    WRITE_STRATEGY: upsert                # 所有集合
+    WRITE_STRATEGY:                       # 或按集合指定
+      stock_market: replace_day
+      factor_base: upsert
+    WRITE_BATCH_SIZE: 5000
+
+每次写入都会记录文档数、耗时和每秒文档数，累计统计可通过 get_write_stats() 查看。
+"""
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+from pymongo import UpdateOne
+
+from panda_common.logger_config import logger
+from panda_data_hub.utils.mongo_utils import daily_count_cache, index_registry, unique_key_index
+
+DEFAULT_WRITE_STRATEGY = 'upsert'
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_KEY_FIELDS = ('date', 'symbol')
+
+
+def _batches(records: Sequence[Dict], batch_size: int):
+    for start in range(0, len(records), batch_size):
+        yield records[start:start + batch_size]
+
+
+class WriteStrategy(ABC):
+    """写入策略基类，write() 返回写入的文档数"""
+
+    name = 'base'
+
+    def __init__(self, key_fields: Sequence[str] = DEFAULT_KEY_FIELDS, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.key_fields = tuple(key_fields)
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def write(self, collection, records: List[Dict]) -> int:
+        pass
+
+
+class UpsertStrategy(WriteStrategy):
+    """按主键 upsert，ordered=False 时服务端可并行执行且单条失败不影响其余记录"""
+
+    name = 'upsert'
+
+    def __init__(self, ordered: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.ordered = ordered
+        self.name = 'upsert' if not ordered else 'ordered_upsert'
+
+    def write(self, collection, records: List[Dict]) -> int:
+        for batch in _batches(records, self.batch_size):
+            operations = [
+                UpdateOne({field: record[field] for field in self.key_fields}, {'$set': record}, upsert=True)
+                for record in batch
+            ]
+            collection.bulk_write(operations, ordered=self.ordered)
+        return len(records)
+
+
+class ReplaceDayStrategy(WriteStrategy):
+    """
+    删除记录涉及的日期后整批插入
+
+    写入的是当日全量数据，会覆盖该日已有文档中不在本次记录里的字段；
+    删除与插入之间该日数据短暂为空。
+    """
+
+    name = 'replace_day'
+
+    def write(self, collection, records: List[Dict]) -> int:
+        dates = sorted({record['date'] for record in records})
+        collection.delete_many({'date': {'$in': dates}})
+        for batch in _batches(records, self.batch_size):
+            # insert_many 会给传入的字典加 _id，复制一份避免修改调用方的数据
+            collection.insert_many([dict(record) for record in batch], ordered=False)
+        return len(records)
+
+
+class MergeStrategy(WriteStrategy):
+    """写入临时集合后 $merge 到目标表，合并在服务端一次完成"""
+
+    name = 'merge'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._fallback = UpsertStrategy(key_fields=self.key_fields, batch_size=self.batch_size)
+        self._unique_checked: Dict[str, bool] = {}
+
+    def _unique_key_exists(self, collection) -> bool:
+        wanted = set(self.key_fields)
+        return any(
+            info.get('unique') and {field for field, _ in info['key']} == wanted
+            for info in collection.index_information().values()
+        )
+
+    def _has_unique_key(self, collection) -> bool:
+        """确保目标表有主键唯一索引，已有重复记录导致无法创建时返回 False"""
+        checked = self._unique_checked.get(collection.full_name)
+        if checked is None:
+            checked = self._unique_key_exists(collection)
+            if not checked:
+                try:
+                    index_registry.ensure(collection.database, collection.name,
+                                          [unique_key_index(self.key_fields)], background=False)
+                    checked = self._unique_key_exists(collection)
+                except Exception as e:
+                    logger.warning(f"{collection.name} 创建 {self.key_fields} 唯一索引失败: {e}")
+            self._unique_checked[collection.full_name] = checked
+            if not checked:
+                logger.warning(f"{collection.name} 缺少 {self.key_fields} 唯一索引，$merge 不可用，改用 upsert 写入")
+        return checked
+
+    def write(self, collection, records: List[Dict]) -> int:
+        if not self._has_unique_key(collection):
+            return self._fallback.write(collection, records)
+
+        staging = collection.database[f"{collection.name}__staging_{uuid.uuid4().hex[:12]}"]
+        try:
+            for batch in _batches(records, self.batch_size):
+                staging.insert_many([dict(record) for record in batch], ordered=False)
+            staging.aggregate([
+                {'$project': {'_id': 0}},
+                {'$merge': {
+                    'into': collection.name,
+                    'on': list(self.key_fields),
+                    'whenMatched': 'merge',
+                    'whenNotMatched': 'insert',
+                }},
+            ])
+        finally:
+            staging.drop()
+        return len(records)
+
+
+WRITE_STRATEGIES = {
+    'upsert': lambda **kwargs: UpsertStrategy(ordered=False, **kwargs),
+    'ordered_upsert': lambda **kwargs: UpsertStrategy(ordered=True, **kwargs),
+    'replace_day': ReplaceDayStrategy,
+    'merge': MergeStrategy,
+}
+
+_strategies: Dict[tuple, WriteStrategy] = {}
+_strategies_lock = threading.Lock()
+_stats: Dict[str, Dict] = {}
+_stats_lock = threading.Lock()
+
+
+def get_write_strategy(collection_name: str, config: Optional[Dict] = None) -> WriteStrategy:
+    """按配置 WRITE_STRATEGY（字符串或 {集合: 策略}）获取集合的写入策略，进程内复用"""
+    config = config or {}
+    setting = config.get('WRITE_STRATEGY') or DEFAULT_WRITE_STRATEGY
+    if isinstance(setting, dict):
+        setting = setting.get(collection_name) or setting.get('default') or DEFAULT_WRITE_STRATEGY
+    if setting not in WRITE_STRATEGIES:
+        raise ValueError(f"Unknown write strategy '{setting}', expected one of {list(WRITE_STRATEGIES)}")
+
+    batch_size = int(config.get('WRITE_BATCH_SIZE') or DEFAULT_BATCH_SIZE)
+    key = (collection_name, setting, batch_size)
+    strategy = _strategies.get(key)
+    if strategy is None:
+        with _strategies_lock:
+            strategy = _strategies.setdefault(key, WRITE_STRATEGIES[setting](batch_size=batch_size))
+    return strategy
+
+
+def write_records(db, collection_name: str, records: List[Dict], config: Optional[Dict] = None,
+                  strategy: Optional[WriteStrategy] = None) -> int:
+    """
+    按写入策略把 records 写入 db[collection_name]，并记录吞吐，写入的日期从每日记录数缓存中清除
+
+    Returns:
+        int: 写入的文档数
+    """
+    if not records:
+        return 0
+    strategy = strategy or get_write_strategy(collection_name, config)
+    start = time.perf_counter()
+    try:
+        written = strategy.write(db[collection_name], records)
+    finally:
+        daily_count_cache.invalidate(db.name, collection_name, {record.get('date') for record in records})
+    elapsed = time.perf_counter() - start
+
+    rate = written / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"{collection_name} 写入 {written} 条 ({strategy.name})，耗时 {elapsed:.2f}s，{rate:.0f} docs/s")
+    with _stats_lock:
+        stats = _stats.setdefault(f"{collection_name}:{strategy.name}", {'documents': 0, 'seconds': 0.0, 'writes': 0})
+        stats['documents'] += written
+        stats['seconds'] += elapsed
+        stats['writes'] += 1
+    return written
+
+
+def get_write_stats() -> Dict[str, Dict]:
+    """各集合、各策略的累计写入量和平均吞吐"""
+    with _stats_lock:
+        return {
+            key: {**stats, 'docs_per_sec': stats['documents'] / stats['seconds'] if stats['seconds'] else 0.0}
+            for key, stats in _stats.items()
+        }
@@ -1,3 +1,4 @@
+import pandas as pd
 from xtquant import xtdata
 from panda_common.logger_config import logger
 from xtquant import xtdatacenter as xtdc
@@ -61,6 +62,18 @@ def xt_is_trading_day(date):
         return False
 
 
+def xt_get_trading_dates(start_date, end_date):
+    """
+    一次查询区间内的全部交易日，作为共享交易日历的数据源
+
+    xtdata 返回的是北京时间零点的毫秒时间戳，这里转换为 YYYYMMDD 字符串
+    """
+    timestamps = xtdata.get_trading_dates(market='SH', start_time=start_date.replace('-', ''),
+                                          end_time=end_date.replace('-', ''))
+    dates = pd.to_datetime(timestamps, unit='ms', utc=True).tz_convert('Asia/Shanghai')
+    return list(dates.strftime('%Y%m%d'))
+
+
 def get_xt_suffix(code):
     code = code.split('.')[0]
 
@@ -105,6 +118,23 @@ def xt_get_amount(stock_code,date):
         logger.error(f"Error getting amount for {stock_code}: {str(e)}")
         return 0
 
+def xt_get_amounts(stock_codes, start_date, end_date):
+    """
+    一次取回多只股票在 [start_date, end_date] (YYYYMMDD) 内的日成交额
+
+    返回 ts_code、date(YYYYMMDD)、amount 三列的长表，没有数据的股票/日期不在结果中
+    """
+    price_data = xtdata.get_market_data_ex(
+        field_list=['amount'], stock_list=list(stock_codes), period='1d',
+        start_time=start_date,
+        end_time=end_date, count=-1, dividend_type='none', fill_data=True)
+    frames = {code: frame[['amount']] for code, frame in price_data.items() if frame is not None and not frame.empty}
+    if not frames:
+        return pd.DataFrame(columns=['ts_code', 'date', 'amount'])
+    amounts = pd.concat(frames, names=['ts_code', 'date']).reset_index()
+    amounts['date'] = amounts['date'].astype(str).str[:8]
+    return amounts
+
 def get_stock_name(stock_code):
     try:
         detail = xtdata.get_instrument_detail(stock_code)
@@ -1,9 +1,11 @@
 import math
 
-from statsmodels.tsa.stattools import acf
 from panda_factor.analysis.factor_func import *
 from panda_common.models.chart_data import *
-from scipy.stats import ttest_1samp
+from panda_common.utils.lazy_import import lazy_attribute
+
+acf = lazy_attribute('statsmodels.tsa.stattools', 'acf')
+ttest_1samp = lazy_attribute('scipy.stats', 'ttest_1samp')
 
 from panda_common.config import config
 from panda_common.handlers.database_handler import DatabaseHandler
@@ -2,14 +2,17 @@ import pandas as pd
 import numpy as np
 import os
 import logging
-import statsmodels.api as sm
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-from scipy.stats import norm
-from scipy.stats import ttest_ind
-from IPython.display import display
 
 import panda_data
+from panda_common.utils.lazy_import import lazy_module, lazy_attribute
+
+# 绘图、统计类依赖较重，首次使用时才导入，避免拖慢服务启动和 worker 进程创建
+sm = lazy_module('statsmodels.api')
+plt = lazy_module('matplotlib.pyplot')
+ticker = lazy_module('matplotlib.ticker')
+norm = lazy_attribute('scipy.stats', 'norm')
+ttest_ind = lazy_attribute('scipy.stats', 'ttest_ind')
+display = lazy_attribute('IPython.display', 'display', fallback=print)
 
 
 # def cal_hfq(df:pd.DataFrame) -> pd.DataFrame:
@@ -15,11 +15,16 @@ Author: PandaQuantFlow Team
 Reference: Zhang et al., "Subspace-Constrained Graph Unlearning", KBS 2025
 """
 
+import copy
+import warnings
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.nn import RGCNConv, RGATConv
 from torch_geometric.data import Data
+from torch_geometric.loader import LinkNeighborLoader
+
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
@@ -36,6 +41,14 @@ class FactorGraphConfig:
     dropout: float = 0.1
     num_layers: int = 2
     similarity_threshold: float = 0.6
+    top_k: Optional[int] = None  # Keep only the k strongest correlations per node (None = threshold only)
+    corr_block_size: int = 1024  # Rows of the correlation matrix computed at a time
+    degree_weighted_negatives: bool = False  # Draw negative sources proportional to node degree
+    # Mini-batch training: fanout per layer, e.g. [15, 10] (None = full-batch)
+    num_neighbors: Optional[List[int]] = None
+    batch_size: int = 1024  # Seed edges per mini-batch
+    num_workers: int = 0  # Data loading workers for the neighbor sampler
+    num_threads: int = 0  # CPU threads for training (0 = torch default)
 
 
 class FactorRGCN(nn.Module):
@@ -148,21 +161,27 @@ class FactorGNNDelete(FactorRGCN):
             self.deletion2 = None
     
     def forward(self, x: torch.Tensor, edge_index: torch.Tensor, 
-                edge_type: torch.Tensor, return_all_emb: bool = False):
-        """Forward pass with deletion constraints"""
+                edge_type: torch.Tensor, return_all_emb: bool = False,
+                n_id: Optional[torch.Tensor] = None):
+        """
+        Forward pass with deletion constraints
+        
+        n_id maps the nodes of a sampled subgraph to global node ids, so the
+        deletion masks can be applied in mini-batch training.
+        """
         x = self.node_emb(x)
         
         # Layer 1 with deletion
         x1 = self.conv1(x, edge_index, edge_type)
         x1 = self.relu(x1)
         if self.deletion1 is not None:
-            x1 = self.deletion1(x1)
+            x1 = self.deletion1(x1, n_id)
         x1 = self.dropout(x1)
         
         # Layer 2 with deletion
         x2 = self.conv2(x1, edge_index, edge_type)
         if self.deletion2 is not None:
-            x2 = self.deletion2(x2)
+            x2 = self.deletion2(x2, n_id)
         
         if return_all_emb:
             return x1, x2
@@ -185,11 +204,12 @@ class DeletionLayer(nn.Module):
         # Learnable deletion weights
         self.deletion_weight = nn.Parameter(torch.ones(dim))
         
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, n_id: Optional[torch.Tensor] = None) -> torch.Tensor:
         """Apply deletion constraint to node embeddings"""
         # Only apply deletion to nodes in the deletion set
+        mask = self.node_mask if n_id is None else self.node_mask[n_id]
         x_deleted = x.clone()
-        x_deleted[self.node_mask] = x[self.node_mask] * self.deletion_weight
+        x_deleted[mask] = x[mask] * self.deletion_weight
         return x_deleted
 
 
@@ -224,65 +244,41 @@ class FactorGraphBuilder:
         # Extract unique entities
         factors = factor_df['factor_name'].unique()
         stocks = factor_df['symbol'].unique()
-        dates = factor_df['date'].unique()
-        
-        # Create node mapping
-        node_to_idx = {}
-        idx = 0
-        
-        # Factor nodes
-        for factor in factors:
-            node_to_idx[f'factor_{factor}'] = idx
-            idx += 1
-        
-        # Stock nodes
-        for stock in stocks:
-            node_to_idx[f'stock_{stock}'] = idx
-            idx += 1
         
+        # Create node mapping: factor nodes first, then stock nodes
+        num_factors = len(factors)
+        node_to_idx = {f'factor_{factor}': i for i, factor in enumerate(factors)}
+        node_to_idx.update({f'stock_{stock}': num_factors + i for i, stock in enumerate(stocks)})
         num_nodes = len(node_to_idx)
         
-        # Build edges
-        edge_list = []
-        edge_types = []
+        edge_blocks = []
+        type_blocks = []
+        
+        def add_edges(src: np.ndarray, dst: np.ndarray, relation: int):
+            edge_blocks.append(np.stack([src, dst]))
+            type_blocks.append(np.full(len(src), relation, dtype=np.int64))
         
         # 1. Factor-Stock edges (relation type 0)
-        for _, row in factor_df.iterrows():
-            factor_idx = node_to_idx[f'factor_{row["factor_name"]}']
-            stock_idx = node_to_idx[f'stock_{row["symbol"]}']
-            
-            if not pd.isna(row['value']) and abs(row['value']) > 0.01:
-                edge_list.append([factor_idx, stock_idx])
-                edge_types.append(0)
+        values = pd.to_numeric(factor_df['value'], errors='coerce').to_numpy(dtype=float)
+        keep = np.abs(values) > 0.01  # NaN compares False
+        factor_codes = pd.Index(factors).get_indexer(factor_df['factor_name'])
+        stock_codes = pd.Index(stocks).get_indexer(factor_df['symbol'])
+        add_edges(factor_codes[keep], num_factors + stock_codes[keep], 0)
         
         # 2. Factor-Factor edges (relation type 1)
         if factor_correlations is not None:
-            for i, factor1 in enumerate(factors):
-                for j, factor2 in enumerate(factors):
-                    if i < j:
-                        corr = factor_correlations.loc[factor1, factor2]
-                        if abs(corr) > self.config.similarity_threshold:
-                            idx1 = node_to_idx[f'factor_{factor1}']
-                            idx2 = node_to_idx[f'factor_{factor2}']
-                            edge_list.append([idx1, idx2])
-                            edge_types.append(1)
+            corr = factor_correlations.reindex(index=factors, columns=factors).to_numpy(dtype=float)
+            src, dst = self._select_pairs(corr, len(factors))
+            add_edges(src, dst, 1)
         
         # 3. Stock-Stock edges (relation type 2)
-        # Compute stock correlations from returns
-        stock_corr = stock_returns.corr()
-        for i, stock1 in enumerate(stocks):
-            for j, stock2 in enumerate(stocks):
-                if i < j and stock1 in stock_corr.index and stock2 in stock_corr.columns:
-                    corr = stock_corr.loc[stock1, stock2]
-                    if abs(corr) > self.config.similarity_threshold:
-                        idx1 = node_to_idx[f'stock_{stock1}']
-                        idx2 = node_to_idx[f'stock_{stock2}']
-                        edge_list.append([idx1, idx2])
-                        edge_types.append(2)
+        # Correlations are computed blockwise from returns, never materializing the full matrix
+        src, dst = self._stock_correlation_pairs(stock_returns, stocks)
+        add_edges(num_factors + src, num_factors + dst, 2)
         
         # Convert to tensors
-        edge_index = torch.tensor(edge_list, dtype=torch.long).t()
-        edge_type = torch.tensor(edge_types, dtype=torch.long)
+        edge_index = torch.from_numpy(np.concatenate(edge_blocks, axis=1).astype(np.int64))
+        edge_type = torch.from_numpy(np.concatenate(type_blocks))
         
         # Create bidirectional edges
         edge_index = torch.cat([edge_index, edge_index.flip(0)], dim=1)
@@ -297,6 +293,127 @@ class FactorGraphBuilder:
         
         return data
     
+    def _stock_correlation_pairs(self, stock_returns: pd.DataFrame,
+                                 stocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select correlated stock pairs from a returns matrix
+        
+        Returns are standardized once and correlations are computed one block of
+        rows at a time (corr_block_size x num_stocks), so memory stays bounded for
+        thousands of stocks. Stocks missing from stock_returns get no edges.
+        Missing values are handled blockwise with pairwise-complete observations,
+        matching pandas' DataFrame.corr().
+        """
+        returns = stock_returns.reindex(columns=stocks)
+        values = returns.to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        
+        if not valid.all():
+            return self._select_pairs(self._pairwise_corr_blocks(values, valid), len(stocks))
+        
+        num_obs = values.shape[0]
+        if num_obs < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        centered = values - values.mean(axis=0)
+        std = np.sqrt((centered ** 2).sum(axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            standardized = centered / std  # Constant series become NaN, as in pandas
+        
+        def corr_block(start: int, stop: int) -> np.ndarray:
+            return standardized[:, start:stop].T @ standardized
+        
+        return self._select_pairs(corr_block, len(stocks))
+    
+    @staticmethod
+    def _pairwise_corr_blocks(values: np.ndarray, valid: np.ndarray):
+        """
+        Blockwise pairwise-complete correlation for returns with missing values
+        
+        For each pair (i, j) only the rows where both series are observed are used,
+        via masked sums: with M the observation mask and X the returns (0 where
+        missing), n = Mi'Mj, Sx = Xi'Mj, Sy = Mi'Xj, Sxx = (Xi^2)'Mj, Syy = Mi'(Xj^2)
+        and Sxy = Xi'Xj. Pairs with fewer than two common observations or zero
+        variance are NaN. Columns are centered on their own means first to keep
+        the sums well conditioned.
+        
+        Returns:
+            Function (start, stop) -> correlation rows[start:stop]
+        """
+        mask = valid.astype(float)
+        counts = mask.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            means = np.where(counts > 0, np.nansum(values, axis=0) / np.maximum(counts, 1), 0.0)
+        x = np.where(valid, values - means, 0.0)
+        x2 = x * x
+        
+        def corr_block(start: int, stop: int) -> np.ndarray:
+            mask_i, x_i = mask[:, start:stop], x[:, start:stop]
+            n = mask_i.T @ mask
+            sum_x = x_i.T @ mask
+            sum_y = mask_i.T @ x
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cov = x_i.T @ x - sum_x * sum_y / n
+                var_x = x2[:, start:stop].T @ mask - sum_x ** 2 / n
+                var_y = mask_i.T @ x2 - sum_y ** 2 / n
+                corr = cov / np.sqrt(var_x * var_y)
+            corr[(n < 2) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+            return np.clip(corr, -1.0, 1.0)
+        
+        return corr_block
+    
+    def _select_pairs(self, corr, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Turn a correlation matrix into upper-triangular COO pairs (i < j)
+        
+        Args:
+            corr: Dense [n, n] matrix, or a function (start, stop) -> rows[start:stop]
+            n: Number of entities
+        
+        Returns:
+            (src, dst) index arrays in row-major order. With top_k set, a pair is
+            kept if either endpoint ranks it among its k strongest correlations
+            (and it still passes similarity_threshold).
+        """
+        threshold = self.config.similarity_threshold
+        top_k = self.config.top_k
+        block_size = max(1, self.config.corr_block_size)
+        srcs, dsts = [], []
+        
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            block = np.abs(corr(start, stop) if callable(corr) else corr[start:stop])
+            rows = np.arange(start, stop)
+            block[rows - start, rows] = np.nan  # Ignore self-correlation
+            
+            with np.errstate(invalid='ignore'):
+                passed = block > threshold
+            
+            if top_k is not None and top_k < n - 1:
+                ranked = np.where(np.isnan(block), -np.inf, block)
+                nearest = np.argpartition(-ranked, top_k, axis=1)[:, :top_k]
+                in_top = np.zeros_like(passed)
+                np.put_along_axis(in_top, nearest, True, axis=1)
+                row_idx, col_idx = np.nonzero(passed & in_top)
+                row_idx = row_idx + start
+                srcs.append(np.minimum(row_idx, col_idx))
+                dsts.append(np.maximum(row_idx, col_idx))
+            else:
+                row_idx, col_idx = np.nonzero(passed)
+                row_idx = row_idx + start
+                upper = col_idx > row_idx
+                srcs.append(row_idx[upper])
+                dsts.append(col_idx[upper])
+        
+        if not srcs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        src = np.concatenate(srcs).astype(np.int64)
+        dst = np.concatenate(dsts).astype(np.int64)
+        if top_k is not None:
+            # Pairs picked from both endpoints appear twice; unique also restores row-major order
+            pair_ids = np.unique(src * n + dst)
+            src, dst = pair_ids // n, pair_ids % n
+        return src, dst
+    
     def mark_deletion_edges(self, data: Data, factor_names: List[str]) -> torch.Tensor:
         """
         Mark edges involving specific factors for deletion
@@ -320,6 +437,131 @@ class FactorGraphBuilder:
         return deletion_mask
 
 
+class NegativeSampler:
+    """
+    Batched negative edge sampler
+    
+    Existing edges are encoded once as sorted int64 keys (src * num_nodes + dst).
+    Candidates are drawn in bulk, and self-loops and existing edges are rejected
+    with a vectorized searchsorted lookup. This repeats until enough negatives are found.
+    
+    When most candidate pairs are already edges (e.g. factor -> stock on a dense panel),
+    rejection would waste its rounds, so the free pairs are enumerated and drawn directly.
+    If fewer free pairs exist than requested, type constraints are dropped with a warning.
+    """
+    
+    # Enumerate free pairs when they are at most this fraction of the candidate pairs
+    DENSE_FRACTION = 0.5
+    # ... and the candidate pairs fit in memory
+    MAX_ENUMERATE = 10_000_000
+    
+    def __init__(self, edge_index: torch.Tensor, num_nodes: int, max_rounds: int = 20):
+        self.num_nodes = num_nodes
+        self.max_rounds = max_rounds
+        self.device = edge_index.device
+        edge_index = edge_index.cpu()
+        self.edge_keys = torch.unique(edge_index[0] * num_nodes + edge_index[1])
+        self.degree = torch.bincount(edge_index.flatten(), minlength=num_nodes).float()
+    
+    def _mask(self, nodes: Optional[torch.Tensor]) -> torch.Tensor:
+        if nodes is None:
+            return torch.ones(self.num_nodes, dtype=torch.bool)
+        mask = torch.zeros(self.num_nodes, dtype=torch.bool)
+        mask[nodes] = True
+        return mask
+    
+    def free_pairs(self, src_nodes: Optional[torch.Tensor] = None,
+                   dst_nodes: Optional[torch.Tensor] = None) -> Tuple[int, int]:
+        """Number of candidate pairs (self-loops excluded) and of those that are not existing edges"""
+        src_mask, dst_mask = self._mask(src_nodes), self._mask(dst_nodes)
+        candidates = int(src_mask.sum()) * int(dst_mask.sum()) - int((src_mask & dst_mask).sum())
+        edge_src = self.edge_keys // self.num_nodes
+        edge_dst = self.edge_keys % self.num_nodes
+        existing = int((src_mask[edge_src] & dst_mask[edge_dst] & (edge_src != edge_dst)).sum())
+        return candidates, candidates - existing
+    
+    def _draw(self, candidates: Optional[torch.Tensor], count: int,
+              degree_weighted: bool) -> torch.Tensor:
+        if degree_weighted:
+            weights = self.degree if candidates is None else self.degree[candidates]
+            # Isolated nodes keep a small chance of being drawn
+            picks = torch.multinomial(weights + 1e-6, count, replacement=True)
+            return picks if candidates is None else candidates[picks]
+        if candidates is None:
+            return torch.randint(0, self.num_nodes, (count,))
+        return candidates[torch.randint(0, len(candidates), (count,))]
+    
+    def _draw_free(self, num_samples: int, src_nodes: Optional[torch.Tensor],
+                   dst_nodes: Optional[torch.Tensor], degree_weighted: bool) -> torch.Tensor:
+        """Enumerate the free pairs and draw num_samples of them without replacement"""
+        src = self._mask(src_nodes).nonzero().view(-1)
+        dst = self._mask(dst_nodes).nonzero().view(-1)
+        keys = (src.unsqueeze(1) * self.num_nodes + dst.unsqueeze(0)).view(-1)
+        keys = keys[(keys // self.num_nodes != keys % self.num_nodes) & ~torch.isin(keys, self.edge_keys)]
+        if degree_weighted:
+            picks = torch.multinomial(self.degree[keys // self.num_nodes] + 1e-6, num_samples)
+        else:
+            picks = torch.randperm(len(keys))[:num_samples]
+        keys = keys[picks]
+        return torch.stack([keys // self.num_nodes, keys % self.num_nodes]).to(self.device)
+    
+    def sample(self, num_samples: int, src_nodes: Optional[torch.Tensor] = None,
+               dst_nodes: Optional[torch.Tensor] = None,
+               degree_weighted: bool = False) -> torch.Tensor:
+        """
+        Sample negative edges
+        
+        Args:
+            num_samples: Number of negative edges
+            src_nodes: Candidate source nodes (e.g. factor nodes for a Factor-Stock relation)
+            dst_nodes: Candidate destination nodes
+            degree_weighted: Draw sources proportional to node degree
+        
+        Returns:
+            Negative edges [2, num_samples]
+        """
+        num_samples = int(num_samples)
+        if num_samples <= 0:
+            return torch.empty((2, 0), dtype=torch.long, device=self.device)
+        src_nodes = src_nodes.cpu() if src_nodes is not None else None
+        dst_nodes = dst_nodes.cpu() if dst_nodes is not None else None
+        
+        candidates, free = self.free_pairs(src_nodes, dst_nodes)
+        if free < num_samples and (src_nodes is not None or dst_nodes is not None):
+            warnings.warn(f"Only {free} free pairs among the given node types for {num_samples} "
+                          f"negatives, sampling over all nodes instead")
+            src_nodes = dst_nodes = None
+            candidates, free = self.free_pairs()
+        if free < num_samples:
+            warnings.warn(f"Graph has only {free} non-edges for {num_samples} negatives, "
+                          f"some negatives will be existing edges")
+        elif free <= self.DENSE_FRACTION * candidates and candidates <= self.MAX_ENUMERATE:
+            return self._draw_free(num_samples, src_nodes, dst_nodes, degree_weighted)
+        
+        src_list, dst_list = [], []
+        remaining = num_samples
+        
+        for round_idx in range(self.max_rounds + 1):
+            if remaining <= 0:
+                break
+            # Oversample so one round is usually enough
+            count = max(2 * remaining, 64)
+            src = self._draw(src_nodes, count, degree_weighted)
+            dst = self._draw(dst_nodes, count, False)
+            valid = src != dst
+            if round_idx < self.max_rounds and len(self.edge_keys) > 0:
+                keys = src * self.num_nodes + dst
+                pos = torch.searchsorted(self.edge_keys, keys).clamp(max=len(self.edge_keys) - 1)
+                valid &= self.edge_keys[pos] != keys
+            # The last round only rejects self-loops so very dense graphs still terminate
+            src, dst = src[valid][:remaining], dst[valid][:remaining]
+            src_list.append(src)
+            dst_list.append(dst)
+            remaining -= len(src)
+        
+        return torch.stack([torch.cat(src_list), torch.cat(dst_list)]).to(self.device)
+
+
 class SCGUTrainer:
     """
     Trainer for SCGU-based factor graph unlearning
@@ -329,10 +571,21 @@ class SCGUTrainer:
     2. Local Causality: Preserve relationships in the remaining graph
     """
     
-    def __init__(self, model: FactorGNNDelete, config: FactorGraphConfig):
+    def __init__(self, model: FactorGNNDelete, config: FactorGraphConfig,
+                 reference_model: Optional[nn.Module] = None):
         self.model = model
         self.config = config
+        # Frozen copy of the model before unlearning; in mini-batch mode it replaces
+        # z_original and embeds each sampled subgraph
+        self.reference_model = reference_model
         self.loss_fct = nn.MSELoss()
+        self._sampler: Optional[NegativeSampler] = None
+        self._sampler_edges: Optional[torch.Tensor] = None
+        self._loader: Optional[LinkNeighborLoader] = None
+        self._loader_data: Optional[Data] = None
+        
+        if config.num_threads > 0:
+            torch.set_num_threads(config.num_threads)
     
     def compute_unlearning_loss(self, z: torch.Tensor, data: Data, 
                                 df_mask: torch.Tensor, 
@@ -352,15 +605,22 @@ class SCGUTrainer:
             Total loss and loss components dict
         """
         # 1. Randomness Loss: deleted edges should be random
-        neg_size = df_mask.sum()
-        neg_edge_index = self._negative_sampling(data.edge_index, data.num_nodes, neg_size)
-        
-        df_logits_pos = self.model.decode(z, data.edge_index[:, df_mask], 
-                                          data.edge_type[df_mask])
-        df_logits_neg = self.model.decode(z, neg_edge_index, 
-                                          torch.zeros(neg_size, dtype=torch.long))
-        
-        loss_random = self.loss_fct(df_logits_pos, df_logits_neg)
+        neg_size = int(df_mask.sum())
+        if neg_size > 0:
+            # Negatives are decoded as relation 0 (Factor-Stock), so draw factor -> stock pairs
+            factor_nodes, stock_nodes = self._node_sets(data)
+            neg_edge_index = self._negative_sampling(data.edge_index, data.num_nodes, neg_size,
+                                                     src_nodes=factor_nodes, dst_nodes=stock_nodes)
+            
+            df_logits_pos = self.model.decode(z, data.edge_index[:, df_mask], 
+                                              data.edge_type[df_mask])
+            df_logits_neg = self.model.decode(z, neg_edge_index, 
+                                              torch.zeros(neg_size, dtype=torch.long))
+            
+            loss_random = self.loss_fct(df_logits_pos, df_logits_neg)
+        else:
+            # A mini-batch may contain no deleted edges
+            loss_random = torch.tensor(0.0)
         
         # 2. Local Causality Loss: preserve remaining relationships
         retain_mask = ~df_mask
@@ -384,20 +644,45 @@ class SCGUTrainer:
         
         return total_loss, loss_dict
     
+    @staticmethod
+    def _factor_mask(data: Data) -> Optional[torch.Tensor]:
+        """Boolean mask of factor nodes (the first num_factors indices of node_to_idx)"""
+        factor_mask = getattr(data, 'factor_mask', None)
+        if factor_mask is not None:
+            return factor_mask
+        node_to_idx = getattr(data, 'node_to_idx', None)
+        if not node_to_idx:
+            return None
+        factor_mask = torch.zeros(data.num_nodes, dtype=torch.bool)
+        factor_ids = [idx for name, idx in node_to_idx.items() if name.startswith('factor_')]
+        factor_mask[torch.tensor(factor_ids, dtype=torch.long)] = True
+        data.factor_mask = factor_mask
+        return factor_mask
+    
+    def _node_sets(self, data: Data) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor]]:
+        """Factor and stock node ids of the graph, (None, None) when node types are unknown"""
+        factor_mask = self._factor_mask(data)
+        if factor_mask is None or not factor_mask.any() or factor_mask.all():
+            return None, None
+        return factor_mask.nonzero().view(-1), (~factor_mask).nonzero().view(-1)
+    
     def _negative_sampling(self, edge_index: torch.Tensor, num_nodes: int, 
-                          num_samples: int) -> torch.Tensor:
+                          num_samples: int, src_nodes: Optional[torch.Tensor] = None,
+                          dst_nodes: Optional[torch.Tensor] = None) -> torch.Tensor:
         """Generate negative edge samples"""
-        neg_edges = []
-        while len(neg_edges) < num_samples:
-            src = torch.randint(0, num_nodes, (1,))
-            dst = torch.randint(0, num_nodes, (1,))
-            if src != dst:
-                neg_edges.append([src.item(), dst.item()])
-        return torch.tensor(neg_edges, dtype=torch.long).t()
+        # The graph is fixed across unlearning epochs, so the edge keys are encoded once
+        if self._sampler is None or self._sampler_edges is not edge_index:
+            self._sampler = NegativeSampler(edge_index, num_nodes)
+            self._sampler_edges = edge_index
+        return self._sampler.sample(num_samples, src_nodes, dst_nodes,
+                                    degree_weighted=self.config.degree_weighted_negatives)
     
     def train_epoch(self, data: Data, df_mask: torch.Tensor, 
-                   z_original: torch.Tensor, optimizer: torch.optim.Optimizer) -> Dict:
+                   z_original: Optional[torch.Tensor], optimizer: torch.optim.Optimizer) -> Dict:
         """Train one epoch of unlearning"""
+        if self.config.num_neighbors:
+            return self.train_epoch_minibatch(data, df_mask, z_original, optimizer)
+        
         self.model.train()
         
         # Forward pass
@@ -412,6 +697,79 @@ class SCGUTrainer:
         optimizer.step()
         
         return loss_dict
+    
+    def _get_loader(self, data: Data) -> LinkNeighborLoader:
+        """Neighbor sampler over all edges of the graph, reused across epochs"""
+        if self._loader is None or self._loader_data is not data:
+            # Only tensors are shipped to the loader workers, not node_to_idx
+            graph = Data(x=data.x, edge_index=data.edge_index, edge_type=data.edge_type,
+                         num_nodes=data.num_nodes)
+            self._loader = LinkNeighborLoader(
+                graph,
+                num_neighbors=self.config.num_neighbors,
+                edge_label_index=data.edge_index,
+                edge_label=torch.arange(data.edge_index.size(1)),  # Global ids of the seed edges
+                batch_size=self.config.batch_size,
+                shuffle=True,
+                num_workers=self.config.num_workers,
+                persistent_workers=self.config.num_workers > 0,
+            )
+            self._loader_data = data
+        return self._loader
+    
+    @staticmethod
+    def _forward_batch(model: nn.Module, batch: Data) -> torch.Tensor:
+        if isinstance(model, FactorGNNDelete):
+            return model(batch.x, batch.edge_index, batch.edge_type, n_id=batch.n_id)
+        return model(batch.x, batch.edge_index, batch.edge_type)
+    
+    def train_epoch_minibatch(self, data: Data, df_mask: torch.Tensor,
+                              z_original: Optional[torch.Tensor],
+                              optimizer: torch.optim.Optimizer) -> Dict:
+        """
+        Train one epoch of unlearning on neighbor-sampled subgraphs
+        
+        Each batch is the sampled neighborhood (config.num_neighbors per layer) of
+        config.batch_size seed edges. The loss is computed on the seed edges only, so
+        memory is bounded by the fanout instead of the graph size.
+        
+        When z_original is None, the reference embeddings of each batch come from
+        self.reference_model run on the same subgraph under no_grad.
+        
+        Returns:
+            Loss components averaged over batches
+        """
+        self.model.train()
+        totals: Dict[str, float] = {}
+        num_batches = 0
+        
+        factor_mask = self._factor_mask(data)
+        for batch in self._get_loader(data):
+            edge_ids = batch.edge_label
+            seeds = Data(edge_index=batch.edge_label_index, edge_type=data.edge_type[edge_ids],
+                         num_nodes=batch.num_nodes)
+            if factor_mask is not None:
+                # Node types of the subgraph, in batch-local ids
+                seeds.factor_mask = factor_mask[batch.n_id]
+            
+            z = self._forward_batch(self.model, batch)
+            if z_original is None:
+                with torch.no_grad():
+                    z_reference = self._forward_batch(self.reference_model, batch)
+            else:
+                z_reference = z_original[batch.n_id]
+            
+            loss, loss_dict = self.compute_unlearning_loss(z, seeds, df_mask[edge_ids], z_reference)
+            
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            
+            for key, value in loss_dict.items():
+                totals[key] = totals.get(key, 0.0) + value
+            num_batches += 1
+        
+        return {key: value / max(num_batches, 1) for key, value in totals.items()}
 
 
 # Utility functions for integration with PandaFactor
@@ -443,7 +801,8 @@ def create_factor_graph_from_panda(factor_data: pd.DataFrame,
 
 def unlearn_factors(model: FactorGNNDelete, data: Data, 
                    factors_to_forget: List[str], 
-                   epochs: int = 100, lr: float = 0.001) -> FactorGNNDelete:
+                   epochs: int = 100, lr: float = 0.001,
+                   config: Optional[FactorGraphConfig] = None) -> FactorGNNDelete:
     """
     Unlearn specific factors from the model
     
@@ -453,21 +812,35 @@ def unlearn_factors(model: FactorGNNDelete, data: Data,
         factors_to_forget: List of factor names to unlearn
         epochs: Number of unlearning epochs
         lr: Learning rate
+        config: Graph configuration; set num_neighbors for mini-batch unlearning
+    
+    In mini-batch mode no full-graph pass is made: the reference embeddings are
+    computed per sampled subgraph by a frozen copy of the model.
     
     Returns:
         Updated model with factors forgotten
     """
+    if config is None:
+        config = FactorGraphConfig()
+    
     # Mark deletion edges
-    builder = FactorGraphBuilder(FactorGraphConfig())
+    builder = FactorGraphBuilder(config)
     df_mask = builder.mark_deletion_edges(data, factors_to_forget)
     
-    # Get original embeddings
-    model.eval()
-    with torch.no_grad():
-        z_original = model(data.x, data.edge_index, data.edge_type)
+    if config.num_neighbors:
+        # Reference embeddings come from a frozen copy, one subgraph at a time
+        reference_model = copy.deepcopy(model).eval()
+        reference_model.requires_grad_(False)
+        z_original = None
+    else:
+        # Get original embeddings (inference only, no activations kept for backward)
+        reference_model = None
+        model.eval()
+        with torch.no_grad():
+            z_original = model(data.x, data.edge_index, data.edge_type)
     
     # Train unlearning
-    trainer = SCGUTrainer(model, FactorGraphConfig())
+    trainer = SCGUTrainer(model, config, reference_model)
     optimizer = torch.optim.Adam(model.parameters(), lr=lr)
     
     for epoch in range(epochs):
@@ -0,0 +1,3 @@
+"""
+Scripts package for panda_factor
+"""
\ No newline at end of file
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+"""
+Operator micro-benchmark and regression harness for FactorUtils.
+
+Generates MultiIndex (date, symbol) panels at several sizes, times every public
+``FactorUtils`` operator (including technical indicators such as MACD, KDJ,
+RSI and BOLL), records throughput in cells per second plus peak traced memory,
+and compares the numbers against a stored baseline.
+
+Example:
+    python -m panda_factor.scripts.benchmark_factor_utils --sizes small medium --output ops.json
+    python -m panda_factor.scripts.benchmark_factor_utils --baseline ops.json --tolerance 0.25
+"""
+import argparse
+import inspect
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from panda_factor.generate.factor_utils import FactorUtils
+
+# 面板规模: 名称 -> (交易日数, 股票数)
+PANEL_SIZES = {
+    'small': (250, 50),
+    'medium': (500, 300),
+    'large': (1000, 1000),
+}
+
+# 序列参数名 -> 面板列
+SERIES_ARGUMENTS = {
+    'close': 'close', 'CLOSE': 'close', 'series': 'close', 'series1': 'close', 'S': 'close', 'S1': 'close',
+    'X': 'close', 'true_value': 'close',
+    'open': 'open', 'OPEN': 'open', 'S2': 'open', 'false_value': 'open',
+    'high': 'high', 'HIGH': 'high',
+    'low': 'low', 'LOW': 'low',
+    'volume': 'volume', 'VOL': 'volume', 'series2': 'volume', 'shares': 'volume',
+    'condition': 'signal',
+}
+
+# 没有默认值的标量参数
+SCALAR_ARGUMENTS = {
+    'window': 20, 'period': 1, 'N': 20, 'M': 6, 'power': 2.0, 'n': 2.0, 'A': 10, 'B': 5, 'd': 10, 'D': 3,
+}
+
+# 个别算子的参数取值约束
+OPERATOR_ARGUMENTS = {
+    'DMA': {'A': 0.1},
+}
+
+# 第一个序列参数为布尔条件的算子
+CONDITION_OPERATORS = {
+    'IF', 'AS_FLOAT', 'COUNT', 'EVERY', 'EXIST', 'FILTER', 'BARSLAST', 'BARSLASTCOUNT', 'BARSSINCEN',
+    'VALUEWHEN', 'LAST',
+}
+CONDITION_ARGUMENTS = {'S', 'condition'}
+
+
+def make_panel(n_dates: int, n_symbols: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate an OHLCV panel indexed by (date, symbol)
+
+    Returns:
+        DataFrame with open/high/low/close/volume columns plus a boolean ``signal`` column
+    """
+    rng = np.random.default_rng(seed)
+    dates = [d.strftime('%Y%m%d') for d in pd.bdate_range('2020-01-01', periods=n_dates)]
+    symbols = [f"{i:06d}.SZ" for i in range(n_symbols)]
+    index = pd.MultiIndex.from_product([dates, symbols], names=['date', 'symbol'])
+
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_dates, n_symbols)), axis=0))
+    open_ = close * (1 + rng.normal(0, 0.005, size=close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, size=close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, size=close.shape)))
+    panel = pd.DataFrame({
+        'open': open_.ravel(),
+        'high': high.ravel(),
+        'low': low.ravel(),
+        'close': close.ravel(),
+        'volume': rng.integers(1_000, 10_000_000, size=close.size).astype(float),
+    }, index=index)
+    panel['signal'] = panel['close'] > panel['open']
+    return panel
+
+
+def list_operators() -> List[str]:
+    """Return the names of all public FactorUtils operators"""
+    return sorted(
+        name for name, member in inspect.getmembers(FactorUtils, predicate=callable)
+        if not name.startswith('_')
+    )
+
+
+def build_arguments(name: str, panel: pd.DataFrame) -> Dict:
+    """Build keyword arguments for an operator from its signature"""
+    kwargs = {}
+    overrides = OPERATOR_ARGUMENTS.get(name, {})
+    for param in inspect.signature(getattr(FactorUtils, name)).parameters.values():
+        if param.name in overrides:
+            kwargs[param.name] = overrides[param.name]
+        elif name in CONDITION_OPERATORS and param.name in CONDITION_ARGUMENTS:
+            kwargs[param.name] = panel['signal']
+        elif param.name in SERIES_ARGUMENTS:
+            kwargs[param.name] = panel[SERIES_ARGUMENTS[param.name]]
+        elif param.default is not inspect.Parameter.empty:
+            continue
+        elif param.name in SCALAR_ARGUMENTS:
+            kwargs[param.name] = SCALAR_ARGUMENTS[param.name]
+        else:
+            raise ValueError(f"Don't know how to supply argument '{param.name}' for {name}")
+    if name == 'SUMIF':
+        kwargs['S2'] = panel['signal']
+    return kwargs
+
+
+def benchmark_operator(name: str, panel: pd.DataFrame, repeat: int = 3) -> Dict:
+    """
+    Time one operator on ``panel``
+
+    Returns:
+        dict with best/mean seconds, throughput (cells/s) and peak traced memory (bytes),
+        or an ``error`` entry when the operator raises
+    """
+    func = getattr(FactorUtils, name)
+    try:
+        kwargs = build_arguments(name, panel)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(**kwargs)
+            times.append(time.perf_counter() - start)
+
+        # 单独跑一次统计内存峰值，避免 tracemalloc 的开销影响计时
+        tracemalloc.start()
+        try:
+            func(**kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+
+    best = min(times)
+    return {
+        'cells': len(panel),
+        'best_seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        'cells_per_second': len(panel) / best if best > 0 else float('inf'),
+        'peak_memory_bytes': peak,
+    }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float = 0.2,
+                        memory_tolerance: float = 0.5) -> List[Dict]:
+    """
+    Compare throughput and peak memory against a baseline result file
+
+    An entry regresses when its throughput drops by more than ``tolerance`` or
+    its peak memory grows by more than ``memory_tolerance`` (both relative).
+    Per-operator overrides are read from the baseline's ``thresholds`` section,
+    keyed by operator name or ``OPERATOR@size``.
+
+    Returns:
+        List of regression descriptions (empty when everything is within limits)
+    """
+    regressions = []
+    thresholds = baseline.get('thresholds', {})
+    baseline_workloads = baseline.get('workloads', {})
+
+    for key, current in results['workloads'].items():
+        reference = baseline_workloads.get(key)
+        if 'error' in current:
+            if reference is not None and 'error' not in reference:
+                current['status'] = 'regression'
+                regressions.append({'workload': key, 'error': current['error']})
+            continue
+        if reference is None or 'error' in reference:
+            current['status'] = 'new'
+            continue
+
+        limits = {**thresholds.get(key.split('@')[0], {}), **thresholds.get(key, {})}
+        allowed = limits.get('tolerance', tolerance)
+        allowed_memory = limits.get('memory_tolerance', memory_tolerance)
+
+        speed_ratio = current['cells_per_second'] / reference['cells_per_second']
+        memory_ratio = (current['peak_memory_bytes'] / reference['peak_memory_bytes']
+                        if reference['peak_memory_bytes'] else 1.0)
+        current['speed_ratio'] = speed_ratio
+        current['memory_ratio'] = memory_ratio
+        current['status'] = 'ok'
+
+        if speed_ratio < 1 - allowed:
+            current['status'] = 'regression'
+            regressions.append({'workload': key, 'speed_ratio': speed_ratio, 'allowed': 1 - allowed})
+        if memory_ratio > 1 + allowed_memory:
+            current['status'] = 'regression'
+            regressions.append({'workload': key, 'memory_ratio': memory_ratio, 'allowed': 1 + allowed_memory})
+
+    return regressions
+
+
+def parse_size(size: str):
+    """Parse a preset name or a ``DATESxSYMBOLS`` specification"""
+    if size in PANEL_SIZES:
+        return PANEL_SIZES[size]
+    try:
+        n_dates, n_symbols = size.lower().split('x')
+        return int(n_dates), int(n_symbols)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{size}', use {list(PANEL_SIZES)} or DATESxSYMBOLS")
+
+
+def run_benchmark(sizes: List[str], operators: Optional[List[str]] = None, repeat: int = 3,
+                  seed: int = 0) -> Dict:
+    """Benchmark the selected operators on every panel size"""
+    operators = operators or list_operators()
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'sizes': {size: parse_size(size) for size in sizes},
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'workloads': {},
+    }
+
+    for size in sizes:
+        n_dates, n_symbols = parse_size(size)
+        panel = make_panel(n_dates, n_symbols, seed=seed)
+        print(f"\nPanel {size}: {n_dates} dates x {n_symbols} symbols = {len(panel)} cells")
+        for name in operators:
+            stats = benchmark_operator(name, panel, repeat=repeat)
+            results['workloads'][f"{name}@{size}"] = stats
+            if 'error' in stats:
+                print(f"  {name:<20} ERROR {stats['error']}")
+            else:
+                print(f"  {name:<20} {stats['best_seconds']:>9.4f}s "
+                      f"{stats['cells_per_second']:>14,.0f} cells/s "
+                      f"{stats['peak_memory_bytes'] / 1024 ** 2:>9.1f} MiB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark FactorUtils operators')
+    parser.add_argument('--sizes', type=str, nargs='+', default=['small'],
+                        help=f"Panel sizes: {', '.join(PANEL_SIZES)} or DATESxSYMBOLS")
+    parser.add_argument('--ops', type=str, nargs='+', help='Only benchmark these operators')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed repetitions per operator')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', type=str, help='Write results JSON to this path')
+    parser.add_argument('--baseline', type=str, help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative throughput drop versus the baseline')
+    parser.add_argument('--memory-tolerance', type=float, default=0.5,
+                        help='Allowed relative peak memory growth versus the baseline')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        parse_size(size)
+    unknown = set(args.ops or []) - set(list_operators())
+    if unknown:
+        parser.error(f"Unknown operators: {', '.join(sorted(unknown))}")
+
+    results = run_benchmark(args.sizes, operators=args.ops, repeat=args.repeat, seed=args.seed)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), tolerance=args.tolerance,
+                                              memory_tolerance=args.memory_tolerance)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) detected:")
+        for item in regressions:
+            print(f"  {item}")
+        sys.exit(1)
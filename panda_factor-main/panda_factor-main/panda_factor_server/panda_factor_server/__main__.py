@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from panda_factor_server.routes import user_factor_pro
-from panda_llm.routes import chat_router
+from panda_factor_server.utils.lazy_router import LazyRouterApp
 import mimetypes
 from pathlib import Path
 from starlette.staticfiles import StaticFiles
@@ -24,7 +24,14 @@ app.add_middleware(
 # Include routers
 # app.include_router(user_factor.router, prefix="/api/v1", tags=["user_factors"])
 app.include_router(user_factor_pro.router, prefix="/api/v1", tags=["user_factors"])
-app.include_router(chat_router.router, prefix="/llm", tags=["panda_llm"])
+# panda_llm 依赖较重，按需加载，服务启动后在后台预热
+llm_app = LazyRouterApp("panda_llm.routes.chat_router", title="Panda LLM")
+app.mount("/llm", llm_app)
+
+
+@app.on_event("startup")
+async def warm_up_llm_router():
+    llm_app.warm_up()
 
 # 获取根目录下的panda_web
 frontend_folder = Path(__file__).resolve().parent.parent.parent / "panda_web" / "panda_web" / "static"
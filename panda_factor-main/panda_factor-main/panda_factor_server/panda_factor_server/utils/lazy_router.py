@@ -0,0 +1,58 @@
+import asyncio
+import importlib
+import logging
+import threading
+
+from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+
+class LazyRouterApp:
+    """
+    ASGI app that imports a router module on first use.
+
+    Mounting ``LazyRouterApp("panda_llm.routes.chat_router")`` at ``/llm`` serves the
+    same paths as ``app.include_router(chat_router.router, prefix="/llm")``, but the
+    router module (and everything it imports) is only loaded when the first request
+    arrives or when ``warm_up()`` is called, which keeps server startup fast.
+    Routes served this way are not listed in the parent app's OpenAPI schema.
+    """
+
+    def __init__(self, module_path: str, attr: str = "router", **fastapi_kwargs):
+        self.module_path = module_path
+        self.attr = attr
+        self.fastapi_kwargs = fastapi_kwargs
+        self._app = None
+        self._lock = threading.Lock()
+
+    def load(self) -> FastAPI:
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    router = getattr(importlib.import_module(self.module_path), self.attr)
+                    app = FastAPI(**self.fastapi_kwargs)
+                    app.include_router(router)
+                    self._app = app
+                    logger.info(f"Loaded router {self.module_path}")
+        return self._app
+
+    def warm_up(self):
+        """Load the router in a background thread"""
+        thread = threading.Thread(target=self._warm_up, name=f"warm-up-{self.module_path}", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        try:
+            self.load()
+        except Exception as e:
+            # 首次请求时会再次尝试加载并把异常暴露给调用方
+            logger.error(f"Failed to warm up router {self.module_path}: {e}")
+
+    async def __call__(self, scope, receive, send):
+        app = self._app
+        if app is None:
+            # 导入可能耗时数秒，放到线程里避免阻塞事件循环
+            app = await asyncio.to_thread(self.load)
+        await app(scope, receive, send)
@@ -1,11 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
 class Message(BaseModel):
     role: str  # user 或 assistant
     content: str
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
+    seq: Optional[int] = None  # 会话内的消息序号，从 0 开始，由存储层分配
 
 class ChatSession(BaseModel):
     id: str
@@ -61,6 +61,18 @@ async def get_sessions(user_id: str, limit: int = 10):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/llm/chat/sessions/{session_id}/messages")
+async def get_session_messages(session_id: str, limit: int = 50, before_seq: Optional[int] = None):
+    """分页获取会话消息，按时间正序返回；next_before_seq 为空表示没有更早的消息"""
+    try:
+        messages, next_before_seq = await chat_service.get_session_messages(session_id, limit, before_seq)
+        return {
+            "messages": [message.dict() for message in messages],
+            "next_before_seq": next_before_seq
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/llm/status")
 async def get_llm_status():
     """获取LLM管理器状态（多密钥状态）"""
@@ -79,6 +91,14 @@ async def get_llm_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/llm/cache/stats")
+async def get_cache_stats():
+    """获取LLM回复缓存的命中率统计"""
+    try:
+        return {"success": True, "data": chat_service.llm.get_cache_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/llm/models")
 async def get_available_models():
     """获取可用的LLM模型列表"""
@@ -182,13 +202,26 @@ async def simple_chat(request: SimpleChatRequest):
         
         # 调用LLM（使用正确的方法名）
         model_id = llm_manager.get_model(request.model)
-        response = llm_manager.chat_completion(
+        cache = chat_service.llm.cache
+        cache_key = cache.key(model_id, messages)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return {
+                "success": True,
+                "response": cached,
+                "model": request.model,
+                "usage": {},
+                "cached": True
+            }
+
+        response = await llm_manager.achat_completion(
             messages=messages,
             model=model_id
         )
         
         # 提取回复文本
         reply_text = response['choices'][0]['message']['content']
+        cache.set(cache_key, reply_text, model_id)
         
         return {
             "success": True,
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List, Optional, AsyncGenerator
+from typing import List, Optional, AsyncGenerator, Tuple
+from panda_common.config import get_config
 from panda_common.logger_config import logger
 from panda_llm.services.mongodb import MongoDBService
 from panda_llm.models.chat import ChatSession, Message
@@ -10,13 +11,16 @@ import uuid
 class ChatService:
     def __init__(self):
         self.mongodb = MongoDBService()
+        self.llm = LLMService()
         self.logger = logger
+        # 发给模型的上下文只取最近的若干条消息
+        self.context_messages = int(get_config().get("LLM_CONTEXT_MESSAGES") or 20)
 
     async def process_message(self, session_id: str, user_message: str, user_id: str) -> str:
         """处理用户消息并返回 AI 响应"""
         try:
-            # 获取或创建会话
-            session = await self.mongodb.get_chat_session(session_id)
+            # 获取或创建会话（只带回最近的上下文消息）
+            session = await self.mongodb.get_chat_session(session_id, message_limit=self.context_messages)
             if not session:
                 # 创建新会话时生成唯一 ID
                 session = ChatSession(
@@ -31,16 +35,14 @@ class ChatService:
             # 添加用户消息
             user_msg = Message(role="user", content=user_message)
             session.messages.append(user_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self.mongodb.append_messages(session.id, [user_msg])
 
             # 调用 AI 服务
-            llm = LLMService()
-            ai_response = await llm.chat_completion(session.messages)
+            ai_response = await self.llm.chat_completion(session.messages[-self.context_messages:])
 
             # 添加 AI 响应
             ai_msg = Message(role="assistant", content=ai_response)
-            session.messages.append(ai_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self.mongodb.append_messages(session.id, [ai_msg])
 
             return ai_response
 
@@ -48,10 +50,13 @@ class ChatService:
             self.logger.error(f"处理消息失败: {str(e)}")
             raise
 
-    async def get_session_messages(self, session_id: str) -> List[Message]:
-        """获取会话消息历史"""
-        session = await self.mongodb.get_chat_session(session_id)
-        return session.messages if session else []
+    async def get_session_messages(self, session_id: str, limit: Optional[int] = None,
+                                   before_seq: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+        """分页获取会话消息历史，返回 (消息列表, 下一页游标)"""
+        session = await self.mongodb.get_chat_session(session_id, message_limit=0)
+        if not session:
+            return [], None
+        return await self.mongodb.get_messages(session.id, limit=limit, before_seq=before_seq)
 
     async def clear_session(self, session_id: str):
         """清空会话"""
@@ -69,7 +74,7 @@ class ChatService:
 
             # 获取或创建会话
             if session_id:
-                session = await self.mongodb.get_chat_session(session_id)
+                session = await self.mongodb.get_chat_session(session_id, message_limit=self.context_messages)
                 if not session:
                     logger.error(f"会话不存在: {session_id}")
                     raise ValueError(f"会话不存在: {session_id}")
@@ -77,31 +82,29 @@ class ChatService:
                 session = ChatSession(
                     id=str(uuid.uuid4()),
                     user_id=user_id,
-                    messages=[user_message],
+                    messages=[],
                     created_at=datetime.now().isoformat(),
                     updated_at=datetime.now().isoformat()
                 )
                 session_id = await self.mongodb.create_chat_session(session)
                 logger.info(f"创建新会话: {session_id}")
 
-            # 更新会话
+            # 追加用户消息
             session.messages.append(user_message)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self.mongodb.append_messages(session.id, [user_message])
 
             # 准备历史消息
-            messages = [{"role": msg.role, "content": msg.content} for msg in session.messages]
+            messages = [{"role": msg.role, "content": msg.content} for msg in session.messages[-self.context_messages:]]
 
             # 调用 AI 服务
-            llm = LLMService()
             full_response = ""
-            async for chunk in llm.chat_completion_stream(messages):
+            async for chunk in self.llm.chat_completion_stream(messages):
                 full_response += chunk
                 yield chunk
 
             # 添加 AI 响应
             ai_msg = Message(role="assistant", content=full_response)
-            session.messages.append(ai_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self.mongodb.append_messages(session.id, [ai_msg])
 
         except Exception as e:
             self.logger.error(f"处理消息失败: {str(e)}")
@@ -110,8 +113,7 @@ class ChatService:
     async def get_user_sessions(self, user_id: str, limit: int = 10) -> List[ChatSession]:
         """获取用户的聊天会话列表"""
         try:
-            sessions = await self.mongodb.get_user_sessions(user_id)
-            return sessions[:limit]
+            return await self.mongodb.get_user_sessions(user_id, limit=limit)
         except Exception as e:
             self.logger.error(f"获取用户会话列表失败: {str(e)}")
             raise 
\ No newline at end of file
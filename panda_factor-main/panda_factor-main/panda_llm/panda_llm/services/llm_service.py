@@ -1,27 +1,29 @@
-import openai
 from panda_common.logger_config import logger
 from panda_common.config import get_config
 from panda_common.llm_manager import get_llm_manager
+from panda_llm.services.response_cache import get_response_cache
 import traceback
 import json
 from typing import Optional, Dict, List, Any, Union
 
+# 缓存命中时流式回放的每块字符数
+STREAM_REPLAY_CHUNK = 32
+
 class LLMService:
     def __init__(self):
         # 使用多密钥LLM管理器
         config = get_config()
         self.llm_manager = get_llm_manager(config)
         self.model = config.get("LLM_MODEL")
+        # 回复缓存：相同模型、系统提示词和对话尾部的请求直接返回缓存的回答
+        self.cache = get_response_cache(config)
         
         # 兼容旧代码
         self.api_key = config.get("LLM_API_KEY") or config.get("LLM_API_KEYS", [""])[0]
         self.base_url = config.get("LLM_BASE_URL")
         
-        # 保留client用于向后兼容
-        self.client = openai.OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        # 保留client用于向后兼容（复用管理器中缓存的客户端和连接池）
+        self.client = self.llm_manager.get_client(self.llm_manager.api_keys[0])
         
         # 定义系统提示词，限制模型只能作为因子开发助手
         self.system_message = {
@@ -164,9 +166,15 @@ For all questions unrelated to factor development, I will politely remind users
         try:
             # 格式化消息
             formatted_messages = self._prepare_messages(messages)
+
+            cache_key = self.cache.key(self.model, formatted_messages)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"LLM回复缓存命中，模型: {self.model}")
+                return cached
             
             # 使用多密钥管理器进行调用（自动轮询和故障转移）
-            response_dict = self.llm_manager.chat_completion(
+            response_dict = await self.llm_manager.achat_completion(
                 messages=formatted_messages,
                 model=self.model,
                 temperature=0.7,
@@ -175,6 +183,7 @@ For all questions unrelated to factor development, I will politely remind users
             
             content = response_dict['choices'][0]['message']['content']
             logger.info(f"LLM调用成功，使用模型: {self.model}, Token使用: {response_dict['usage']['total_tokens']}")
+            self.cache.set(cache_key, content, self.model)
             return content if content is not None else ""
         except Exception as e:
             traceback.print_exc()
@@ -186,20 +195,33 @@ For all questions unrelated to factor development, I will politely remind users
         try:
             # 格式化消息
             formatted_messages = self._prepare_messages(messages)
+
+            cache_key = self.cache.key(self.model, formatted_messages)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                # 命中时按块回放缓存的回答，调用方仍按流式处理
+                logger.info(f"LLM回复缓存命中（流式），模型: {self.model}")
+                for start in range(0, len(cached), STREAM_REPLAY_CHUNK):
+                    yield cached[start:start + STREAM_REPLAY_CHUNK]
+                return
             
-            stream = self.client.chat.completions.create(
-                model=self.model,
+            # 使用多密钥管理器的异步流式接口（连接复用、并发限制和故障转移）
+            chunks = []
+            async for content in self.llm_manager.achat_completion_stream(
                 messages=formatted_messages,
+                model=self.model,
                 temperature=0.1,
-                max_tokens=2000,
-                stream=True
-            )
-            
-            for chunk in stream:
-                content = chunk.choices[0].delta.content
-                if content:
-                    yield content
+                max_tokens=2000
+            ):
+                chunks.append(content)
+                yield content
+            # 只缓存完整结束的流
+            self.cache.set(cache_key, "".join(chunks), self.model)
         except Exception as e:
             traceback.print_exc()
             logger.error(f"调用 OpenAI API 流式请求失败: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """回复缓存的命中统计"""
+        return self.cache.get_stats()
@@ -1,56 +1,176 @@
+from datetime import datetime
+
 from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.config import config
 from panda_common.logger_config import logger
 from panda_llm.models.chat import *
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 
 
 class MongoDBService:
+    """
+    聊天会话存储
+
+    会话头 (chat_sessions) 只保存 user_id、时间戳和消息计数 message_count；
+    消息逐条追加到 chat_messages，以 (session_id, seq) 唯一索引，按 seq 做游标分页。
+    追加消息时先对会话头 $inc 分配 seq 再 insert，不再重写整段历史。
+    旧版把消息内嵌在会话文档中的会话在首次访问时迁移到 chat_messages。
+    """
+
     def __init__(self):
         self.db_handler = DatabaseHandler(config)
         self.collection = self.db_handler.get_mongo_collection("panda","chat_sessions")
+        self.messages = self.db_handler.get_mongo_collection("panda", "chat_messages")
         self.logger = logger
+        try:
+            self.messages.create_index([("session_id", ASCENDING), ("seq", ASCENDING)],
+                                       name="session_seq_idx", unique=True)
+            self.collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)],
+                                         name="user_updated_idx")
+        except Exception as e:
+            self.logger.error(f"创建聊天索引失败: {str(e)}")
+
+    @staticmethod
+    def _session_query(session_id: str) -> dict:
+        # 新会话以字符串 id 作为 _id；旧会话的 _id 是 ObjectId，字符串 id 保存在 id 字段
+        ids = [session_id]
+        if ObjectId.is_valid(session_id):
+            ids.append(ObjectId(session_id))
+        return {"$or": [{"_id": {"$in": ids}}, {"id": session_id}]}
+
+    @staticmethod
+    def _session_key(header: dict) -> str:
+        """chat_messages 中的 session_id，与对外暴露的 ChatSession.id 一致"""
+        return header.get("id") or str(header["_id"])
+
+    def _find_header(self, session_id: str) -> Optional[dict]:
+        header = self.collection.find_one(self._session_query(session_id))
+        if header and header.get("messages"):
+            header = self._migrate_embedded_messages(header)
+        return header
+
+    def _migrate_embedded_messages(self, header: dict) -> dict:
+        """把旧版内嵌在会话文档里的消息搬到 chat_messages"""
+        session_key = self._session_key(header)
+        embedded = header.pop("messages")
+        docs = [
+            {**Message(**message).dict(), "session_id": session_key, "seq": seq}
+            for seq, message in enumerate(embedded)
+        ]
+        if docs and not self.messages.find_one({"session_id": session_key}):
+            self.messages.insert_many(docs, ordered=False)
+        self.collection.update_one(
+            {"_id": header["_id"]},
+            {"$set": {"message_count": len(docs)}, "$unset": {"messages": ""}}
+        )
+        header["message_count"] = len(docs)
+        return header
+
+    def _to_session(self, header: dict, messages: List[Message]) -> ChatSession:
+        return ChatSession(
+            id=self._session_key(header),
+            user_id=header["user_id"],
+            messages=messages,
+            created_at=header.get("created_at") or datetime.now().isoformat(),
+            updated_at=header.get("updated_at") or datetime.now().isoformat(),
+        )
 
     async def create_chat_session(self, session: ChatSession) -> str:
         """创建新的聊天会话"""
         try:
-            result = self.collection.insert_one(session.dict())
-            return str(result.inserted_id)
+            self.collection.insert_one({
+                "_id": session.id,
+                "id": session.id,
+                "user_id": session.user_id,
+                "message_count": 0,
+                "created_at": session.created_at,
+                "updated_at": session.updated_at,
+            })
+            if session.messages:
+                await self.append_messages(session.id, session.messages)
+            return session.id
         except Exception as e:
             self.logger.error(f"创建会话失败: {str(e)}")
             raise
 
-    async def get_chat_session(self, session_id: str) -> Optional[ChatSession]:
-        """获取聊天会话"""
+    async def get_chat_session(self, session_id: str, message_limit: Optional[int] = None) -> Optional[ChatSession]:
+        """
+        获取聊天会话
+
+        Args:
+            session_id: 会话 ID
+            message_limit: 只带回最近的若干条消息；None 表示全部，0 表示只取会话头
+        """
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
-            session = self.collection.find_one(query)
-            if session:
-                return ChatSession(**session)
-            return None
+            header = self._find_header(session_id)
+            if not header:
+                return None
+            messages = []
+            if message_limit is None or message_limit > 0:
+                messages, _ = await self.get_messages(self._session_key(header), limit=message_limit)
+            return self._to_session(header, messages)
         except Exception as e:
             self.logger.error(f"获取会话失败: {str(e)}")
             raise
 
+    async def append_messages(self, session_id: str, messages: List[Message]) -> List[int]:
+        """追加消息，返回分配到的 seq"""
+        try:
+            if not messages:
+                return []
+            header = self.collection.find_one_and_update(
+                self._session_query(session_id),
+                {"$inc": {"message_count": len(messages)}, "$set": {"updated_at": datetime.now().isoformat()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if header is None:
+                raise ValueError(f"会话不存在: {session_id}")
+            first_seq = header["message_count"] - len(messages)
+            session_key = self._session_key(header)
+            self.messages.insert_many([
+                {**message.dict(), "session_id": session_key, "seq": first_seq + i}
+                for i, message in enumerate(messages)
+            ], ordered=True)
+            return [first_seq + i for i in range(len(messages))]
+        except Exception as e:
+            self.logger.error(f"追加消息失败: {str(e)}")
+            raise
+
+    async def get_messages(self, session_id: str, limit: Optional[int] = 50,
+                           before_seq: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+        """
+        按 seq 倒序分页读取消息，返回按时间正序排列的一页和下一页游标
+
+        Args:
+            session_id: 会话 ID
+            limit: 每页条数，None 表示不限
+            before_seq: 游标，只返回 seq 小于该值的消息；None 表示从最新一条开始
+
+        Returns:
+            (消息列表, 下一页的 before_seq；没有更早的消息时为 None)
+        """
+        try:
+            query = {"session_id": session_id}
+            if before_seq is not None:
+                query["seq"] = {"$lt": before_seq}
+            cursor = self.messages.find(query, {"_id": 0, "session_id": 0}).sort("seq", DESCENDING)
+            if limit:
+                cursor = cursor.limit(limit)
+            docs = list(cursor)
+            docs.reverse()
+            next_cursor = docs[0]["seq"] if docs and docs[0]["seq"] > 0 and limit and len(docs) == limit else None
+            return [Message(**doc) for doc in docs], next_cursor
+        except Exception as e:
+            self.logger.error(f"获取消息失败: {str(e)}")
+            raise
+
     async def update_chat_session(self, session_id: str, session: ChatSession):
-        """更新聊天会话"""
+        """更新聊天会话头（消息通过 append_messages 追加，这里不会重写消息）"""
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
             self.collection.update_one(
-                query,
-                {"$set": session.dict()}
+                self._session_query(session_id),
+                {"$set": {"user_id": session.user_id, "updated_at": session.updated_at}}
             )
         except Exception as e:
             self.logger.error(f"更新会话失败: {str(e)}")
@@ -59,23 +179,21 @@ class MongoDBService:
     async def delete_chat_session(self, session_id: str):
         """删除聊天会话"""
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
-            self.collection.delete_one(query)
+            header = self.collection.find_one(self._session_query(session_id), {"_id": 1, "id": 1})
+            if header:
+                self.messages.delete_many({"session_id": self._session_key(header)})
+                self.collection.delete_one({"_id": header["_id"]})
         except Exception as e:
             self.logger.error(f"删除会话失败: {str(e)}")
             raise
 
-    async def get_user_sessions(self, user_id: str) -> List[ChatSession]:
-        """获取用户的所有会话"""
+    async def get_user_sessions(self, user_id: str, limit: Optional[int] = None) -> List[ChatSession]:
+        """获取用户的会话列表（只含会话头，按更新时间倒序）"""
         try:
-            sessions = list(self.collection.find({"user_id": user_id}))
-            return [ChatSession(**session) for session in sessions]
+            cursor = self.collection.find({"user_id": user_id}, {"messages": 0}).sort("updated_at", DESCENDING)
+            if limit:
+                cursor = cursor.limit(limit)
+            return [self._to_session(header, []) for header in cursor]
         except Exception as e:
             self.logger.error(f"获取用户会话失败: {str(e)}")
-            raise
\ No newline at end of file
+            raise
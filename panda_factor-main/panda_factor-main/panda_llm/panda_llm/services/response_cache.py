@@ -0,0 +1,175 @@
+"""
+LLM 回复缓存
+
+因子助手的系统提示词固定不变，用户问题又经常重复（"解释一下 RSI"、"把这个公式改成 Python"），
+相同问题没必要每次都消耗服务商配额。缓存键由三部分组成：
+
+- 模型名
+- 系统提示词哈希
+- 发给模型的完整对话（全部非系统消息）的哈希
+
+同一问题只有在前面的对话也相同时才会命中，不会把别的上下文里的回答返回给用户。
+规范化只做 Unicode NFC 和去掉首尾空白，不改动大小写、标点和内部空白，代码片段按原样参与计算。
+
+两级缓存：进程内 LRU（LLM_CACHE_SIZE 条）在前，MongoDB 的 llm_response_cache 集合
+（TTL 索引，LLM_CACHE_TTL 秒后过期）在后，进程重启或多实例部署时也能共享。
+MongoDB 不可用时只使用内存缓存。
+"""
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from panda_common.logger_config import logger
+
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_CACHE_TTL = 24 * 3600
+CACHE_COLLECTION = "llm_response_cache"
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC 并去掉首尾空白"""
+    return unicodedata.normalize("NFC", text or "").strip()
+
+
+def _hash(value) -> str:
+    payload = json.dumps(value, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """
+    由模型、系统提示词和完整对话生成缓存键
+
+    Args:
+        model: 模型名
+        messages: 已格式化的消息列表（含 system 消息）
+    """
+    system = "\n".join(normalize_text(msg["content"]) for msg in messages if msg["role"] == "system")
+    dialog = [[msg["role"], normalize_text(msg["content"])] for msg in messages if msg["role"] != "system"]
+    return _hash([model, _hash(system), _hash(dialog)])
+
+
+def _as_utc(value: datetime) -> datetime:
+    """pymongo 默认返回不带时区的 UTC 时间"""
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class ResponseCache:
+    """进程内 LRU + MongoDB TTL 两级回复缓存，记录各级命中率"""
+
+    def __init__(self, config: Dict):
+        self.enabled = bool(config.get("LLM_CACHE_ENABLED", True))
+        self.max_size = int(config.get("LLM_CACHE_SIZE") or DEFAULT_CACHE_SIZE)
+        self.ttl = int(config.get("LLM_CACHE_TTL") or DEFAULT_CACHE_TTL)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0}
+        self._collection = self._init_collection(config) if self.enabled else None
+
+    def _init_collection(self, config: Dict):
+        try:
+            from panda_common.handlers.database_handler import DatabaseHandler
+            collection = DatabaseHandler(config).get_mongo_collection(config["MONGO_DB"], CACHE_COLLECTION)
+            collection.create_index("created_at", name="created_at_ttl", expireAfterSeconds=self.ttl)
+            return collection
+        except Exception as e:
+            logger.warning(f"LLM 回复缓存的 MongoDB 层不可用，仅使用内存缓存: {str(e)}")
+            return None
+
+    def key(self, model: str, messages: List[Dict[str, str]]) -> str:
+        return make_cache_key(model, messages)
+
+    def get(self, key: str) -> Optional[str]:
+        """查缓存，未命中返回 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        if self._collection is not None:
+            try:
+                doc = self._collection.find_one({"_id": key}, {"response": 1, "created_at": 1})
+            except Exception as e:
+                logger.warning(f"读取 LLM 回复缓存失败: {str(e)}")
+                doc = None
+            # TTL 索引由后台任务清理，过期文档可能还在集合里
+            created_at = _as_utc(doc["created_at"]) if doc else None
+            if doc and (datetime.now(timezone.utc) - created_at).total_seconds() < self.ttl:
+                self._remember(key, doc["response"], created_at.timestamp() + self.ttl)
+                with self._lock:
+                    self._stats["mongo_hits"] += 1
+                return doc["response"]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, response: str, model: Optional[str] = None):
+        """写入两级缓存，空回复不缓存"""
+        if not self.enabled or not response:
+            return
+        self._remember(key, response, time.time() + self.ttl)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self._collection is not None:
+            try:
+                self._collection.replace_one(
+                    {"_id": key},
+                    # TTL 索引按 UTC 计算过期时间
+                    {"_id": key, "response": response, "model": model, "created_at": datetime.now(timezone.utc)},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"写入 LLM 回复缓存失败: {str(e)}")
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (response, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._collection is not None:
+            self._collection.delete_many({})
+
+    def get_stats(self) -> Dict:
+        """命中统计：hit_rate 为两级合计命中率"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["mongo_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = (stats["memory_hits"] + stats["mongo_hits"]) / lookups if lookups else 0.0
+        stats["enabled"] = self.enabled
+        stats["mongo_enabled"] = self._collection is not None
+        return stats
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache(config: Dict) -> ResponseCache:
+    """进程内共享的回复缓存"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(config)
+    return _response_cache
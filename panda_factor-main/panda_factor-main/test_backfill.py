@@ -0,0 +1,132 @@
+"""
+测试历史数据回补：按参照表检测缺口、中断后从检查点继续、清洗后仍不完整时标记 partial
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+import mongomock
+import pytest
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_data_hub.utils import backfill
+from panda_data_hub.utils.backfill import (STATUS_COMPLETED, STATUS_PARTIAL, STATUS_RUNNING, BackfillJob,
+                                           find_incomplete_days, split_runs)
+from panda_data_hub.utils.mongo_utils import daily_count_cache
+
+DAYS = ['20240102', '20240103', '20240104', '20240105', '20240108', '20240109']
+SYMBOLS = ['000001.SZ', '000002.SZ', '600000.SH']
+CONFIG = {'MONGO_DB': 'backfill_test'}
+
+
+def _records(date, symbols=SYMBOLS):
+    return [{'date': date, 'symbol': symbol} for symbol in symbols]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient()
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+    daily_count_cache.invalidate()
+    calendar = SimpleNamespace(trading_days=lambda start, end: [day for day in DAYS if start <= day <= end])
+    monkeypatch.setattr(backfill, 'get_trading_calendar', lambda config: calendar)
+
+    db = handler.mongo_client[CONFIG['MONGO_DB']]
+    for day in DAYS:
+        db.stock_market.insert_many(_records(day))
+    return db
+
+
+def _clean_into(db, skip=()):
+    """按交易日写入 factor_base 的清洗函数，记录每次调用的区间"""
+    calls = []
+
+    def clean_range(start, end):
+        calls.append((start, end))
+        for day in DAYS:
+            if start <= day <= end and day not in skip:
+                db.factor_base.delete_many({'date': day})
+                db.factor_base.insert_many(_records(day))
+    return clean_range, calls
+
+
+def test_gaps_against_reference_table(db):
+    db.factor_base.insert_many(_records('20240102') + _records('20240103', SYMBOLS[:2]) + _records('20240105'))
+    # 参照表当天没有数据的日期不检查
+    db.stock_market.delete_many({'date': '20240109'})
+    assert find_incomplete_days(db, 'factor_base', DAYS, reference_table='stock_market') == \
+        ['20240103', '20240104', '20240108']
+    assert find_incomplete_days(db, 'factor_base', DAYS, reference_table='stock_market', min_ratio=0.5) == \
+        ['20240104', '20240108']
+
+
+def test_gaps_against_neighbouring_days(db):
+    db.stock_market.delete_many({'date': '20240104'})
+    db.stock_market.delete_one({'date': '20240108', 'symbol': SYMBOLS[0]})
+    assert find_incomplete_days(db, 'stock_market', DAYS) == ['20240104', '20240108']
+
+
+def test_split_runs_follows_the_calendar():
+    days = ['20240109', '20240102', '20240103', '20240104', '20240108']
+    assert split_runs(days, DAYS, max_run_days=2) == [
+        ['20240102', '20240103'], ['20240104'], ['20240108', '20240109']]
+
+
+def test_resume_after_interrupted_run(db):
+    db.factor_base.insert_many(_records('20240105'))
+    job = BackfillJob(CONFIG, 'factor_base', reference_table='stock_market', max_run_days=2)
+    clean_range, calls = _clean_into(db)
+
+    def interrupted(start, end):
+        if calls:
+            # 进程在第二段被杀掉（BaseException 不会被当作清洗失败）
+            raise KeyboardInterrupt
+        clean_range(start, end)
+
+    with pytest.raises(KeyboardInterrupt):
+        job.run('2024-01-02', '2024-01-09', interrupted)
+    state = job.get_job('20240102', '20240109')
+    assert state['status'] == STATUS_RUNNING
+    assert state['planned'] == ['20240102', '20240103', '20240104', '20240108', '20240109']
+    assert state['completed'] == ['20240102', '20240103']
+
+    progress = []
+    result = job.run('20240102', '20240109', clean_range, progress.append)
+    # 只处理检查点之后的日期，已有数据的 20240105 不在计划内
+    assert calls == [('20240102', '20240103'), ('20240104', '20240104'), ('20240108', '20240109')]
+    assert result['status'] == STATUS_COMPLETED
+    assert sorted(result['completed']) == result['planned']
+    assert progress[-1] == 100
+
+    # 已结束的任务再次运行时重新检测缺口，没有缺口就不再清洗
+    assert job.run('20240102', '20240109', clean_range)['planned'] == []
+    assert len(calls) == 3
+
+
+def test_partial_when_days_stay_incomplete(db):
+    job = BackfillJob(CONFIG, 'factor_base', reference_table='stock_market')
+    clean_range, calls = _clean_into(db, skip={'20240104'})
+    result = job.run('20240102', '20240105', clean_range)
+    assert calls == [('20240102', '20240105')]
+    assert result['status'] == STATUS_PARTIAL
+    assert list(result['failed']) == ['20240104']
+    assert '20240104' not in result['completed']
+    assert job.get_job('20240102', '20240105')['status'] == STATUS_PARTIAL
+
+    # 再次运行只回补仍不完整的那一天，补齐后清除失败记录
+    clean_range, calls = _clean_into(db)
+    result = job.run('20240102', '20240105', clean_range)
+    assert calls == [('20240104', '20240104')]
+    assert result['status'] == STATUS_COMPLETED
+    assert not result['failed']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
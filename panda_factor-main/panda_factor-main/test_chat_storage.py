@@ -0,0 +1,88 @@
+"""
+测试聊天消息的追加写入和游标分页
+"""
+
+import asyncio
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_llm"))
+
+import mongomock
+from bson import ObjectId
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_llm.models.chat import ChatSession, Message
+from panda_llm.services.mongodb import MongoDBService
+
+
+def _service():
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient()
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+    return MongoDBService()
+
+
+def _messages(start, count):
+    return [Message(role="user" if i % 2 == 0 else "assistant", content=f"m{i}") for i in range(start, start + count)]
+
+
+def test_append_assigns_sequential_seq():
+    service = _service()
+    asyncio.run(service.create_chat_session(ChatSession(id="s1", user_id="u1", messages=_messages(0, 2))))
+    assert asyncio.run(service.append_messages("s1", _messages(2, 3))) == [2, 3, 4]
+    header = service.collection.find_one({"_id": "s1"})
+    assert header["message_count"] == 5
+    assert "messages" not in header
+
+
+def test_cursor_pagination_walks_back_to_first_message():
+    service = _service()
+    asyncio.run(service.create_chat_session(ChatSession(id="s1", user_id="u1")))
+    asyncio.run(service.append_messages("s1", _messages(0, 7)))
+
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = asyncio.run(service.get_messages("s1", limit=3, before_seq=cursor))
+        pages.append([message.content for message in page])
+        if cursor is None:
+            break
+    assert pages == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+
+def test_cursor_is_none_when_page_ends_at_first_message():
+    service = _service()
+    asyncio.run(service.create_chat_session(ChatSession(id="s1", user_id="u1", messages=_messages(0, 6))))
+    page, cursor = asyncio.run(service.get_messages("s1", limit=3, before_seq=3))
+    assert [message.seq for message in page] == [0, 1, 2]
+    assert cursor is None
+
+
+def test_session_limit_returns_latest_messages():
+    service = _service()
+    asyncio.run(service.create_chat_session(ChatSession(id="s1", user_id="u1", messages=_messages(0, 5))))
+    session = asyncio.run(service.get_chat_session("s1", message_limit=2))
+    assert [message.content for message in session.messages] == ["m3", "m4"]
+    assert asyncio.run(service.get_chat_session("s1", message_limit=0)).messages == []
+
+
+def test_embedded_messages_are_migrated():
+    service = _service()
+    legacy_id = ObjectId()
+    service.collection.insert_one({
+        "_id": legacy_id, "user_id": "u1",
+        "messages": [message.dict() for message in _messages(0, 3)],
+    })
+    session = asyncio.run(service.get_chat_session(str(legacy_id)))
+    assert [message.seq for message in session.messages] == [0, 1, 2]
+    assert asyncio.run(service.append_messages(str(legacy_id), _messages(3, 1))) == [3]
+    assert "messages" not in service.collection.find_one({"_id": legacy_id})
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
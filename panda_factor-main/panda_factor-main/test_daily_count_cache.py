@@ -0,0 +1,69 @@
+"""
+测试每日记录数缓存：写入后失效、TTL 过期
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+import mongomock
+
+from panda_data_hub.services.query.stock_statistic_service import StockStatisticQuery
+from panda_data_hub.utils.mongo_utils import DailyCountCache, daily_count_cache
+from panda_data_hub.utils.write_strategies import ReplaceDayStrategy, write_records
+
+
+def _records(date, symbols):
+    return [{'date': date, 'symbol': symbol} for symbol in symbols]
+
+
+def _query():
+    return StockStatisticQuery.__new__(StockStatisticQuery)
+
+
+def test_write_records_invalidates_written_dates():
+    daily_count_cache.invalidate()
+    db = mongomock.MongoClient().db
+    db.stock_market.insert_many(_records('20240102', 'AB') + _records('20240103', 'A'))
+    query = _query()
+    assert query.get_daily_counts(db, 'stock_market', ['20240102', '20240103']) == {'20240102': 2, '20240103': 1}
+
+    write_records(db, 'stock_market', _records('20240102', 'ABC'), strategy=ReplaceDayStrategy())
+    # 未经 write_records 写入的日期仍取缓存
+    db.stock_market.insert_one({'date': '20240103', 'symbol': 'B'})
+    assert query.get_daily_counts(db, 'stock_market', ['20240102', '20240103']) == {'20240102': 3, '20240103': 1}
+
+
+def test_today_and_empty_days_are_not_cached():
+    cache = DailyCountCache()
+    cache.put_many('db', 'stock_market', {'20240102': 0, '29991231': 5, '20240103': 4})
+    counts, missing = cache.get_many('db', 'stock_market', ['20240102', '29991231', '20240103'])
+    assert counts == {'20240103': 4}
+    assert missing == ['20240102', '29991231']
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = DailyCountCache(ttl=60, clock=lambda: now[0])
+    cache.put_many('db', 'stock_market', {'20240102': 4})
+    now[0] = 59
+    assert cache.get_many('db', 'stock_market', ['20240102'])[0] == {'20240102': 4}
+    now[0] = 61
+    assert cache.get_many('db', 'stock_market', ['20240102']) == ({}, ['20240102'])
+
+
+def test_invalidate_by_table_and_dates():
+    cache = DailyCountCache()
+    cache.put_many('db', 'stock_market', {'20240102': 4, '20240103': 4})
+    cache.put_many('db', 'factor_base', {'20240102': 4})
+    cache.invalidate('db', 'stock_market', ['20240102'])
+    assert cache.get_many('db', 'stock_market', ['20240102', '20240103']) == ({'20240103': 4}, ['20240102'])
+    assert cache.get_many('db', 'factor_base', ['20240102'])[0] == {'20240102': 4}
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
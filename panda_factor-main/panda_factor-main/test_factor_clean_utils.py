@@ -0,0 +1,150 @@
+"""
+测试因子清洗窗口：窗口失败后继续，部分交易日失败时记录失败日期；
+各数据源的区间清洗：行情与基本面按 (date, 代码) 合并、单位换算、部分交易日失败
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+from types import SimpleNamespace
+
+import mongomock
+import pandas as pd
+import pytest
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_data_hub.utils.factor_clean_utils import WindowCleanError, date_windows, run_windows
+
+CONFIG = {'MONGO_DB': 'factor_clean_test', 'WRITE_STRATEGY': 'replace_day'}
+DAYS = ['20240102', '20240103', '20240104']
+SYMBOLS = ['000001.SZ', '600000.SH']
+# 直接调用数据源函数的端点，不限流
+ENDPOINT = SimpleNamespace(call=lambda func, *args, **kwargs: func(*args, **kwargs))
+
+
+def test_date_windows():
+    assert date_windows('20240101', '20240110', window_days=4) == [
+        ('20240101', '20240104'), ('20240105', '20240108'), ('20240109', '20240110')]
+
+
+def test_run_windows_continues_after_failures():
+    calls = []
+    progress = []
+
+    def clean_window(start, end):
+        calls.append((start, end))
+        if start == '20240101':
+            raise WindowCleanError({'20240102': RuntimeError('429')}, written=30)
+        if start == '20240105':
+            raise ConnectionError('vendor down')
+        return 10
+
+    written, failures = run_windows('2024-01-01', '2024-01-10', clean_window, window_days=4,
+                                    progress_callback=progress.append)
+    assert len(calls) == 3
+    assert written == 40
+    assert sorted(failures) == ['20240102', '20240105~20240108']
+    assert progress == [33, 66, 100]
+
+
+def test_run_windows_without_failures():
+    written, failures = run_windows('20240101', '20240102', lambda start, end: None)
+    assert written == 0 and failures == {}
+
+
+@pytest.fixture
+def db():
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient()
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+    db = handler.mongo_client[CONFIG['MONGO_DB']]
+    db.stock_market.insert_many([{'date': day, 'symbol': symbol, 'open': 1.0, 'high': 1.0, 'low': 1.0,
+                                  'close': 1.0, 'volume': 100.0, 'name': 'x'}
+                                 for day in DAYS for symbol in SYMBOLS])
+    return db
+
+
+def _service(cls, **attrs):
+    service = cls.__new__(cls)
+    service.config = CONFIG
+    service.db_handler = DatabaseHandler(CONFIG)
+    service.progress_callback = None
+    service.endpoint = ENDPOINT
+    for name, value in attrs.items():
+        setattr(service, name, value)
+    return service
+
+
+def _factor_base(db):
+    return pd.DataFrame(list(db.factor_base.find({}, {'_id': 0}))).sort_values(['date', 'symbol'])
+
+
+def test_tushare_range_clean_merges_scales_and_reports_failed_days(db):
+    pytest.importorskip("tushare")
+    from panda_data_hub.services.ts_factor_clean_pro_service import FactorCleanerTSProService
+
+    def query(api, trade_date, fields):
+        if trade_date == '20240103':
+            raise ConnectionError('daily_basic timeout')
+        # 只返回部分股票，另一只股票合并后为空值
+        rows = [{'ts_code': '000001.SZ', 'trade_date': trade_date}]
+        if api == 'daily_basic':
+            return pd.DataFrame([{**row, 'turnover_rate': 1.5, 'total_mv': 2.0} for row in rows])
+        return pd.DataFrame([{**row, 'amount': 3.0} for row in rows])
+
+    service = _service(FactorCleanerTSProService, pro=SimpleNamespace(query=query))
+    with pytest.raises(WindowCleanError) as info:
+        service.clean_range_data('20240102', '20240104')
+    assert sorted(info.value.failed_days) == ['20240103']
+    assert info.value.written == 4
+
+    frame = _factor_base(db)
+    assert sorted(frame['date'].unique()) == ['20240102', '20240104']
+    row = frame[(frame['date'] == '20240102') & (frame['symbol'] == '000001.SZ')].iloc[0]
+    # 成交额千元 -> 元，市值万元 -> 元
+    assert (row['amount'], row['market_cap'], row['turnover']) == (3000.0, 20000.0, 1.5)
+    assert frame[frame['symbol'] == '600000.SH']['market_cap'].isna().all()
+    assert 'name' not in frame.columns
+
+
+def test_tushare_range_clean_all_days_failed(db):
+    pytest.importorskip("tushare")
+    from panda_data_hub.services.ts_factor_clean_pro_service import FactorCleanerTSProService
+
+    def query(api, trade_date, fields):
+        raise ConnectionError('vendor down')
+
+    service = _service(FactorCleanerTSProService, pro=SimpleNamespace(query=query))
+    with pytest.raises(WindowCleanError) as info:
+        service.clean_range_data('20240102', '20240104')
+    assert sorted(info.value.failed_days) == DAYS and info.value.written == 0
+    assert db.factor_base.count_documents({}) == 0
+
+
+def test_xtquant_range_clean_merges_amounts(db, monkeypatch):
+    pytest.importorskip("xtquant")
+    from panda_data_hub.services import xt_factor_clean_pro_service as xt_service
+
+    def amounts(codes, start_date, end_date):
+        assert sorted(codes) == SYMBOLS and (start_date, end_date) == ('20240102', '20240103')
+        return pd.DataFrame({'ts_code': ['000001.SZ', '000001.SZ'], 'date': ['20240102', '20240103'],
+                             'amount': [5.0, 6.0]})
+
+    monkeypatch.setattr(xt_service, 'xt_get_amounts', amounts)
+    monkeypatch.setattr(xt_service, 'get_xt_suffix', lambda symbol: symbol)
+    service = _service(xt_service.FactorCleanerXTProService)
+    assert service.factor_range_clean('20240102', '20240103') == 4
+
+    frame = _factor_base(db)
+    assert frame['amount'].tolist() == [5.0, 0.0, 6.0, 0.0]
+    # 迅投没有历史市值和换手率，不写这两列
+    assert 'market_cap' not in frame.columns and 'turnover' not in frame.columns
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
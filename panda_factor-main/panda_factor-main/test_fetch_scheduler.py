@@ -0,0 +1,125 @@
+"""
+测试数据源限流：限流识别、AIMD 并发调整、令牌桶与退避重试
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+import pytest
+
+from panda_data_hub.utils.fetch_scheduler import AIMDLimiter, TokenBucket, VendorEndpoint, is_throttle_error
+
+
+class HTTPError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class ResponseError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.response = Response(status_code)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_throttle_detected_from_status_code():
+    assert is_throttle_error(HTTPError("Too Many Requests", status_code=429))
+    assert is_throttle_error(ResponseError("error", 429))
+    assert not is_throttle_error(HTTPError("Internal Server Error", status_code=500))
+    assert not is_throttle_error(ResponseError("bad gateway", 502))
+
+
+def test_throttle_detected_from_text():
+    assert is_throttle_error(Exception("抱歉，您每分钟最多访问该接口200次"))
+    assert is_throttle_error(Exception("HTTP Error 429: Too Many Requests"))
+    assert is_throttle_error(Exception("429 Client Error: for url"))
+    assert is_throttle_error(Exception("Rate limit reached"))
+
+
+def test_digits_in_message_are_not_throttle():
+    assert not is_throttle_error(Exception("ts_code 600429.SH 在 20240429 无数据"))
+    assert not is_throttle_error(Exception("got 4290 rows, quota field missing"))
+    assert not is_throttle_error(KeyError("429"))
+
+
+def test_aimd_limiter_halves_and_recovers():
+    limiter = AIMDLimiter(8, maximum=10)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    limiter.on_success()
+    assert limiter.limit == 2
+    for _ in range(2):
+        limiter.on_success()
+    assert limiter.limit == 3
+
+
+def test_token_bucket_waits_for_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_minute=60, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(4):
+        bucket.acquire()
+    # 突发 2 次，之后每秒一个令牌
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_endpoint_retries_throttle_and_reduces_concurrency():
+    clock = FakeClock()
+    endpoint = VendorEndpoint('test', rate_per_minute=6000, burst=10, concurrency=4, max_retries=3,
+                              clock=clock, sleep=clock.sleep)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) < 3:
+            raise HTTPError("Too Many Requests", status_code=429)
+        return "ok"
+
+    assert endpoint.call(fetch) == "ok"
+    assert endpoint.stats['throttled'] == 2
+    assert endpoint.stats['retries'] == 2
+    # 4 -> 2 -> 1，成功一次后加一
+    assert endpoint.limiter.limit == 2
+
+
+def test_endpoint_raises_after_retries():
+    clock = FakeClock()
+    endpoint = VendorEndpoint('test', rate_per_minute=6000, max_retries=2, clock=clock, sleep=clock.sleep)
+
+    def fetch():
+        raise HTTPError("Internal Server Error", status_code=500)
+
+    with pytest.raises(HTTPError):
+        endpoint.call(fetch)
+    assert endpoint.stats['failures'] == 1
+    assert endpoint.stats['throttled'] == 0
+    assert endpoint.limiter.limit == 4
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
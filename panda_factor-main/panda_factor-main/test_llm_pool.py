@@ -0,0 +1,139 @@
+"""
+测试 LLMManager 的按密钥连接池、并发限制和故障转移（使用 httpx MockTransport 模拟服务端）
+"""
+
+import asyncio
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+
+import httpx
+
+from panda_common import llm_manager as llm_module
+from panda_common.llm_manager import LLMManager
+
+
+def _completion(content="ok"):
+    return {
+        "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": "test-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+class MockServer:
+    """按 Authorization 头区分密钥，记录每个密钥的请求数和最大并发"""
+
+    def __init__(self, failing_keys=(), delay=0.0):
+        self.failing_keys = set(failing_keys)
+        self.delay = delay
+        self.calls = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _key(self, request):
+        return request.headers["authorization"].split()[-1]
+
+    def _respond(self, request):
+        key = self._key(request)
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if key in self.failing_keys:
+            return httpx.Response(500, json={"error": {"message": "boom"}})
+        return httpx.Response(200, json=_completion(key))
+
+    def sync_handler(self, request):
+        return self._respond(request)
+
+    async def async_handler(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._respond(request)
+        finally:
+            self.in_flight -= 1
+
+
+def _manager(monkeypatch, server, **config):
+    # openai 用 isinstance 检查 http_client，所以替换成子类而不是工厂函数
+    class MockClient(httpx.Client):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(server.sync_handler), **kwargs)
+
+    class MockAsyncClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(server.async_handler), **kwargs)
+
+    monkeypatch.setattr(llm_module.httpx, "Client", MockClient)
+    monkeypatch.setattr(llm_module.httpx, "AsyncClient", MockAsyncClient)
+    return LLMManager({
+        "LLM_API_KEYS": ["key-a", "key-b"],
+        "LLM_BASE_URL": "http://mock/v1",
+        "LLM_RETRY_DELAY": 0,
+        "LLM_MAX_RETRIES": 1,
+        **config,
+    })
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_sync_failover(monkeypatch):
+    server = MockServer(failing_keys={"key-a"})
+    manager = _manager(monkeypatch, server)
+    # 轮询先选到 key-a，失败后切换到 key-b
+    result = manager.chat_completion(MESSAGES)
+    assert result["choices"][0]["message"]["content"] == "key-b"
+    assert manager.key_failures["key-a"] == 1
+    # failover 策略优先选择失败次数少的密钥
+    manager.strategy = "failover"
+    manager.chat_completion(MESSAGES)
+    assert server.calls == {"key-a": 1, "key-b": 2}
+
+
+def test_async_concurrency_limited_per_key(monkeypatch):
+    server = MockServer(delay=0.02)
+    manager = _manager(monkeypatch, server, LLM_API_KEYS=["key-a"], LLM_MAX_CONCURRENCY_PER_KEY=3)
+
+    async def run():
+        await asyncio.gather(*(manager.achat_completion(MESSAGES) for _ in range(12)))
+        await manager.aclose()
+
+    asyncio.run(run())
+    assert server.calls == {"key-a": 12}
+    assert server.max_in_flight == 3
+
+
+def test_async_clients_work_across_event_loops(monkeypatch):
+    server = MockServer(delay=0.001)
+    manager = _manager(monkeypatch, server, LLM_MAX_CONCURRENCY_PER_KEY=1)
+
+    async def run():
+        await asyncio.gather(*(manager.achat_completion(MESSAGES) for _ in range(4)))
+
+    # 第二个事件循环（子应用、测试、asyncio.run 辅助函数）不能复用第一个循环的客户端和信号量
+    asyncio.run(run())
+    asyncio.run(run())
+    assert sum(server.calls.values()) == 8
+
+
+def test_keepalive_clamped_to_concurrency(monkeypatch):
+    manager = _manager(monkeypatch, MockServer(), LLM_MAX_CONCURRENCY_PER_KEY=4, LLM_HTTP_MAX_KEEPALIVE=20)
+    assert manager.http_max_keepalive == 4
+
+
+def test_latency_strategy_prefers_faster_key(monkeypatch):
+    manager = _manager(monkeypatch, MockServer(), LLM_LOAD_BALANCE_STRATEGY="latency")
+    manager._key_states["key-a"].ewma_latency = 2.0
+    manager._key_states["key-b"].ewma_latency = 0.1
+    assert manager._get_next_api_key() == "key-b"
+    manager._key_states["key-b"].consecutive_errors = 2
+    assert manager._get_next_api_key() == "key-a"
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,107 @@
+"""
+测试因子分析日志的有界队列和后台写入线程
+"""
+
+import os
+import sys
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+
+import mongomock
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_common.handlers.log_handler import LogBatchManager, _FlushRequest
+
+
+def _use_mongomock():
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient()
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+    return handler.mongo_client["panda"]
+
+
+def _entry(i, level="INFO"):
+    return {"task_id": "t1", "factor_id": "f1", "message": f"m{i}", "level": level,
+            "timestamp": f"2025-01-01T00:00:{i:02d}"}
+
+
+def _paused_manager(**kwargs):
+    """写入线程停在 _write_batch 上，方便把队列填满"""
+    manager = LogBatchManager(flush_interval=60, **kwargs)
+    entered, gate = threading.Event(), threading.Event()
+    original = manager._write_batch
+
+    def write_when_open(logs):
+        entered.set()
+        gate.wait(10)
+        original(logs)
+
+    manager._write_batch = write_when_open
+    manager.add_log("t1", _entry(0, "ERROR"))   # 写入线程取走后阻塞，队列清空
+    assert entered.wait(5)
+    return manager, gate
+
+
+def test_flush_writes_queued_logs():
+    db = _use_mongomock()
+    manager = LogBatchManager(flush_interval=60)
+    for i in range(5):
+        manager.add_log("t1", _entry(i))
+    assert manager.flush_all(timeout=5)
+    assert db["factor_analysis_stage_logs"].count_documents({"task_id": "t1"}) == 5
+    manager.shutdown()
+
+
+def test_drop_oldest_keeps_flush_requests():
+    _use_mongomock()
+    manager, gate = _paused_manager(max_queue_size=3, overflow_policy="drop_oldest")
+    manager.add_log("t1", _entry(1))
+    request = _FlushRequest()
+    manager.log_queue.put_nowait(request)
+    manager.add_log("t1", _entry(2))
+    # 队列已满：淘汰的只能是日志，不能是 flush 请求
+    for i in range(3, 10):
+        manager.add_log("t1", _entry(i))
+    with manager.log_queue.mutex:
+        assert request in manager.log_queue.queue
+    assert manager.dropped_count == 7
+    gate.set()
+    assert request.done.wait(5)
+    manager.shutdown()
+
+
+def test_dropped_count_is_thread_safe():
+    _use_mongomock()
+    manager, gate = _paused_manager(max_queue_size=1, overflow_policy="drop_newest")
+    manager.add_log("t1", _entry(1))
+
+    def spam():
+        for i in range(1000):
+            manager.add_log("t1", _entry(i % 60))
+
+    threads = [threading.Thread(target=spam) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert manager.dropped_count == 8000
+    gate.set()
+    manager.shutdown()
+
+
+def test_logs_after_shutdown_are_written():
+    db = _use_mongomock()
+    manager = LogBatchManager(flush_interval=60)
+    manager.shutdown()
+    manager.add_log("t1", _entry(1, "ERROR"))
+    assert db["factor_analysis_stage_logs"].count_documents({"message": "m1"}) == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"✅ {name}")
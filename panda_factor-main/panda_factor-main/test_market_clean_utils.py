@@ -0,0 +1,171 @@
+"""
+测试行情清洗的向量化工具：与重构前逐行计算的结果一致（指数成分、历史名称、涨跌停价）
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panda_data_hub.utils.market_clean_utils import (asof_stock_names, calculate_limit_prices,
+                                                     components_to_frame, fill_missing_limit_prices,
+                                                     mark_index_components, partition_by_date)
+
+SYMBOLS = ['600000.SH', '600001.SH', '000002.SZ', '300750.SZ', '688981.SH', '830799.BJ', '920001.BJ',
+           '900901.SH', '999999.SH']
+
+
+def _old_component(symbol, hs_300, zz_500, zz_1000):
+    """重构前 clean_index_components 的逐行逻辑"""
+    if symbol in hs_300:
+        return '100'
+    if symbol in zz_500:
+        return '010'
+    if symbol in zz_1000:
+        return '001'
+    return '000'
+
+
+def _old_name(symbol, date, namechange, stock_basic):
+    """重构前 clean_stock_name 的逐行逻辑，找不到时为 None"""
+    changes = namechange[(namechange['ann_date'] <= date) & (namechange['ts_code'] == symbol)]
+    if not changes.empty:
+        return changes.sort_values('ann_date', ascending=False).iloc[0]['name']
+    current = stock_basic[stock_basic['ts_code'] == symbol]
+    return current['name'].iloc[0] if not current.empty else None
+
+
+def test_index_components_match_row_wise():
+    hs_300, zz_500, zz_1000 = ['600000.SH', '000002.SZ'], ['000002.SZ', '300750.SZ'], ['688981.SH', '600000.SH']
+    frame = pd.DataFrame({'symbol': SYMBOLS})
+    marks = mark_index_components(frame, 'symbol', [components_to_frame(table)
+                                                    for table in (hs_300, zz_500, zz_1000)])
+    assert marks.tolist() == [_old_component(symbol, hs_300, zz_500, zz_1000) for symbol in SYMBOLS]
+    assert mark_index_components(frame, 'symbol', [None, components_to_frame([]), None]).eq('000').all()
+
+
+def test_dated_index_components():
+    components = {'2024-01-02': ['600000.SH'], '2024-01-03': ['000002.SZ']}
+    frame = pd.DataFrame({'date': ['20240102', '20240103', '20240103'],
+                          'symbol': ['600000.SH', '600000.SH', '000002.SZ']})
+    marks = mark_index_components(frame, 'symbol', [components_to_frame(components)], date_col='date')
+    assert marks.tolist() == ['100', '000', '100']
+
+
+def test_asof_names_match_row_wise():
+    namechange = pd.DataFrame({
+        'ts_code': ['600000.SH', '600000.SH', '000002.SZ', '300750.SZ'],
+        'ann_date': ['20230105', '20240103', '20240110', None],
+        'name': ['浦发银行', 'ST浦发', '万科A', '宁德时代'],
+    })
+    stock_basic = pd.DataFrame({'ts_code': ['600000.SH', '000002.SZ', '300750.SZ'],
+                                'name': ['浦发银行', '万科A', '宁德时代']})
+    frame = pd.DataFrame({
+        'date': ['20240102', '20240103', '20240104', '20240102', '20240102', '20240103'],
+        'symbol': ['600000.SH', '600000.SH', '600000.SH', '000002.SZ', '300750.SZ', '830799.BJ'],
+    }, index=[10, 11, 12, 13, 14, 15])
+    names = asof_stock_names(frame, 'symbol', 'date', namechange, 'ts_code', 'ann_date', 'name',
+                             current_names=stock_basic.set_index('ts_code')['name'])
+    expected = [_old_name(row.symbol, row.date, namechange.dropna(subset=['ann_date']), stock_basic)
+                for row in frame.itertuples()]
+    assert names.tolist() == expected == ['浦发银行', 'ST浦发', 'ST浦发', '万科A', '宁德时代', None]
+    assert names.index.tolist() == frame.index.tolist()
+
+
+def test_partition_by_date_keeps_rows():
+    frame = pd.DataFrame({'date': ['20240103', '20240102', '20240103', '20240102'], 'value': [1, 2, 3, 4]})
+    parts = partition_by_date(frame, 'date')
+    assert list(parts) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')]
+    assert parts[pd.Timestamp('2024-01-02')]['value'].tolist() == [2, 4]
+    assert parts[pd.Timestamp('2024-01-03')]['value'].tolist() == [1, 3]
+
+
+def test_limit_prices_by_board():
+    symbols = pd.Series(['600000.SH', '600001.SH', '300750.SZ', '688981.SH', '830799.BJ', '999999.SH'])
+    names = pd.Series(['浦发银行', '*ST东电', '宁德时代', '中芯国际', '颖泰生物', '未知'])
+    upper, lower = calculate_limit_prices(symbols, pd.Series([10.0] * 6), names)
+    np.testing.assert_allclose(upper, [11.0, 10.5, 12.0, 12.0, 13.0, np.nan])
+    np.testing.assert_allclose(lower, [9.0, 9.5, 8.0, 8.0, 7.0, np.nan])
+
+
+def test_limit_prices_round_half_up():
+    # 1.15 * 1.1 = 1.265 在二进制下略小于真实值，内置 round 会得到 1.26
+    upper, lower = calculate_limit_prices(pd.Series(['600000.SH', '830799.BJ']), pd.Series([1.15, 1.15]),
+                                          pd.Series(['浦发银行', '颖泰生物']))
+    np.testing.assert_allclose(upper, [1.27, 1.50])
+    np.testing.assert_allclose(lower, [1.04, 0.81])
+
+
+def test_limit_prices_invalid_inputs_and_new_listings():
+    symbols = pd.Series(['600000.SH', '600001.SH', '600002.SH', '688981.SH', '688982.SH', '300750.SZ'])
+    upper, lower = calculate_limit_prices(
+        symbols, pd.Series([10.0, 0.0, np.nan, 10.0, 10.0, 10.0]),
+        pd.Series(['浦发银行', '邯郸钢铁', '齐鲁石化', None, '华润微', '宁德时代']),
+        listing_days=pd.Series([1, 100, 100, 100, 5, 6]))
+    # 主板上市首日、科创板/创业板前 5 日不设涨跌幅；前收盘价无效或名称缺失时无法计算
+    assert np.isnan(upper[:5]).all() and np.isnan(lower[:5]).all()
+    assert (upper[5], lower[5]) == (12.0, 8.0)
+
+
+def test_fill_only_missing_limit_prices():
+    frame = pd.DataFrame({'symbol': ['600000.SH', '300750.SZ', '600001.SH'], 'pre_close': [10.0, 10.0, 10.0],
+                          'name': ['浦发银行', '宁德时代', 'ST东电'], 'limit_up': [10.9, np.nan, 0.0],
+                          'limit_down': [9.1, 0.0, np.nan]})
+    filled = fill_missing_limit_prices(frame, 'symbol', 'pre_close', 'name')
+    assert filled['limit_up'].tolist() == [10.9, 12.0, 10.5]
+    assert filled['limit_down'].tolist() == [9.1, 8.0, 9.5]
+    assert frame['limit_up'].isna().sum() == 1  # 原表不被修改
+
+
+def test_limit_prices_match_scalar_helpers():
+    ts_utils = pytest.importorskip("panda_data_hub.utils.ts_utils")
+    rng = np.random.default_rng(0)
+    symbols = pd.Series(rng.choice(SYMBOLS, 500))
+    prev_close = pd.Series(np.round(rng.uniform(0.5, 200, 500), 2))
+    prev_close[:5] = [0.0, -1.0, 1.15, 10.05, 2.35]
+    names = pd.Series(rng.choice(['浦发银行', 'ST东电', '*ST海润', None], 500), dtype=object)
+
+    upper, lower = calculate_limit_prices(symbols, prev_close, names)
+    for i in range(len(symbols)):
+        for vectorized, scalar in (
+                (upper[i], ts_utils.calculate_upper_limit(symbols[i], float(prev_close[i]), names[i])),
+                (lower[i], ts_utils.calculate_lower_limit(symbols[i], float(prev_close[i]), names[i]))):
+            if scalar is None:
+                assert np.isnan(vectorized)
+                continue
+            # x.xx5 时向量化版本按四舍五入进位，内置 round 可能舍去一分
+            assert vectorized == pytest.approx(scalar) or vectorized == pytest.approx(scalar + 0.01)
+
+
+def test_tushare_failed_days_reach_run_tasks(monkeypatch):
+    pytest.importorskip("tushare")
+    from panda_data_hub.services import ts_stock_market_clean_service as ts_service
+
+    def query(api, trade_date=None, **kwargs):
+        if trade_date == '20240103':
+            raise ConnectionError('daily timeout')
+        return pd.DataFrame()  # 其他交易日没有数据，清洗同样失败
+
+    calendar = SimpleNamespace(trading_days=lambda start, end, **kwargs: ['2024-01-02', '2024-01-03'])
+    monkeypatch.setattr(ts_service, 'get_trading_calendar', lambda config: calendar)
+    service = ts_service.StockMarketCleanTSServicePRO.__new__(ts_service.StockMarketCleanTSServicePRO)
+    service.config, service.progress_callback = {}, None
+    service.pro = SimpleNamespace(query=query)
+    service.endpoint = SimpleNamespace(call=lambda func, *args, **kwargs: func(*args, **kwargs))
+
+    with pytest.raises(ConnectionError):
+        service.clean_meta_market_data('2024-01-03')
+    failures = service.stock_market_history_clean('20240102', '20240103')
+    assert sorted(failures) == ['2024-01-02', '2024-01-03']
+    assert isinstance(failures['2024-01-03'], ConnectionError)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
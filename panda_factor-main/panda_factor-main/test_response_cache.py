@@ -0,0 +1,84 @@
+"""
+测试 LLM 回复缓存的缓存键和两级缓存
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_llm"))
+
+import mongomock
+
+from panda_common.handlers.database_handler import DatabaseHandler
+from panda_llm.services.response_cache import ResponseCache, make_cache_key
+
+SYSTEM = {"role": "system", "content": "你是因子助手"}
+
+
+def _key(*contents, model="deepseek-chat"):
+    roles = ["user", "assistant"]
+    return make_cache_key(model, [SYSTEM] + [
+        {"role": roles[i % 2], "content": content} for i, content in enumerate(contents)])
+
+
+def _cache(**config):
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient()
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+    return ResponseCache({"MONGO_DB": "panda", **config})
+
+
+def test_key_ignores_unicode_form_and_surrounding_whitespace():
+    assert _key("解释一下 caf\u00e9 因子") == _key("  解释一下 cafe\u0301 因子\n")
+
+
+def test_key_keeps_case_punctuation_and_code():
+    assert _key("df['Close']") != _key("df['close']")
+    assert _key("x = a.b") != _key("x = a b")
+    assert _key("if x:\n    return 1") != _key("if x: return 1")
+    assert _key("解释 RSI?") != _key("解释 RSI")
+
+
+def test_key_depends_on_full_dialog():
+    question = "把这个公式改成 Python"
+    assert _key("q1", "a1", "q2", "a2", question) != _key("other", "a1", "q2", "a2", question)
+    assert _key(question) != _key("q1", "a1", question)
+    assert _key(question) != _key(question, model="qwen")
+
+
+def test_memory_and_mongo_hits():
+    cache = _cache()
+    key = _key("解释一下 RSI")
+    assert cache.get(key) is None
+    cache.set(key, "RSI 是相对强弱指标", model="deepseek-chat")
+    assert cache.get(key) == "RSI 是相对强弱指标"
+
+    cache._memory.clear()
+    assert cache.get(key) == "RSI 是相对强弱指标"
+    stats = cache.get_stats()
+    assert (stats["memory_hits"], stats["mongo_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_mongo_entries_use_utc_for_expiry():
+    cache = _cache(LLM_CACHE_TTL=3600)
+    key = _key("解释一下 MACD")
+    cache.set(key, "MACD 是指数平滑异同移动平均线")
+    created_at = cache._collection.find_one({"_id": key})["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    assert abs((datetime.now(timezone.utc) - created_at).total_seconds()) < 60
+
+    # pymongo 读回的是不带时区的 UTC 时间，两小时前写入的记录已过期
+    cache._memory.clear()
+    cache._collection.update_one({"_id": key}, {"$set": {
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=2)}})
+    assert cache.get(key) is None
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,185 @@
+"""
+测试 SCGU 因子图构建：股票相关性边与逐对计算的结果一致（含缺失值）；
+遗忘训练的负样本按 因子 -> 股票 抽取；邻居采样的 mini-batch 遗忘训练
+"""
+
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_factor"))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torch_geometric")
+
+from torch_geometric.data import Data
+
+from panda_factor.models.scgu_integration import (FactorGNNDelete, FactorGraphBuilder, FactorGraphConfig,
+                                                  NegativeSampler, SCGUTrainer, unlearn_factors)
+
+
+def _returns(num_stocks=60, num_days=40, missing=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(num_days, 5)) @ rng.normal(size=(5, num_stocks))
+    values = base + rng.normal(size=(num_days, num_stocks)) * 0.8
+    stocks = np.array([f"s{i}" for i in range(num_stocks)])
+    returns = pd.DataFrame(values, columns=stocks)
+    returns["s3"] = 1.0  # 常数序列相关系数为 NaN
+    returns = returns.mask(rng.random(returns.shape) < missing)
+    returns["s5"] = np.nan
+    return returns, stocks[rng.permutation(num_stocks)]
+
+
+def _loop_pairs(stock_returns, stocks, threshold):
+    """逐对计算的参考实现"""
+    stock_corr = stock_returns.corr()
+    pairs = []
+    for i, stock1 in enumerate(stocks):
+        for j, stock2 in enumerate(stocks):
+            if i < j and stock1 in stock_corr.index and stock2 in stock_corr.columns:
+                if abs(stock_corr.loc[stock1, stock2]) > threshold:
+                    pairs.append((i, j))
+    return pairs
+
+
+@pytest.mark.parametrize("missing", [0.0, 0.15])
+@pytest.mark.parametrize("block_size", [7, 1024])
+def test_stock_pairs_match_loop(missing, block_size):
+    returns, stocks = _returns(missing=missing)
+    # 最后两只股票不在收益率表中
+    returns = returns.drop(columns=stocks[-2:])
+    config = FactorGraphConfig(corr_block_size=block_size)
+    src, dst = FactorGraphBuilder(config)._stock_correlation_pairs(returns, stocks)
+    assert list(zip(src.tolist(), dst.tolist())) == _loop_pairs(returns, stocks, config.similarity_threshold)
+
+
+def test_pairwise_correlation_matches_pandas():
+    returns, stocks = _returns(missing=0.2)
+    values = returns.reindex(columns=stocks).to_numpy(dtype=float)
+    corr_block = FactorGraphBuilder._pairwise_corr_blocks(values, ~np.isnan(values))
+    corr = np.vstack([corr_block(start, min(start + 16, len(stocks))) for start in range(0, len(stocks), 16)])
+    expected = returns.reindex(columns=stocks).corr().to_numpy()
+    np.testing.assert_allclose(corr, expected, atol=1e-12)
+
+
+def _typed_graph():
+    node_to_idx = {"factor_a": 0, "factor_b": 1}
+    node_to_idx.update({f"stock_{i}": 2 + i for i in range(6)})
+    edge_index = torch.tensor([[0, 0, 1, 2, 3], [2, 3, 4, 3, 5]])
+    data = Data(x=torch.arange(8), edge_index=edge_index, edge_type=torch.tensor([0, 0, 0, 2, 2]))
+    data.num_nodes = 8
+    data.node_to_idx = node_to_idx
+    return data
+
+
+def test_negatives_are_factor_to_stock():
+    data = _typed_graph()
+    trainer = SCGUTrainer(None, FactorGraphConfig())
+    factor_nodes, stock_nodes = trainer._node_sets(data)
+    assert factor_nodes.tolist() == [0, 1]
+    assert stock_nodes.tolist() == [2, 3, 4, 5, 6, 7]
+
+    neg = trainer._negative_sampling(data.edge_index, data.num_nodes, 200,
+                                     src_nodes=factor_nodes, dst_nodes=stock_nodes)
+    assert neg.shape == (2, 200)
+    assert set(neg[0].tolist()) <= {0, 1}
+    assert set(neg[1].tolist()) <= set(range(2, 8))
+    existing = set(zip(*data.edge_index.tolist()))
+    assert not existing & set(zip(*neg.tolist()))
+
+
+def test_subgraph_node_sets_use_local_ids():
+    data = _typed_graph()
+    trainer = SCGUTrainer(None, FactorGraphConfig())
+    # 子图的局部编号 0..3 对应全局节点 5, 1, 7, 0
+    n_id = torch.tensor([5, 1, 7, 0])
+    seeds = Data(edge_index=torch.tensor([[1], [0]]), num_nodes=4)
+    seeds.factor_mask = trainer._factor_mask(data)[n_id]
+    factor_nodes, stock_nodes = trainer._node_sets(seeds)
+    assert factor_nodes.tolist() == [1, 3]
+    assert stock_nodes.tolist() == [0, 2]
+
+
+def _dense_factor_stock_graph(skip=()):
+    """2 个因子 x 6 只股票全部相连（skip 中的边除外），另有两条股票间的边"""
+    edges = [(f, s) for f in range(2) for s in range(2, 8) if (f, s) not in skip]
+    edges += [(2, 3), (4, 5)]
+    return torch.tensor(edges).t()
+
+
+def test_full_factor_stock_space_falls_back_to_all_nodes():
+    edge_index = _dense_factor_stock_graph()
+    sampler = NegativeSampler(edge_index, 8)
+    factor_nodes, stock_nodes = torch.tensor([0, 1]), torch.arange(2, 8)
+    assert sampler.free_pairs(factor_nodes, stock_nodes) == (12, 0)
+
+    with pytest.warns(UserWarning, match="free pairs"):
+        neg = sampler.sample(10, factor_nodes, stock_nodes)
+    assert neg.shape == (2, 10)
+    pairs = set(zip(*neg.tolist()))
+    assert not pairs & set(zip(*edge_index.tolist()))
+    assert all(src != dst for src, dst in pairs)
+
+
+def test_nearly_full_space_draws_the_free_pairs():
+    skip = {(0, 4), (1, 7)}
+    sampler = NegativeSampler(_dense_factor_stock_graph(skip), 8)
+    neg = sampler.sample(2, torch.tensor([0, 1]), torch.arange(2, 8))
+    assert set(zip(*neg.tolist())) == skip
+
+
+@pytest.mark.parametrize("num_neighbors", [None, [2, 2]])
+def test_unlearn_factors_minibatch(num_neighbors, monkeypatch):
+    torch.manual_seed(0)
+    data = _typed_graph()
+    config = FactorGraphConfig(in_dim=8, hidden_dim=8, out_dim=8, num_neighbors=num_neighbors, batch_size=4)
+    node_mask = torch.zeros(data.num_nodes, dtype=torch.bool)
+    node_mask[[0, 2, 3]] = True  # factor_a 及其相邻股票
+    model = FactorGNNDelete(config, data.num_nodes, config.num_relations, node_mask, node_mask)
+
+    losses = []
+    trainer_epoch = SCGUTrainer.train_epoch
+
+    def record(self, *args, **kwargs):
+        losses.append(trainer_epoch(self, *args, **kwargs))
+        return losses[-1]
+
+    monkeypatch.setattr(SCGUTrainer, "train_epoch", record)
+    unlearn_factors(model, data, ["a"], epochs=2, lr=0.01, config=config)
+
+    assert len(losses) == 2
+    for loss_dict in losses:
+        assert set(loss_dict) == {"total", "random", "locality"}
+        assert all(np.isfinite(value) for value in loss_dict.values())
+
+
+def test_framework_neighbor_loader():
+    pytest.importorskip("networkx")
+    path = os.path.join(current_dir, "..", "..", "SCGU-main", "framework", "utils.py")
+    if not os.path.exists(path):
+        pytest.skip("SCGU-main 不在仓库中")
+    spec = importlib.util.spec_from_file_location("scgu_framework_utils", path)
+    utils = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(utils)
+
+    data = _typed_graph()
+    data.sdf_mask = torch.ones(data.edge_index.size(1), dtype=torch.bool)
+    args = SimpleNamespace(num_neighbors=[2, 2], num_workers=0, num_threads=0)
+    loader = utils.get_minibatch_loader(data, args, batch_size=2)
+    seen = 0
+    for batch in loader:
+        # 子图的节点和边属性都按采样结果切片
+        assert batch.x.tolist() == batch.n_id.tolist()
+        assert batch.sdf_mask.size(0) == batch.edge_index.size(1)
+        seen += batch.edge_label_index.size(1)
+    assert seen == data.edge_index.size(1)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,111 @@
+"""
+测试交易日历：临时区间不持久化、数据源覆盖临时区间、交易日偏移
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+
+from panda_common.utils import trading_calendar as tc
+from panda_common.utils.trading_calendar import TradingCalendar
+
+
+def weekday_source(start, end):
+    days = pd.date_range(start, end, freq='D')
+    return [d.strftime('%Y%m%d') for d in days if d.weekday() < 5]
+
+
+class VendorSource:
+    """模拟数据源：2024-01-01 和 2024-02-09~2024-02-16 休市"""
+
+    holidays = {'20240101'} | {d.strftime('%Y%m%d') for d in pd.date_range('20240209', '20240216')}
+
+    def __init__(self):
+        self.calls = []
+        self.__name__ = 'vendor'
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        return [d for d in weekday_source(start, end) if d not in self.holidays]
+
+
+def _calendar(tmp_path, monkeypatch, today='20240301'):
+    monkeypatch.setattr(tc, '_today', lambda: tc._to_day(today))
+    return TradingCalendar(file_path=str(tmp_path / 'calendar.json'), use_mongo=False,
+                           default_source=weekday_source)
+
+
+def test_default_source_is_not_persisted(tmp_path, monkeypatch):
+    calendar = _calendar(tmp_path, monkeypatch)
+    assert calendar.trading_days('20240101', '20240105')[0] == '20240101'
+    assert not os.path.exists(tmp_path / 'calendar.json')
+    assert calendar.get_status()['ranges'][0]['authoritative'] is False
+
+
+def test_vendor_source_overwrites_provisional_range(tmp_path, monkeypatch):
+    calendar = _calendar(tmp_path, monkeypatch)
+    calendar.trading_days('20240101', '20240131')
+    vendor = VendorSource()
+
+    days = calendar.trading_days('20240101', '20240131', source=vendor)
+    assert '20240101' not in days
+    assert vendor.calls == [('20240101', '20240131')]
+
+    # 已是权威数据，不再查询数据源
+    calendar.trading_days('20240102', '20240110', source=vendor)
+    assert len(vendor.calls) == 1
+
+    with open(tmp_path / 'calendar.json', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['ranges'] == [['20240101', '20240131']]
+    assert '20240101' not in data['trading_days']
+
+    reloaded = _calendar(tmp_path, monkeypatch)
+    assert not reloaded.is_trading_day('20240101')
+    assert reloaded.get_status()['ranges'][0]['authoritative'] is True
+
+
+def test_future_days_are_not_persisted(tmp_path, monkeypatch):
+    calendar = _calendar(tmp_path, monkeypatch, today='20240131')
+    vendor = VendorSource()
+    calendar.trading_days('20240125', '20240220', source=vendor)
+
+    with open(tmp_path / 'calendar.json', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['ranges'] == [['20240125', '20240131']]
+    assert max(data['trading_days']) <= '20240131'
+
+    # 今天之后的临时区间在今天之前不会反复查询
+    calendar.trading_days('20240125', '20240220', source=vendor)
+    assert len(vendor.calls) == 1
+
+
+def test_legacy_file_is_provisional(tmp_path, monkeypatch):
+    with open(tmp_path / 'calendar.json', 'w', encoding='utf-8') as f:
+        json.dump({'start': '20240101', 'end': '20240131',
+                   'trading_days': weekday_source('20240101', '20240131')}, f)
+    calendar = _calendar(tmp_path, monkeypatch)
+    assert calendar.is_trading_day('20240101')
+
+    vendor = VendorSource()
+    assert '20240101' not in calendar.trading_days('20240101', '20240131', source=vendor)
+    assert vendor.calls == [('20240101', '20240131')]
+
+
+def test_offset(tmp_path, monkeypatch):
+    calendar = _calendar(tmp_path, monkeypatch)
+    calendar.trading_days('20231201', '20240331', source=VendorSource())
+    assert calendar.next_trading_day('20231229') == '20240102'
+    assert calendar.previous_trading_day('20240219') == '20240208'
+    assert calendar.offset(['20240208', '20240210'], 0) == ['20240208', '20240219']
+    assert calendar.offset('20240102', -2) == '20231228'
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,56 @@
+"""
+测试行情/因子表写入策略
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "panda_common"))
+sys.path.insert(0, os.path.join(current_dir, "panda_data_hub"))
+
+import mongomock
+import pytest
+
+from panda_data_hub.utils.write_strategies import (MergeStrategy, ReplaceDayStrategy, WriteStrategy)
+
+
+def _records(date, values):
+    return [{'date': date, 'symbol': symbol, 'close': close} for symbol, close in values.items()]
+
+
+def test_write_strategy_is_abstract():
+    with pytest.raises(TypeError):
+        WriteStrategy()
+
+
+def test_replace_day_only_touches_written_dates():
+    db = mongomock.MongoClient().db
+    db.stock_market.insert_many(_records('20240102', {'A': 1.0, 'C': 1.0}) + _records('20240103', {'A': 1.0}))
+    ReplaceDayStrategy().write(db.stock_market, _records('20240102', {'A': 2.0}))
+    assert sorted(doc['symbol'] for doc in db.stock_market.find({'date': '20240102'})) == ['A']
+    assert db.stock_market.count_documents({'date': '20240103'}) == 1
+
+
+def test_merge_creates_unique_index():
+    db = mongomock.MongoClient().db
+    db.stock_market.create_index([('symbol', 1), ('date', 1)], name='symbol_date_idx')
+    strategy = MergeStrategy()
+    assert strategy._has_unique_key(db.stock_market)
+    info = db.stock_market.index_information()['date_symbol_unique_idx']
+    assert info['unique'] and info['key'] == [('date', 1), ('symbol', 1)]
+
+
+def test_merge_falls_back_to_upsert_on_duplicates():
+    db = mongomock.MongoClient().db
+    db.stock_market.insert_many(_records('20240102', {'A': 1.0}) + _records('20240102', {'A': 1.5}))
+    strategy = MergeStrategy()
+    written = []
+    strategy._fallback.write = lambda collection, records: written.extend(records) or len(records)
+    assert strategy.write(db.stock_market, _records('20240102', {'B': 2.0})) == 1
+    assert 'date_symbol_unique_idx' not in db.stock_market.index_information()
+    assert [record['symbol'] for record in written] == ['B']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,254 @@
+"""
+节点间的数据引用（artifact）
+
+节点的输入/输出模型只传引用，不内联数据：大的 DataFrame 先 publish() 放进进程内的
+ArtifactStore，输出模型里只放一个 DataFrameRef；下游节点 load() 取回同一个对象，
+线程池执行时不发生任何复制或序列化。
+
+跨进程（进程池执行节点）时，executor 在提交前调用 export() 把引用导出为共享内存目录
+（/dev/shm，不存在时用临时目录）下的 Arrow IPC 文件，子进程按内存映射读取；
+没有安装 pyarrow 时退化为 pickle 文件。
+
+示例::
+
+    from panda_plugins.artifacts import DataFrameRef, load_frame, publish
+
+    class Output(BaseModel):
+        data: DataFrameRef
+
+    def run(self, input):
+        return Output(data=publish(df))      # 上游
+        df = load_frame(input.data)          # 下游
+"""
+
+import importlib.util
+import os
+import pickle
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+from pydantic import BaseModel
+
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+# 只在内存中的引用 / 已导出为文件的引用
+MEMORY = "memory"
+IPC = "ipc"
+
+DEFAULT_MAX_ITEMS = 256
+
+
+def _ipc_dir() -> Path:
+    shm = Path("/dev/shm")
+    root = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    path = root / "quantflow_artifacts"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class ArtifactRef(BaseModel):
+    """数据引用，序列化后只有几十字节"""
+    artifact_id: str
+    kind: str = "object"
+    location: str = MEMORY
+    path: Optional[str] = None
+    pid: int = 0
+
+    def load(self) -> Any:
+        return get_store().get(self)
+
+
+class DataFrameRef(ArtifactRef):
+    """DataFrame 引用，附带形状和列名便于前端展示和下游校验"""
+    kind: str = "dataframe"
+    rows: int = 0
+    columns: List[str] = []
+
+    def load(self) -> pd.DataFrame:
+        return get_store().get(self)
+
+
+def as_ref(value: Any) -> Optional[ArtifactRef]:
+    """识别引用；BaseWorkNode.execute 会把输出模型转成字典，字典形式的引用也能识别"""
+    if isinstance(value, ArtifactRef):
+        return value
+    if isinstance(value, dict) and "artifact_id" in value and "location" in value:
+        return (DataFrameRef if value.get("kind") == "dataframe" else ArtifactRef)(**value)
+    return None
+
+
+class ArtifactStore:
+    """
+    进程内的数据引用表
+
+    保留最近 QUANTFLOW_ARTIFACT_MAX_ITEMS 个对象，超出时淘汰最早发布的未固定对象；
+    executor 把还有下游节点未执行的输出 pin() 住，最后一个下游结束后 unpin()，
+    工作流结束后释放中间节点的引用，执行记录保存后释放最终输出。
+    固定的对象不会被淘汰，全部固定时允许暂时超过上限。
+    """
+
+    def __init__(self, max_items: Optional[int] = None):
+        self.max_items = max_items or int(os.getenv("QUANTFLOW_ARTIFACT_MAX_ITEMS", 0)) or DEFAULT_MAX_ITEMS
+        self._objects: "OrderedDict[str, Any]" = OrderedDict()
+        self._exports: Dict[str, ArtifactRef] = {}
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def put(self, obj: Any) -> ArtifactRef:
+        artifact_id = uuid.uuid4().hex
+        if isinstance(obj, pd.DataFrame):
+            ref = DataFrameRef(artifact_id=artifact_id, pid=os.getpid(), rows=len(obj),
+                               columns=[str(column) for column in obj.columns])
+        else:
+            ref = ArtifactRef(artifact_id=artifact_id, pid=os.getpid())
+        with self._lock:
+            self._objects[artifact_id] = obj
+            self._evict()
+        return ref
+
+    def _evict(self):
+        excess = len(self._objects) - self.max_items
+        if excess <= 0:
+            return
+        evicted = [artifact_id for artifact_id in self._objects if artifact_id not in self._pins][:excess]
+        for artifact_id in evicted:
+            del self._objects[artifact_id]
+            self._drop_export(artifact_id)
+
+    def pin(self, artifact_ids):
+        """固定引用，unpin 次数与 pin 相同之前不会被淘汰"""
+        with self._lock:
+            for artifact_id in artifact_ids:
+                self._pins[artifact_id] = self._pins.get(artifact_id, 0) + 1
+
+    def unpin(self, artifact_ids):
+        with self._lock:
+            for artifact_id in artifact_ids:
+                count = self._pins.get(artifact_id, 0) - 1
+                if count > 0:
+                    self._pins[artifact_id] = count
+                else:
+                    self._pins.pop(artifact_id, None)
+            self._evict()
+
+    def get(self, ref: Union[ArtifactRef, Dict]) -> Any:
+        ref = as_ref(ref)
+        with self._lock:
+            if ref.artifact_id in self._objects:
+                return self._objects[ref.artifact_id]
+        if ref.location == IPC and ref.path:
+            obj = self._read_file(ref)
+            with self._lock:
+                self._objects[ref.artifact_id] = obj
+                # 记下导出文件，release 时一并删除
+                self._exports.setdefault(ref.artifact_id, ref)
+            return obj
+        raise KeyError(f"数据引用 {ref.artifact_id} 不存在或已被释放")
+
+    def export(self, ref: Union[ArtifactRef, Dict]) -> ArtifactRef:
+        """把内存引用导出为 IPC 文件，供其他进程读取；同一引用只导出一次"""
+        ref = as_ref(ref)
+        if ref.location == IPC:
+            return ref
+        with self._lock:
+            exported = self._exports.get(ref.artifact_id)
+        if exported is not None:
+            return exported
+
+        obj = self.get(ref)
+        directory = _ipc_dir()
+        if HAS_ARROW and isinstance(obj, pd.DataFrame):
+            import pyarrow as pa
+            path = directory / f"{ref.artifact_id}.arrow"
+            table = pa.Table.from_pandas(obj)
+            with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            path = directory / f"{ref.artifact_id}.pkl"
+            with open(path, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        exported = ref.copy(update={"location": IPC, "path": str(path)})
+        with self._lock:
+            self._exports[ref.artifact_id] = exported
+        return exported
+
+    @staticmethod
+    def _read_file(ref: ArtifactRef) -> Any:
+        if ref.path.endswith(".arrow"):
+            import pyarrow as pa
+            # 内存映射读取，数值列不经过额外复制
+            with pa.memory_map(ref.path, "r") as source:
+                return pa.ipc.open_file(source).read_all().to_pandas()
+        with open(ref.path, "rb") as f:
+            return pickle.load(f)
+
+    def _drop_export(self, artifact_id: str):
+        exported = self._exports.pop(artifact_id, None)
+        if exported is not None and exported.path:
+            try:
+                os.remove(exported.path)
+            except OSError:
+                pass
+
+    def release(self, artifact_ids, keep_exports: bool = False):
+        """释放引用；keep_exports 为 True 时只释放内存中的对象，保留导出文件给其他进程读取"""
+        with self._lock:
+            for artifact_id in artifact_ids:
+                self._objects.pop(artifact_id, None)
+                if keep_exports:
+                    self._exports.pop(artifact_id, None)
+                else:
+                    self._drop_export(artifact_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"objects": len(self._objects), "exports": len(self._exports), "pinned": len(self._pins),
+                    "max_items": self.max_items, "arrow": HAS_ARROW}
+
+
+_store = ArtifactStore()
+
+
+def get_store() -> ArtifactStore:
+    """获取进程内的全局引用表"""
+    return _store
+
+
+def publish(obj: Any) -> ArtifactRef:
+    """发布对象，返回引用（DataFrame 返回 DataFrameRef）"""
+    return _store.put(obj)
+
+
+def load_frame(value: Union[ArtifactRef, Dict, List[Dict[str, Any]], pd.DataFrame]) -> pd.DataFrame:
+    """把引用、记录列表或 DataFrame 统一转换为 DataFrame，兼容内联数据的旧工作流"""
+    ref = as_ref(value)
+    if ref is not None:
+        return _store.get(ref)
+    if isinstance(value, pd.DataFrame):
+        return value
+    return pd.DataFrame(value)
+
+
+def map_refs(value: Any, func) -> Any:
+    """对 value 中（含嵌套 dict/list）的每个引用应用 func，返回替换后的副本"""
+    ref = as_ref(value)
+    if ref is not None:
+        return func(ref)
+    if isinstance(value, dict):
+        return {key: map_refs(item, func) for key, item in value.items()}
+    if isinstance(value, list):
+        return [map_refs(item, func) for item in value]
+    return value
+
+
+def collect_refs(value: Any) -> List[ArtifactRef]:
+    """列出 value 中（含嵌套 dict/list）的所有引用"""
+    refs = []
+    map_refs(value, lambda ref: refs.append(ref) or ref)
+    return refs
@@ -36,6 +36,9 @@ class BaseWorkNode(ABC):
     所有自定义节点必须继承此类
     """
     
+    # 相同类型、版本和输入的执行结果是否可以复用；有副作用（发通知、下单）的节点应设为 False
+    cacheable: bool = True
+    
     def __init__(self):
         self.metadata = self._get_metadata()
         self._input_model = None
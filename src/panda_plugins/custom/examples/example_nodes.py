@@ -3,7 +3,7 @@
 展示如何创建量化分析相关的工作流节点
 """
 
-from typing import Optional, Type, List, Dict, Any
+from typing import Optional, Type, List, Dict, Any, Union
 from pydantic import BaseModel
 import numpy as np
 import pandas as pd
@@ -14,6 +14,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent.parent))
 from panda_plugins.base import BaseWorkNode, work_node
+from panda_plugins.artifacts import DataFrameRef, load_frame, publish
 
 # ==================== 数据节点 ====================
 
@@ -25,9 +26,9 @@ class StockDataInput(BaseModel):
     frequency: str = "1d"  # 1d, 1h, 5m
 
 class StockDataOutput(BaseModel):
-    """股票数据输出"""
+    """股票数据输出（行情以 DataFrame 引用传给下游，不内联）"""
     symbol: str
-    data: List[Dict[str, Any]]
+    data: DataFrameRef
     columns: List[str]
     count: int
 
@@ -38,6 +39,9 @@ class StockDataLoader(BaseWorkNode):
     支持多种数据源和时间频率
     """
     
+    # 数据源节点：结果随当前日期和数据源更新而变化，不缓存
+    cacheable = False
+    
     @classmethod
     def input_model(cls) -> Optional[Type[BaseModel]]:
         return StockDataInput
@@ -57,29 +61,27 @@ class StockDataLoader(BaseWorkNode):
         returns = np.random.randn(days) * 0.02
         prices = price_base * np.exp(np.cumsum(returns))
         
-        data = []
-        for i, date in enumerate(dates):
-            data.append({
-                "date": date.isoformat(),
-                "open": float(prices[i] * (1 - np.random.rand() * 0.01)),
-                "high": float(prices[i] * (1 + np.random.rand() * 0.02)),
-                "low": float(prices[i] * (1 - np.random.rand() * 0.02)),
-                "close": float(prices[i]),
-                "volume": int(np.random.randint(1000000, 5000000))
-            })
+        df = pd.DataFrame({
+            "date": [date.isoformat() for date in dates],
+            "open": prices * (1 - np.random.rand(days) * 0.01),
+            "high": prices * (1 + np.random.rand(days) * 0.02),
+            "low": prices * (1 - np.random.rand(days) * 0.02),
+            "close": prices,
+            "volume": np.random.randint(1000000, 5000000, size=days)
+        })
         
         return StockDataOutput(
             symbol=input.symbol,
-            data=data,
-            columns=["date", "open", "high", "low", "close", "volume"],
-            count=len(data)
+            data=publish(df),
+            columns=list(df.columns),
+            count=len(df)
         )
 
 # ==================== 因子计算节点 ====================
 
 class FactorInput(BaseModel):
-    """因子计算输入"""
-    data: List[Dict[str, Any]]
+    """因子计算输入（DataFrame 引用，或兼容旧工作流的记录列表）"""
+    data: Union[DataFrameRef, List[Dict[str, Any]]]
     factor_type: str  # momentum, rsi, macd, bollinger
     period: int = 20
 
@@ -105,9 +107,9 @@ class TechnicalFactorCalculator(BaseWorkNode):
         return FactorOutput
     
     def run(self, input: FactorInput) -> FactorOutput:
-        # 转换为DataFrame
-        df = pd.DataFrame(input.data)
-        df['close'] = pd.to_numeric(df['close'])
+        # 取回上游的 DataFrame（引用时不复制）
+        df = load_frame(input.data)
+        close = pd.to_numeric(df['close'])
         
         values = []
         factor_name = ""
@@ -115,13 +117,13 @@ class TechnicalFactorCalculator(BaseWorkNode):
         if input.factor_type == "momentum":
             # 动量因子
             factor_name = f"Momentum_{input.period}"
-            momentum = df['close'].pct_change(input.period)
+            momentum = close.pct_change(input.period)
             values = momentum.fillna(0).tolist()
             
         elif input.factor_type == "rsi":
             # RSI指标
             factor_name = f"RSI_{input.period}"
-            delta = df['close'].diff()
+            delta = close.diff()
             gain = (delta.where(delta > 0, 0)).rolling(window=input.period).mean()
             loss = (-delta.where(delta < 0, 0)).rolling(window=input.period).mean()
             rs = gain / loss
@@ -131,15 +133,15 @@ class TechnicalFactorCalculator(BaseWorkNode):
         elif input.factor_type == "macd":
             # MACD指标
             factor_name = "MACD"
-            exp1 = df['close'].ewm(span=12, adjust=False).mean()
-            exp2 = df['close'].ewm(span=26, adjust=False).mean()
+            exp1 = close.ewm(span=12, adjust=False).mean()
+            exp2 = close.ewm(span=26, adjust=False).mean()
             macd = exp1 - exp2
             values = macd.fillna(0).tolist()
             
         else:
             # 默认返回价格
             factor_name = "Price"
-            values = df['close'].tolist()
+            values = close.tolist()
         
         # 计算统计指标
         values_array = np.array(values)
@@ -181,6 +183,9 @@ class MLModelTrainer(BaseWorkNode):
     支持随机森林、XGBoost、线性回归等
     """
     
+    # 未固定随机种子，相同输入每次结果不同，不缓存
+    cacheable = False
+    
     @classmethod
     def input_model(cls) -> Optional[Type[BaseModel]]:
         return MLInput
@@ -226,9 +231,10 @@ class MLModelTrainer(BaseWorkNode):
 # ==================== 回测节点 ====================
 
 class BacktestInput(BaseModel):
-    """回测输入"""
+    """回测输入（prices 可以是行情 DataFrame 引用，取 price_column 列）"""
     signals: List[float]
-    prices: List[float]
+    prices: Union[DataFrameRef, List[float]]
+    price_column: str = "close"
     initial_capital: float = 1000000
     position_size: float = 0.1
     commission: float = 0.001
@@ -258,6 +264,10 @@ class StrategyBacktester(BaseWorkNode):
         return BacktestOutput
     
     def run(self, input: BacktestInput) -> BacktestOutput:
+        prices = input.prices
+        if isinstance(prices, DataFrameRef):
+            prices = prices.load()[input.price_column].astype(float).tolist()
+        
         # 简单回测逻辑
         capital = input.initial_capital
         positions = 0
@@ -265,7 +275,7 @@ class StrategyBacktester(BaseWorkNode):
         
         for i in range(1, len(input.signals)):
             signal = input.signals[i]
-            price = input.prices[i]
+            price = prices[i]
             
             # 买入信号
             if signal > 0 and positions == 0:
@@ -281,14 +291,14 @@ class StrategyBacktester(BaseWorkNode):
         
         # 清仓
         if positions > 0:
-            capital += positions * input.prices[-1]
+            capital += positions * prices[-1]
         
         # 计算统计指标
         total_return = (capital - input.initial_capital) / input.initial_capital
-        annual_return = total_return * (252 / len(input.prices))  # 假设日数据
+        annual_return = total_return * (252 / len(prices))  # 假设日数据
         
         # 计算每日收益率
-        returns = np.diff(input.prices) / input.prices[:-1]
+        returns = np.diff(prices) / prices[:-1]
         sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if np.std(returns) > 0 else 0
         
         # 计算最大回撤
@@ -416,10 +426,9 @@ if __name__ == "__main__":
     print("\n测试策略回测节点...")
     backtester = StrategyBacktester()
     signals = [1 if v > 0 else -1 for v in factor_output.values]
-    prices = [d["close"] for d in stock_output.data]
     backtest_input = BacktestInput(
         signals=signals,
-        prices=prices
+        prices=stock_output.data
     )
     backtest_output = backtester.run(backtest_input)
     print(f"总收益: {backtest_output.total_return:.2%}")
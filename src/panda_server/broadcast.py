@@ -0,0 +1,162 @@
+"""
+WebSocket 广播中心
+
+publish() 不等待任何客户端：消息序列化一次后放入每个客户端自己的有界队列，
+由各客户端的发送任务并发发出，一个慢客户端不会拖慢其他客户端。
+
+- 执行级进度消息（execution_progress，每个节点状态变化都会发布一条）在 QUANTFLOW_WS_COALESCE_MS
+  毫秒的窗口内合并，同一执行只发送窗口内最新的一条；节点状态（node_state/node_executed，
+  包括 completed/failed/timeout/skipped）和其他消息从不合并，发布前会先把待合并的进度消息发出，保证顺序
+- 客户端队列满时按 QUANTFLOW_WS_SLOW_POLICY 处理：
+    drop_oldest（默认） 丢弃该客户端最早的未发消息
+    disconnect          断开该客户端
+- 单条消息发送超过 QUANTFLOW_WS_SEND_TIMEOUT 秒视为客户端卡死，断开连接
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# 可合并的进度消息类型，按 (类型, execution_id) 只保留最新一条
+COALESCE_TYPES = {"execution_progress"}
+
+
+def _coalesce_key(message: Dict[str, Any]) -> Optional[Tuple]:
+    if message.get("type") not in COALESCE_TYPES:
+        return None
+    return message["type"], message.get("execution_id")
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
+class BroadcastHub:
+    """按客户端排队、并发发送的广播中心"""
+
+    def __init__(self, queue_size: Optional[int] = None, coalesce_window: Optional[float] = None,
+                 slow_policy: Optional[str] = None, send_timeout: Optional[float] = None):
+        self.queue_size = queue_size or int(os.getenv("QUANTFLOW_WS_QUEUE_SIZE", 256))
+        if coalesce_window is None:
+            coalesce_window = float(os.getenv("QUANTFLOW_WS_COALESCE_MS", 100)) / 1000
+        self.coalesce_window = coalesce_window
+        self.slow_policy = slow_policy or os.getenv("QUANTFLOW_WS_SLOW_POLICY", DROP_OLDEST)
+        self.send_timeout = send_timeout or float(os.getenv("QUANTFLOW_WS_SEND_TIMEOUT", 5))
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._pending: Dict[Tuple, str] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._stats = {"published": 0, "coalesced": 0, "sent": 0, "dropped": 0, "disconnected": 0}
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def connect(self, websocket: WebSocket):
+        """登记已 accept 的连接并启动它的发送任务"""
+        client = _Client(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._sender(client))
+        self._clients[websocket] = client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self._clients.pop(websocket, None)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def send_to(self, websocket: WebSocket, message: Dict[str, Any]):
+        """只发给一个客户端（同样经过它的队列，不与广播消息乱序）"""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, self._encode(message))
+
+    def publish(self, message: Dict[str, Any]):
+        """广播消息，不等待发送完成"""
+        self._stats["published"] += 1
+        key = _coalesce_key(message)
+        if key is not None and self.coalesce_window > 0:
+            if key in self._pending:
+                self._stats["coalesced"] += 1
+            self._pending[key] = self._encode(message)
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self.flush)
+            return
+        # 先发出待合并的进度消息，再发本条，保证客户端看到的顺序不变
+        self.flush()
+        self._broadcast(self._encode(message))
+
+    def flush(self):
+        """立即发出合并窗口内的进度消息"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for text in pending.values():
+            self._broadcast(text)
+
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> str:
+        # 每条消息只序列化一次，所有客户端共用同一份文本
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def _broadcast(self, text: str):
+        for client in list(self._clients.values()):
+            self._enqueue(client, text)
+
+    def _enqueue(self, client: _Client, text: str):
+        if client.queue.full():
+            self._stats["dropped"] += 1
+            if self.slow_policy == DISCONNECT:
+                self._drop_client(client, "发送队列已满")
+                return
+            client.queue.get_nowait()
+        client.queue.put_nowait(text)
+
+    def _drop_client(self, client: _Client, reason: str):
+        if self._clients.get(client.websocket) is not client:
+            return
+        self._stats["disconnected"] += 1
+        print(f"⚠️  断开慢速 WebSocket 客户端: {reason}")
+        self.disconnect(client.websocket)
+        asyncio.ensure_future(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
+
+    async def _sender(self, client: _Client):
+        try:
+            while True:
+                text = await client.queue.get()
+                try:
+                    await asyncio.wait_for(client.websocket.send_text(text), self.send_timeout)
+                except asyncio.TimeoutError:
+                    self._drop_client(client, f"发送超过 {self.send_timeout:g} 秒")
+                    return
+                except Exception:
+                    # 连接已关闭
+                    self.disconnect(client.websocket)
+                    return
+                self._stats["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "clients": len(self._clients),
+            "queued": sum(client.queue.qsize() for client in self._clients.values()),
+            "queue_size": self.queue_size,
+            "coalesce_window_ms": self.coalesce_window * 1000,
+            "slow_policy": self.slow_policy,
+        }
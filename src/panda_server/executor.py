@@ -0,0 +1,352 @@
+"""
+工作流执行引擎
+
+按连接关系对节点做拓扑排序，依赖全部完成的节点立即提交到线程池/进程池并发执行，
+上游节点的输出按端口传给下游节点的输入，每个节点有独立的超时。
+多分支工作流的总耗时约等于关键路径的耗时，而不是所有节点耗时之和。
+
+节点状态: pending -> running -> completed / failed / timeout，
+上游失败或超时的节点标记为 skipped，与其无依赖关系的分支照常执行。
+
+环境变量:
+    QUANTFLOW_EXECUTOR      thread（默认）或 process
+    QUANTFLOW_MAX_WORKERS   并发执行的节点数，线程池默认 min(32, CPU 核数 + 4)，进程池默认 CPU 核数
+    QUANTFLOW_NODE_TIMEOUT  单个节点的超时秒数，默认 300，可被节点 data.timeout 覆盖
+
+传入 NodeResultCache 时，节点按 (类型, 版本, 输入内容) 查缓存，命中则不再执行；
+节点类 cacheable = False、节点 data.cache 为 false 或输入无法计算哈希时不使用缓存。
+"""
+
+import asyncio
+import importlib
+import os
+import pickle
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from panda_plugins.artifacts import collect_refs, get_store, map_refs
+from panda_plugins.base import get_registry
+from panda_server.node_cache import NodeResultCache, make_cache_key
+
+# 节点状态
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"
+
+DEFAULT_NODE_TIMEOUT = 300.0
+
+_plugins_loaded = False
+
+
+def load_plugins(package: str = "panda_plugins.custom") -> List[str]:
+    """导入 custom 目录下的全部插件模块，使 @work_node 装饰的节点注册到全局注册表"""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return []
+    _plugins_loaded = True
+
+    loaded = []
+    try:
+        root = importlib.import_module(package)
+    except ImportError:
+        return loaded
+    # custom 下的目录没有 __init__.py，pkgutil 不会递归进去，直接按文件遍历
+    for directory in root.__path__:
+        for path in sorted(Path(directory).rglob("*.py")):
+            relative = path.relative_to(directory).with_suffix("")
+            if relative.name.startswith("_"):
+                continue
+            name = ".".join((package, *relative.parts))
+            try:
+                importlib.import_module(name)
+                loaded.append(name)
+            except Exception as e:
+                print(f"⚠️  加载插件 {name} 失败: {e}")
+    return loaded
+
+
+def resolve_node_id(node_type: str, data: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    把工作流节点映射为注册表中的节点 ID（"分组.名称"）
+
+    依次尝试 data.node_id、type 作为完整 ID、节点名称和类名
+    """
+    registry = get_registry()
+    nodes = registry.get_all_nodes()
+    candidates = [(data or {}).get("node_id"), node_type]
+    for candidate in candidates:
+        if candidate and candidate in nodes:
+            return candidate
+    for node_id, entry in nodes.items():
+        if node_type in (entry["metadata"].name, entry["class"].__name__):
+            return node_id
+    return None
+
+
+def _execute_node(node_id: str, inputs: Dict[str, Any], export_outputs: bool = False) -> Dict[str, Any]:
+    """
+    在工作线程/子进程中实例化并执行节点（进程池下需要可 pickle 的模块级函数）
+
+    export_outputs 为 True（子进程中执行）时，输出里的数据引用导出为 IPC 文件后返回，
+    父进程和其他子进程才能读取
+    """
+    load_plugins()
+    instance = get_registry().create_instance(node_id)
+    if instance is None:
+        raise LookupError(f"未注册的节点类型: {node_id}")
+    output = instance.execute(inputs)
+    if export_outputs:
+        store = get_store()
+        output = map_refs(output, lambda ref: store.export(ref).dict())
+        store.release([ref.artifact_id for ref in collect_refs(output)], keep_exports=True)
+    return output
+
+
+def release_outputs(results: Dict[str, Dict]):
+    """释放执行结果中所有节点输出的数据引用，执行记录持久化之后调用"""
+    get_store().release({ref.artifact_id for result in results.values()
+                         for ref in collect_refs(result.get("output"))})
+
+
+def topological_sort(node_ids: List[str], edges: List[tuple]) -> List[str]:
+    """Kahn 算法拓扑排序，存在环时抛出 ValueError"""
+    indegree = {node_id: 0 for node_id in node_ids}
+    children: Dict[str, List[str]] = {node_id: [] for node_id in node_ids}
+    for source, target in edges:
+        children[source].append(target)
+        indegree[target] += 1
+
+    ready = [node_id for node_id in node_ids if indegree[node_id] == 0]
+    order = []
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for child in children[node_id]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+
+    if len(order) != len(node_ids):
+        cyclic = [node_id for node_id in node_ids if node_id not in order]
+        raise ValueError(f"工作流存在循环依赖: {cyclic}")
+    return order
+
+
+def create_pool(kind: Optional[str] = None, max_workers: Optional[int] = None) -> Executor:
+    """按 QUANTFLOW_EXECUTOR / QUANTFLOW_MAX_WORKERS 创建节点执行池"""
+    kind = (kind or os.getenv("QUANTFLOW_EXECUTOR", "thread")).lower()
+    max_workers = max_workers or int(os.getenv("QUANTFLOW_MAX_WORKERS", 0)) or None
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+    # 节点多为 IO 密集（读数据库、调接口），线程数默认与 ThreadPoolExecutor 一致
+    return ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) + 4),
+                              thread_name_prefix="quantflow-node")
+
+
+class WorkflowExecutor:
+    """
+    DAG 并发执行器
+
+    on_state 为节点状态变化时的异步回调，参数形如
+    {"node_id": ..., "state": "running", "progress": 0.5, ...}
+    """
+
+    def __init__(self, pool: Executor, node_timeout: Optional[float] = None,
+                 on_state: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                 cache: Optional[NodeResultCache] = None):
+        self.pool = pool
+        self.node_timeout = node_timeout or float(os.getenv("QUANTFLOW_NODE_TIMEOUT", DEFAULT_NODE_TIMEOUT))
+        self.on_state = on_state
+        self.cache = cache
+        self.crosses_process = isinstance(pool, ProcessPoolExecutor)
+
+    def _cache_key(self, node, registry_id: str, inputs: Dict[str, Any]) -> Optional[str]:
+        """节点可缓存时返回缓存键，否则返回 None"""
+        if self.cache is None or node.data.get("cache") is False:
+            return None
+        entry = get_registry().get_all_nodes()[registry_id]
+        if not getattr(entry["class"], "cacheable", True):
+            return None
+        try:
+            return make_cache_key(registry_id, entry["metadata"].version, inputs)
+        except (TypeError, ValueError, pickle.PicklingError) as e:
+            # 输入无法计算哈希（如含 list 的列、锁等不可 pickle 的对象）时不使用缓存，节点照常执行
+            print(f"⚠️  节点 {registry_id} 的输入无法计算缓存键，跳过缓存: {e}")
+            return None
+
+    def _store(self, key: str, output: Dict[str, Any], registry_id: str):
+        try:
+            version = get_registry().get_all_nodes()[registry_id]["metadata"].version
+            self.cache.put(key, output, registry_id, version)
+        except Exception as e:
+            # 缓存写入失败不影响节点结果
+            print(f"⚠️  节点 {registry_id} 结果写入缓存失败: {e}")
+
+    @staticmethod
+    def _node_inputs(node, upstream: List[tuple], results: Dict[str, Dict]) -> Dict[str, Any]:
+        """
+        节点静态参数 + 上游输出；源端口存在于上游输出中时只传该字段，否则传整个输出
+
+        静态参数取 data.params，没有 params 时取 data 中除执行配置以外的字段
+        """
+        if "params" in node.data:
+            inputs = dict(node.data["params"])
+        else:
+            inputs = {k: v for k, v in node.data.items() if k not in ("node_id", "timeout", "cache")}
+        for connection in upstream:
+            output = results[connection.source]["output"]
+            value = output.get(connection.sourcePort, output) if isinstance(output, dict) else output
+            inputs[connection.targetPort or connection.sourcePort] = value
+        return inputs
+
+    async def _emit(self, node_id: str, state: str, **extra):
+        if self.on_state:
+            await self.on_state({"node_id": node_id, "state": state, **extra})
+
+    async def run(self, workflow, results: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """
+        执行工作流，返回 {节点ID: {"status", "output", "error", "duration", ...}}
+
+        results 传入时直接在其中更新每个节点的结果，便于调用方实时查看
+        """
+        load_plugins()
+        results = results if results is not None else {}
+        nodes = {node.id: node for node in workflow.nodes}
+        connections = [c for c in workflow.connections if c.source in nodes and c.target in nodes]
+        order = topological_sort(list(nodes), [(c.source, c.target) for c in connections])
+
+        upstream: Dict[str, List] = {node_id: [] for node_id in nodes}
+        for connection in connections:
+            upstream[connection.target].append(connection)
+        remaining = {node_id: {c.source for c in upstream[node_id]} for node_id in nodes}
+        for node_id in order:
+            results[node_id] = {"status": PENDING}
+
+        loop = asyncio.get_running_loop()
+        finished = 0
+        store = get_store()
+        # 输出还有下游未结束时固定其中的数据引用，避免被并发的其他工作流挤出 ArtifactStore
+        consumers = {node_id: {c.target for c in connections if c.source == node_id} for node_id in nodes}
+        pinned: Dict[str, List[str]] = {}
+
+        def consumed(node_id: str):
+            """node_id 已结束（完成、失败或跳过），上游最后一个消费者结束时解除固定"""
+            for source in {c.source for c in upstream[node_id]}:
+                consumers[source].discard(node_id)
+                if not consumers[source] and source in pinned:
+                    store.unpin(pinned.pop(source))
+
+        async def run_node(node_id: str) -> str:
+            node = nodes[node_id]
+            registry_id = resolve_node_id(node.type, node.data)
+            timeout = float(node.data.get("timeout") or self.node_timeout)
+            started = time.perf_counter()
+            results[node_id].update(status=RUNNING, started_at=datetime.now().isoformat())
+            await self._emit(node_id, RUNNING)
+            try:
+                if registry_id is None:
+                    raise LookupError(f"未注册的节点类型: {node.type}")
+                inputs = self._node_inputs(node, upstream[node_id], results)
+                # 计算输入哈希和读磁盘都可能较慢，放到默认线程池里做
+                cache_key = await loop.run_in_executor(None, self._cache_key, node, registry_id, inputs)
+                output = None
+                if cache_key:
+                    output = await loop.run_in_executor(None, self.cache.get, cache_key)
+                if output is not None:
+                    results[node_id]["cached"] = True
+                    status, error = COMPLETED, None
+                else:
+                    if self.crosses_process:
+                        # 子进程看不到本进程的对象，输入中的数据引用先导出为 IPC 文件
+                        inputs = await loop.run_in_executor(
+                            None, map_refs, inputs, lambda ref: get_store().export(ref).dict())
+                    output = await asyncio.wait_for(
+                        loop.run_in_executor(self.pool, _execute_node, registry_id, inputs, self.crosses_process),
+                        timeout)
+                    # BaseWorkNode.execute 捕获异常后返回 success=False
+                    if isinstance(output, dict) and output.get("success") is False and "error" in output:
+                        status, error = FAILED, output["error"]
+                    else:
+                        status, error = COMPLETED, None
+                        if cache_key:
+                            await loop.run_in_executor(None, self._store, cache_key, output, registry_id)
+            except asyncio.TimeoutError:
+                # 线程无法被强制终止，超时的节点在后台跑完后结果被丢弃
+                output, status, error = None, TIMEOUT, f"节点执行超过 {timeout:g} 秒"
+            except Exception as e:
+                output, status, error = None, FAILED, str(e)
+
+            results[node_id].update(
+                status=status, output=output, error=error,
+                finished_at=datetime.now().isoformat(),
+                duration=round(time.perf_counter() - started, 3),
+            )
+            return status
+
+        running: Dict[asyncio.Task, str] = {}
+        started_nodes = set()
+
+        def schedule_ready():
+            for node_id in order:
+                if node_id not in started_nodes and not remaining[node_id]:
+                    started_nodes.add(node_id)
+                    running[asyncio.ensure_future(run_node(node_id))] = node_id
+
+        async def skip_downstream(node_id: str):
+            nonlocal finished
+            for connection in workflow.connections:
+                target = connection.target
+                if connection.source == node_id and target in nodes and target not in started_nodes:
+                    started_nodes.add(target)
+                    results[target].update(status=SKIPPED, error=f"上游节点 {node_id} 未成功")
+                    finished += 1
+                    consumed(target)
+                    await self._emit(target, SKIPPED, progress=finished / len(nodes))
+                    await skip_downstream(target)
+
+        schedule_ready()
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    status = task.result()
+                    finished += 1
+                    if status == COMPLETED and consumers[node_id]:
+                        pinned[node_id] = [ref.artifact_id for ref in collect_refs(results[node_id]["output"])]
+                        store.pin(pinned[node_id])
+                    consumed(node_id)
+                    await self._emit(node_id, status, progress=finished / len(nodes),
+                                     error=results[node_id].get("error"),
+                                     duration=results[node_id].get("duration"),
+                                     cached=results[node_id].get("cached", False))
+                    if status == COMPLETED:
+                        for connection in workflow.connections:
+                            if connection.source == node_id and connection.target in remaining:
+                                remaining[connection.target].discard(node_id)
+                    else:
+                        await skip_downstream(node_id)
+                schedule_ready()
+        finally:
+            for task in running:
+                task.cancel()
+            for artifact_ids in pinned.values():
+                store.unpin(artifact_ids)
+            self._release_intermediate(nodes, connections, results)
+        return results
+
+    @staticmethod
+    def _release_intermediate(nodes: Dict, connections: List, results: Dict[str, Dict]):
+        """释放中间节点输出的数据引用，只保留没有下游的节点（工作流最终结果）的引用"""
+        sources = {connection.source for connection in connections}
+        keep = {ref.artifact_id for node_id in nodes if node_id not in sources
+                for ref in collect_refs(results[node_id].get("output"))}
+        intermediate = {ref.artifact_id for node_id in sources
+                        for ref in collect_refs(results[node_id].get("output"))}
+        get_store().release(intermediate - keep)
@@ -7,6 +7,7 @@ import os
 import sys
 import json
 import asyncio
+import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from datetime import datetime
@@ -14,15 +15,21 @@ from datetime import datetime
 # 添加项目路径
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "src"))
 
 # FastAPI相关
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel
 import uvicorn
 
+from panda_server.broadcast import BroadcastHub
+from panda_server.executor import WorkflowExecutor, create_pool, load_plugins, release_outputs
+from panda_server.node_cache import NodeResultCache
+from panda_server.storage import create_store
+
 # 创建应用
 app = FastAPI(
     title="PandaAI QuantFlow",
@@ -70,6 +77,7 @@ class Workflow(BaseModel):
     created_at: str
     updated_at: str
     status: str = "draft"  # draft, running, completed, failed
+    owner: str = ""
 
 class ExecutionRequest(BaseModel):
     """执行请求"""
@@ -78,10 +86,18 @@ class ExecutionRequest(BaseModel):
 
 # ==================== 工作流管理 ====================
 
-# 内存存储（实际应用应使用数据库）
-workflows_store: Dict[str, Workflow] = {}
-executions_store: Dict[str, Dict] = {}
-connected_clients: List[WebSocket] = []
+# 工作流和执行记录的持久化存储（QUANTFLOW_STORE: sqlite / mongo），多个 worker 共享
+store = create_store()
+# WebSocket 广播（QUANTFLOW_WS_QUEUE_SIZE / QUANTFLOW_WS_COALESCE_MS / QUANTFLOW_WS_SLOW_POLICY）
+hub = BroadcastHub()
+
+# 过期执行记录的清理间隔（秒）
+PURGE_INTERVAL = 3600
+
+# 节点执行池，所有工作流共享（QUANTFLOW_EXECUTOR / QUANTFLOW_MAX_WORKERS）
+node_pool = create_pool()
+# 节点结果缓存（QUANTFLOW_CACHE_DIR / QUANTFLOW_CACHE_MAX_BYTES / QUANTFLOW_CACHE_MAX_AGE）
+node_cache = NodeResultCache()
 
 @app.get("/")
 async def root():
@@ -110,16 +126,21 @@ async def health_check():
 # ==================== 工作流API ====================
 
 @app.get("/api/workflows")
-async def get_workflows():
-    """获取所有工作流"""
-    return list(workflows_store.values())
+async def get_workflows(response: Response, owner: Optional[str] = None, status: Optional[str] = None,
+                        limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """分页获取工作流（按更新时间倒序），总数在 X-Total-Count 响应头中"""
+    items, total = await asyncio.to_thread(store.list_workflows, owner=owner, status=status,
+                                           limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
 @app.get("/api/workflows/{workflow_id}")
 async def get_workflow(workflow_id: str):
     """获取单个工作流"""
-    if workflow_id not in workflows_store:
+    workflow = await asyncio.to_thread(store.get_workflow, workflow_id)
+    if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
-    return workflows_store[workflow_id]
+    return workflow
 
 @app.post("/api/workflows")
 async def create_workflow(workflow: Workflow):
@@ -128,7 +149,7 @@ async def create_workflow(workflow: Workflow):
     workflow.id = workflow_id
     workflow.created_at = datetime.now().isoformat()
     workflow.updated_at = workflow.created_at
-    workflows_store[workflow_id] = workflow
+    await asyncio.to_thread(store.save_workflow, workflow.dict())
     
     # 通知所有连接的客户端
     await notify_clients({"type": "workflow_created", "workflow": workflow.dict()})
@@ -138,12 +159,12 @@ async def create_workflow(workflow: Workflow):
 @app.put("/api/workflows/{workflow_id}")
 async def update_workflow(workflow_id: str, workflow: Workflow):
     """更新工作流"""
-    if workflow_id not in workflows_store:
+    if await asyncio.to_thread(store.get_workflow, workflow_id) is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
     workflow.id = workflow_id
     workflow.updated_at = datetime.now().isoformat()
-    workflows_store[workflow_id] = workflow
+    await asyncio.to_thread(store.save_workflow, workflow.dict())
     
     # 通知所有连接的客户端
     await notify_clients({"type": "workflow_updated", "workflow": workflow.dict()})
@@ -153,11 +174,9 @@ async def update_workflow(workflow_id: str, workflow: Workflow):
 @app.delete("/api/workflows/{workflow_id}")
 async def delete_workflow(workflow_id: str):
     """删除工作流"""
-    if workflow_id not in workflows_store:
+    if not await asyncio.to_thread(store.delete_workflow, workflow_id):
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    del workflows_store[workflow_id]
-    
     # 通知所有连接的客户端
     await notify_clients({"type": "workflow_deleted", "workflow_id": workflow_id})
     
@@ -168,23 +187,26 @@ async def delete_workflow(workflow_id: str):
 @app.post("/api/workflows/{workflow_id}/execute")
 async def execute_workflow(workflow_id: str, request: ExecutionRequest):
     """执行工作流"""
-    if workflow_id not in workflows_store:
+    stored = await asyncio.to_thread(store.get_workflow, workflow_id)
+    if stored is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    workflow = workflows_store[workflow_id]
-    execution_id = f"exec_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    workflow = Workflow(**stored)
+    # 多个 worker 同一秒内发起执行时 ID 不能重复
+    execution_id = f"exec_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
     
     # 创建执行记录
     execution = {
         "id": execution_id,
         "workflow_id": workflow_id,
+        "owner": workflow.owner,
         "status": "running",
         "started_at": datetime.now().isoformat(),
         "parameters": request.parameters,
         "results": {}
     }
     
-    executions_store[execution_id] = execution
+    await asyncio.to_thread(store.save_execution, execution)
     
     # 异步执行工作流
     asyncio.create_task(run_workflow(workflow, execution))
@@ -199,58 +221,105 @@ async def execute_workflow(workflow_id: str, request: ExecutionRequest):
     return execution
 
 async def run_workflow(workflow: Workflow, execution: Dict):
-    """异步执行工作流"""
-    try:
-        # 模拟执行过程
-        for i, node in enumerate(workflow.nodes):
-            await asyncio.sleep(1)  # 模拟节点执行
-            
-            # 更新执行状态
-            execution["results"][node.id] = {
-                "status": "completed",
-                "output": f"Node {node.name} executed successfully"
-            }
-            
-            # 通知客户端进度
+    """按依赖关系并发执行工作流节点，节点状态变化通过 /ws 推送"""
+    running = set()
+    progress = {"value": 0.0}
+
+    async def on_state(event: Dict):
+        message = {"type": "node_state", "execution_id": execution["id"], **event}
+        await notify_clients(message)
+        if event["state"] == "running":
+            running.add(event["node_id"])
+        else:
+            running.discard(event["node_id"])
+        if event.get("progress") is not None:
+            progress["value"] = event["progress"]
+        if event["state"] not in ("pending", "running"):
+            # 节点结束时持久化，其他 worker 查询执行记录也能看到进度
+            await asyncio.to_thread(store.save_execution, execution)
+            # 兼容旧客户端的进度消息
             await notify_clients({
                 "type": "node_executed",
                 "execution_id": execution["id"],
-                "node_id": node.id,
-                "progress": (i + 1) / len(workflow.nodes)
+                "node_id": event["node_id"],
+                "status": event["state"],
+                "progress": event.get("progress")
             })
-        
-        # 完成执行
-        execution["status"] = "completed"
+        # 执行级进度，广播中心按 execution_id 只保留窗口内最新的一条
+        await notify_clients({
+            "type": "execution_progress",
+            "execution_id": execution["id"],
+            "progress": progress["value"],
+            "running": sorted(running)
+        })
+
+    try:
+        executor = WorkflowExecutor(
+            node_pool,
+            node_timeout=execution["parameters"].get("node_timeout"),
+            on_state=on_state,
+            cache=node_cache if execution["parameters"].get("use_cache", True) else None
+        )
+        await executor.run(workflow, execution["results"])
+
+        failed = [node_id for node_id, result in execution["results"].items() if result["status"] != "completed"]
+        execution["status"] = "failed" if failed else "completed"
         execution["completed_at"] = datetime.now().isoformat()
-        
+        if failed:
+            execution["error"] = f"{len(failed)} 个节点未成功: {failed}"
+        await asyncio.to_thread(store.save_execution, execution)
+
         # 通知客户端完成
         await notify_clients({
-            "type": "execution_completed",
+            "type": "execution_completed" if not failed else "execution_failed",
             "execution_id": execution["id"],
-            "results": execution["results"]
+            "results": json.loads(json.dumps(execution["results"], default=str)),
+            "error": execution.get("error")
         })
         
     except Exception as e:
         execution["status"] = "failed"
         execution["error"] = str(e)
+        execution["completed_at"] = datetime.now().isoformat()
+        await asyncio.to_thread(store.save_execution, execution)
         
         await notify_clients({
             "type": "execution_failed",
             "execution_id": execution["id"],
             "error": str(e)
         })
+    finally:
+        # 执行记录已保存，最终输出的数据不再需要留在内存里
+        release_outputs(execution["results"])
 
 @app.get("/api/executions")
-async def get_executions():
-    """获取所有执行记录"""
-    return list(executions_store.values())
+async def get_executions(response: Response, workflow_id: Optional[str] = None, owner: Optional[str] = None,
+                         status: Optional[str] = None,
+                         limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """分页获取执行记录（按更新时间倒序），总数在 X-Total-Count 响应头中"""
+    items, total = await asyncio.to_thread(store.list_executions, workflow_id=workflow_id, owner=owner,
+                                           status=status, limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
 @app.get("/api/executions/{execution_id}")
 async def get_execution(execution_id: str):
     """获取单个执行记录"""
-    if execution_id not in executions_store:
+    execution = await asyncio.to_thread(store.get_execution, execution_id)
+    if execution is None:
         raise HTTPException(status_code=404, detail="Execution not found")
-    return executions_store[execution_id]
+    return execution
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """获取节点结果缓存统计"""
+    return node_cache.get_stats()
+
+@app.delete("/api/cache")
+async def clear_cache(node_type: Optional[str] = None):
+    """清除节点结果缓存，指定 node_type 时只清除该类型节点"""
+    removed = node_cache.invalidate(node_type)
+    return {"message": f"已清除 {removed} 条节点缓存", "removed": removed}
 
 # ==================== 节点库API ====================
 
@@ -323,7 +392,7 @@ async def get_available_nodes():
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket连接"""
     await websocket.accept()
-    connected_clients.append(websocket)
+    hub.connect(websocket)
     
     try:
         while True:
@@ -333,21 +402,24 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # 处理消息
             if message["type"] == "ping":
-                await websocket.send_json({"type": "pong"})
+                await hub.send_to(websocket, {"type": "pong"})
             
             # 广播给所有客户端
             await notify_clients(message)
             
     except WebSocketDisconnect:
-        connected_clients.remove(websocket)
+        pass
+    finally:
+        hub.disconnect(websocket)
 
 async def notify_clients(message: Dict):
-    """通知所有连接的客户端"""
-    for client in connected_clients:
-        try:
-            await client.send_json(message)
-        except:
-            connected_clients.remove(client)
+    """通知所有连接的客户端，只入队不等待发送，进度消息按窗口合并"""
+    hub.publish(message)
+
+@app.get("/api/ws/stats")
+async def get_ws_stats():
+    """获取 WebSocket 广播统计（客户端数、丢弃/合并/断开次数）"""
+    return hub.get_stats()
 
 # ==================== 市场数据API ====================
 
@@ -399,6 +471,31 @@ app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
 # ==================== 主程序入口 ====================
 
+@app.on_event("startup")
+async def register_plugins():
+    """加载 panda_plugins/custom 下的自定义节点"""
+    loaded = load_plugins()
+    print(f"已加载 {len(loaded)} 个节点插件模块")
+
+async def purge_expired_executions():
+    """定期清理超过保留期的执行记录"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(store.purge_expired)
+            if removed:
+                print(f"已清理 {removed} 条过期执行记录")
+        except Exception as e:
+            print(f"⚠️  清理过期执行记录失败: {e}")
+        await asyncio.sleep(PURGE_INTERVAL)
+
+@app.on_event("startup")
+async def start_purge_task():
+    asyncio.create_task(purge_expired_executions())
+
+@app.on_event("shutdown")
+async def shutdown_node_pool():
+    node_pool.shutdown(wait=False, cancel_futures=True)
+
 def main():
     """主程序入口"""
     print("=" * 80)
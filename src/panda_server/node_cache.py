@@ -0,0 +1,264 @@
+"""
+工作流节点结果缓存（按内容寻址）
+
+缓存键 = hash(节点类型, 节点版本, 输入内容哈希)，节点输入包括静态参数和上游输出，
+所以只修改下游节点时，上游的数据加载、模型训练等节点直接命中缓存。
+
+结果保存在本地目录（QUANTFLOW_CACHE_DIR，默认项目根目录下 .quantflow_cache），每个键一个子目录:
+    meta.json        节点类型、版本、大小、创建时间
+    payload.pkl      输出字典（DataFrame 字段替换为占位符）
+    <字段>.parquet   输出中的 DataFrame，安装了 pyarrow 时使用 Parquet，否则随 payload 一起 pickle
+
+输出中的数据引用（DataFrameRef 等）按引用的内容计算哈希，写入缓存时保存引用指向的数据，
+命中时重新发布为新的引用。
+
+总大小超过 QUANTFLOW_CACHE_MAX_BYTES（默认 2GB）时按最近访问时间淘汰。
+设置 QUANTFLOW_CACHE_MAX_AGE（秒，默认 0 不限）时，创建超过该时长的条目视为未命中并删除，
+用于输入相同但结果会随时间变化、又没有声明 cacheable = False 的节点。
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from panda_plugins.artifacts import as_ref, map_refs, publish
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+_META_FILE = "meta.json"
+_PAYLOAD_FILE = "payload.pkl"
+
+
+class _FrameRef:
+    """payload 中 DataFrame 字段的占位符，读取时替换为对应的 Parquet 文件"""
+
+    def __init__(self, filename: str, artifact: bool = False):
+        self.filename = filename
+        self.artifact = artifact
+
+
+class _Artifact:
+    """payload 中数据引用的占位符，保存引用指向的对象，读取时重新发布"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def _restore(value: Any) -> Any:
+    if isinstance(value, _Artifact):
+        return publish(value.value).dict()
+    if isinstance(value, dict):
+        return {key: _restore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+    return value
+
+
+# 数据引用的内容哈希，按 artifact_id 缓存，同一引用只计算一次
+_ref_hashes: Dict[str, str] = {}
+
+
+def content_hash(value: Any) -> str:
+    """
+    计算值的内容哈希
+
+    DataFrame/Series 用 pandas 的逐行哈希，ndarray 用原始字节，dict/list 递归处理，
+    其余对象按 pickle 字节计算
+    """
+    digest = hashlib.sha256()
+    _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+def _update_hash(digest, value: Any):
+    ref = as_ref(value)
+    if ref is not None:
+        ref_hash = _ref_hashes.get(ref.artifact_id)
+        if ref_hash is None:
+            if len(_ref_hashes) > 10000:
+                _ref_hashes.clear()
+            ref_hash = _ref_hashes[ref.artifact_id] = content_hash(ref.load())
+        digest.update(b"artifact")
+        digest.update(ref_hash.encode())
+    elif isinstance(value, pd.DataFrame):
+        digest.update(b"DataFrame")
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(repr(list(value.dtypes.astype(str))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(b"Series")
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(b"ndarray")
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, BaseModel):
+        _update_hash(digest, value.dict())
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(digest, item)
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        digest.update(repr(value).encode())
+    else:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def make_cache_key(node_type: str, version: str, inputs: Dict[str, Any]) -> str:
+    """节点结果的缓存键"""
+    return hashlib.sha256(f"{node_type}\0{version}\0{content_hash(inputs)}".encode()).hexdigest()
+
+
+class NodeResultCache:
+    """磁盘上的节点结果缓存，按总大小做 LRU 淘汰"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        default_root = Path(__file__).parent.parent.parent / ".quantflow_cache"
+        self.root = Path(root or os.getenv("QUANTFLOW_CACHE_DIR") or default_root)
+        self.max_bytes = max_bytes or int(os.getenv("QUANTFLOW_CACHE_MAX_BYTES", 0)) or DEFAULT_MAX_BYTES
+        # 条目的最长保留秒数，None/0 表示不限
+        self.max_age = max_age if max_age is not None else float(os.getenv("QUANTFLOW_CACHE_MAX_AGE", 0)) or None
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的节点输出，未命中返回 None"""
+        entry = self._entry(key)
+        try:
+            if self.max_age and self._expired(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+                self._count("expired")
+                self._count("misses")
+                return None
+            with open(entry / _PAYLOAD_FILE, "rb") as f:
+                payload = pickle.load(f)
+            for field, value in list(payload.items()):
+                if isinstance(value, _FrameRef):
+                    frame = pd.read_parquet(entry / value.filename)
+                    payload[field] = publish(frame).dict() if value.artifact else frame
+            payload = _restore(payload)
+            # 更新访问时间，供 LRU 淘汰使用
+            os.utime(entry / _META_FILE)
+        except (FileNotFoundError, NotADirectoryError):
+            self._count("misses")
+            return None
+        except Exception as e:
+            # 条目损坏（写入中断、版本不兼容）时删除后当作未命中
+            print(f"⚠️  节点缓存 {key} 读取失败，已删除: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            self._count("misses")
+            return None
+        self._count("hits")
+        return payload
+
+    def _expired(self, entry: Path) -> bool:
+        with open(entry / _META_FILE, encoding="utf-8") as f:
+            created_at = json.load(f)["created_at"]
+        return time.time() - created_at > self.max_age
+
+    def put(self, key: str, output: Dict[str, Any], node_type: str, version: str):
+        """写入节点输出，先写临时目录再改名，避免读到写了一半的条目"""
+        entry = self._entry(key)
+        staging = self.root / f".{key}.{os.getpid()}.{threading.get_ident()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        try:
+            payload = map_refs(output, lambda ref: _Artifact(ref.load()))
+            if HAS_PARQUET:
+                for i, (field, value) in enumerate(list(payload.items())):
+                    artifact = isinstance(value, _Artifact)
+                    frame = value.value if artifact else value
+                    if isinstance(frame, pd.DataFrame):
+                        filename = f"frame_{i}.parquet"
+                        frame.to_parquet(staging / filename)
+                        payload[field] = _FrameRef(filename, artifact)
+            with open(staging / _PAYLOAD_FILE, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = sum(path.stat().st_size for path in staging.iterdir())
+            with open(staging / _META_FILE, "w", encoding="utf-8") as f:
+                json.dump({"node_type": node_type, "version": version, "size": size,
+                           "created_at": time.time()}, f, ensure_ascii=False)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._count("stores")
+        self.evict()
+
+    def _entries(self):
+        for entry in self.root.iterdir():
+            meta_path = entry / _META_FILE
+            if entry.name.startswith(".") or not meta_path.exists():
+                continue
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                yield entry, meta, meta_path.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+
+    def evict(self):
+        """总大小超过上限时，从最久未访问的条目开始删除"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda item: item[2])
+            total = sum(meta["size"] for _, meta, _ in entries)
+            for entry, meta, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= meta["size"]
+                self._stats["evictions"] += 1
+
+    def invalidate(self, node_type: Optional[str] = None) -> int:
+        """删除缓存，指定 node_type 时只删除该类型节点的结果，返回删除的条目数"""
+        removed = 0
+        with self._lock:
+            for entry, meta, _ in list(self._entries()):
+                if node_type is None or meta.get("node_type") == node_type:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        entries = list(self._entries())
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(
+            entries=len(entries),
+            size_bytes=sum(meta["size"] for _, meta, _ in entries),
+            max_bytes=self.max_bytes,
+            max_age=self.max_age,
+            hit_rate=stats["hits"] / lookups if lookups else 0.0,
+            parquet=HAS_PARQUET,
+            root=str(self.root),
+        )
+        return stats
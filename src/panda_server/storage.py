@@ -0,0 +1,272 @@
+"""
+工作流和执行记录的持久化存储
+
+两种后端，通过 QUANTFLOW_STORE 选择:
+    sqlite（默认）  单机部署，数据库文件 QUANTFLOW_SQLITE_PATH（默认项目根目录下 quantflow.db），
+                    WAL 模式下同一台机器上的多个 uvicorn worker 可以共享
+    mongo           通过 panda_common 的 DatabaseHandler 连接，集合 quantflow_workflows / quantflow_executions
+
+两种后端都在 owner、status、更新时间上建索引，列表查询分页返回；
+执行记录保留 QUANTFLOW_EXECUTION_TTL_DAYS 天（默认 30，0 表示永久保留），
+Mongo 由 TTL 索引清理，SQLite 由 purge_expired() 定期清理。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_TTL_DAYS = 30
+
+
+def _dumps(value: Dict[str, Any]) -> str:
+    # 节点输出里可能有 numpy 数值等对象，无法序列化的按字符串保存
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class WorkflowStore(ABC):
+    """存储接口，列表方法返回 (当前页, 总数)；过期的执行记录在清理前也不会返回"""
+
+    def __init__(self, ttl_days: Optional[float] = None):
+        if ttl_days is None:
+            ttl_days = float(os.getenv("QUANTFLOW_EXECUTION_TTL_DAYS", DEFAULT_TTL_DAYS))
+        self.ttl_days = ttl_days
+
+    def _expires_at(self) -> Optional[datetime]:
+        # 带时区的 UTC 时间，Mongo TTL 索引按 UTC 比较
+        return datetime.now(timezone.utc) + timedelta(days=self.ttl_days) if self.ttl_days > 0 else None
+
+    @abstractmethod
+    def save_workflow(self, workflow: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def get_workflow(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def delete_workflow(self, workflow_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def list_workflows(self, owner: Optional[str] = None, status: Optional[str] = None,
+                       limit: int = 50, offset: int = 0) -> tuple:
+        pass
+
+    @abstractmethod
+    def save_execution(self, execution: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def get_execution(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def list_executions(self, workflow_id: Optional[str] = None, owner: Optional[str] = None,
+                        status: Optional[str] = None, limit: int = 50, offset: int = 0) -> tuple:
+        pass
+
+    def purge_expired(self) -> int:
+        """删除过期的执行记录，返回删除条数"""
+        return 0
+
+
+class SQLiteWorkflowStore(WorkflowStore):
+    """SQLite 后端，每个线程一个连接"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS workflows (
+        id TEXT PRIMARY KEY,
+        owner TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL DEFAULT 'draft',
+        updated_at TEXT NOT NULL,
+        body TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_workflows_owner_updated ON workflows (owner, updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_workflows_status_updated ON workflows (status, updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_workflows_updated ON workflows (updated_at DESC);
+
+    CREATE TABLE IF NOT EXISTS executions (
+        id TEXT PRIMARY KEY,
+        workflow_id TEXT NOT NULL,
+        owner TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        expires_at REAL,
+        body TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_executions_workflow_updated ON executions (workflow_id, updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_executions_owner_updated ON executions (owner, updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_executions_status_updated ON executions (status, updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_executions_updated ON executions (updated_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_executions_expires ON executions (expires_at);
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_days: Optional[float] = None):
+        super().__init__(ttl_days)
+        default_path = Path(__file__).parent.parent.parent / "quantflow.db"
+        self.path = str(path or os.getenv("QUANTFLOW_SQLITE_PATH") or default_path)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL 允许多个 worker 进程并发读、单写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> tuple:
+        clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _page(self, table: str, filters: Dict[str, Any], limit: int, offset: int,
+              conditions: Optional[List[tuple]] = None) -> tuple:
+        """分页查询，conditions 为额外的 (SQL 条件, 参数列表)"""
+        where, params = self._where(filters)
+        for clause, values in conditions or []:
+            where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+            params = params + list(values)
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT body FROM {table}{where} ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows], total
+
+    def save_workflow(self, workflow: Dict[str, Any]):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workflows (id, owner, status, updated_at, body) VALUES (?, ?, ?, ?, ?)",
+                (workflow["id"], workflow.get("owner") or "", workflow.get("status") or "draft",
+                 workflow["updated_at"], _dumps(workflow))
+            )
+
+    def get_workflow(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT body FROM workflows WHERE id = ?", (workflow_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_workflow(self, workflow_id: str) -> bool:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM workflows WHERE id = ?", (workflow_id,)).rowcount > 0
+
+    def list_workflows(self, owner=None, status=None, limit=50, offset=0) -> tuple:
+        return self._page("workflows", {"owner": owner, "status": status}, limit, offset)
+
+    def save_execution(self, execution: Dict[str, Any]):
+        expires_at = self._expires_at()
+        body = {**execution, "owner": execution.get("owner") or "", "updated_at": datetime.now().isoformat()}
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO executions (id, workflow_id, owner, status, updated_at, expires_at, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (body["id"], body["workflow_id"], body["owner"], body["status"], body["updated_at"],
+                 expires_at.timestamp() if expires_at else None, _dumps(body))
+            )
+
+    def get_execution(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT body FROM executions WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (execution_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_executions(self, workflow_id=None, owner=None, status=None, limit=50, offset=0) -> tuple:
+        return self._page("executions", {"workflow_id": workflow_id, "owner": owner, "status": status},
+                          limit, offset, [("(expires_at IS NULL OR expires_at > ?)", [time.time()])])
+
+    def purge_expired(self) -> int:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM executions WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                (time.time(),)).rowcount
+
+
+class MongoWorkflowStore(WorkflowStore):
+    """MongoDB 后端，连接配置沿用 panda_common 的 config.yaml"""
+
+    def __init__(self, ttl_days: Optional[float] = None):
+        super().__init__(ttl_days)
+        from pymongo import ASCENDING, DESCENDING
+        from panda_common.config import config
+        from panda_common.handlers.database_handler import DatabaseHandler
+
+        db = DatabaseHandler(config).mongo_client[config["MONGO_DB"]]
+        self.workflows = db["quantflow_workflows"]
+        self.executions = db["quantflow_executions"]
+        self.workflows.create_index([("owner", ASCENDING), ("updated_at", DESCENDING)])
+        self.workflows.create_index([("status", ASCENDING), ("updated_at", DESCENDING)])
+        self.workflows.create_index([("updated_at", DESCENDING)])
+        self.executions.create_index([("workflow_id", ASCENDING), ("updated_at", DESCENDING)])
+        self.executions.create_index([("owner", ASCENDING), ("updated_at", DESCENDING)])
+        self.executions.create_index([("status", ASCENDING), ("updated_at", DESCENDING)])
+        self.executions.create_index([("updated_at", DESCENDING)])
+        # expires_at 为空的文档不会被 TTL 清理
+        self.executions.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def _strip(doc: Optional[Dict]) -> Optional[Dict]:
+        if doc is None:
+            return None
+        doc.pop("_id", None)
+        doc.pop("expires_at", None)
+        return doc
+
+    @staticmethod
+    def _not_expired() -> Dict[str, Any]:
+        # TTL 索引每分钟左右清理一次，清理前的过期文档也不返回
+        return {"$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.now(timezone.utc)}}]}
+
+    def _page(self, collection, filters: Dict[str, Any], limit: int, offset: int,
+              extra: Optional[Dict[str, Any]] = None) -> tuple:
+        query = {key: value for key, value in filters.items() if value is not None}
+        query.update(extra or {})
+        total = collection.count_documents(query)
+        cursor = collection.find(query).sort("updated_at", -1).skip(offset).limit(limit)
+        return [self._strip(doc) for doc in cursor], total
+
+    def save_workflow(self, workflow: Dict[str, Any]):
+        doc = json.loads(_dumps(workflow))
+        doc.setdefault("owner", "")
+        self.workflows.replace_one({"_id": workflow["id"]}, {"_id": workflow["id"], **doc}, upsert=True)
+
+    def get_workflow(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        return self._strip(self.workflows.find_one({"_id": workflow_id}))
+
+    def delete_workflow(self, workflow_id: str) -> bool:
+        return self.workflows.delete_one({"_id": workflow_id}).deleted_count > 0
+
+    def list_workflows(self, owner=None, status=None, limit=50, offset=0) -> tuple:
+        return self._page(self.workflows, {"owner": owner, "status": status}, limit, offset)
+
+    def save_execution(self, execution: Dict[str, Any]):
+        doc = json.loads(_dumps(execution))
+        doc.update(_id=execution["id"], owner=execution.get("owner") or "",
+                   updated_at=datetime.now().isoformat(), expires_at=self._expires_at())
+        self.executions.replace_one({"_id": execution["id"]}, doc, upsert=True)
+
+    def get_execution(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        return self._strip(self.executions.find_one({"_id": execution_id, **self._not_expired()}))
+
+    def list_executions(self, workflow_id=None, owner=None, status=None, limit=50, offset=0) -> tuple:
+        return self._page(self.executions, {"workflow_id": workflow_id, "owner": owner, "status": status},
+                          limit, offset, self._not_expired())
+
+
+def create_store(kind: Optional[str] = None) -> WorkflowStore:
+    """按 QUANTFLOW_STORE 创建存储后端"""
+    kind = (kind or os.getenv("QUANTFLOW_STORE", "sqlite")).lower()
+    if kind == "mongo":
+        return MongoWorkflowStore()
+    return SQLiteWorkflowStore()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试节点间的数据引用：同进程共享对象、导出给其他进程读取、释放与淘汰、下游未执行时固定
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import pandas as pd
+import pytest
+from pydantic import BaseModel
+
+from panda_plugins.artifacts import (IPC, ArtifactStore, DataFrameRef, as_ref, collect_refs, get_store,
+                                     load_frame, map_refs, publish)
+from panda_plugins.base import BaseWorkNode, work_node
+from panda_server.executor import WorkflowExecutor, release_outputs
+
+
+class _FrameOutput(BaseModel):
+    data: Any = None
+
+
+@work_node(name="发布行情", group="引用测试")
+class PublishNode(BaseWorkNode):
+    class Input(BaseModel):
+        count: int = 1
+        data: Any = None
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return _FrameOutput
+
+    def run(self, input):
+        # count > 1 时连续发布多个对象，模拟并发工作流挤占引用表
+        refs = [publish(pd.DataFrame({"close": [float(i)]})) for i in range(input.count)]
+        return _FrameOutput(data=refs[-1])
+
+
+@work_node(name="读取行情", group="引用测试")
+class LoadNode(BaseWorkNode):
+    class Input(BaseModel):
+        data: Any = None
+        noise: Any = None
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return _FrameOutput
+
+    def run(self, input):
+        return _FrameOutput(data=publish(load_frame(input.data) * 2))
+
+
+def test_publish_shares_the_same_object():
+    frame = pd.DataFrame({"close": [1.0, 2.0, 3.0]})
+    ref = publish(frame)
+    assert isinstance(ref, DataFrameRef)
+    assert (ref.rows, ref.columns) == (3, ["close"])
+    # 节点输出转成字典后仍能识别为引用，取回的是同一个对象
+    assert load_frame(ref.dict()) is frame
+    assert load_frame([{"close": 1.0}]).equals(pd.DataFrame({"close": [1.0]}))
+
+
+def test_export_round_trip_through_file():
+    frame = pd.DataFrame({"close": [1.0, 2.0]})
+    store = ArtifactStore()
+    ref = store.put(frame)
+    exported = store.export(ref)
+    assert exported.location == IPC and os.path.exists(exported.path)
+    assert store.export(ref) == exported
+
+    # 模拟另一个进程：新的引用表只能从导出文件读取
+    other = ArtifactStore()
+    assert other.get(exported.dict()).equals(frame)
+
+    store.release([ref.artifact_id])
+    assert not os.path.exists(exported.path)
+    with pytest.raises(KeyError):
+        store.get(ref)
+
+
+def test_oldest_objects_are_evicted():
+    store = ArtifactStore(max_items=2)
+    refs = [store.put(i) for i in range(3)]
+    with pytest.raises(KeyError):
+        store.get(refs[0])
+    assert store.get(refs[2]) == 2
+
+
+def test_pinned_objects_are_not_evicted():
+    store = ArtifactStore(max_items=2)
+    pinned = store.put("pinned")
+    store.pin([pinned.artifact_id])
+    refs = [store.put(i) for i in range(2)]
+    assert store.get(pinned) == "pinned"
+    with pytest.raises(KeyError):
+        store.get(refs[0])
+
+    store.pin([pinned.artifact_id])
+    store.unpin([pinned.artifact_id])
+    store.put(2)
+    assert store.get(pinned) == "pinned"
+    store.unpin([pinned.artifact_id])
+    assert store.get_stats()["pinned"] == 0
+    # 解除固定后按发布顺序最早被淘汰
+    store.put(3)
+    with pytest.raises(KeyError):
+        store.get(pinned)
+
+
+def test_pending_consumer_keeps_upstream_output(monkeypatch):
+    monkeypatch.setattr(get_store(), "max_items", 3)
+    node = lambda node_id, node_type, **data: SimpleNamespace(id=node_id, type=node_type, data=data)
+    link = lambda source, target, port: SimpleNamespace(source=source, target=target,
+                                                         sourcePort="data", targetPort=port)
+    # flood 在 source 之后连续发布，读取节点最后执行，source 的输出必须还在
+    workflow = SimpleNamespace(
+        nodes=[node("source", "发布行情"), node("flood", "发布行情", count=10), node("load", "读取行情")],
+        connections=[link("source", "flood", "data"), link("source", "load", "data"),
+                     link("flood", "load", "noise")])
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = asyncio.run(WorkflowExecutor(pool).run(workflow))
+
+    assert results["load"]["status"] == "completed", results["load"]
+    final = results["load"]["output"]["data"]
+    assert load_frame(final)["close"].tolist() == [0.0]
+    assert get_store().get_stats()["pinned"] == 0
+
+    release_outputs(results)
+    with pytest.raises(KeyError):
+        get_store().get(final)
+
+
+def test_map_and_collect_nested_refs():
+    store = ArtifactStore()
+    refs = [store.put(1), store.put(2)]
+    output = {"a": refs[0].dict(), "nested": [{"b": refs[1]}, 3]}
+    assert [ref.artifact_id for ref in collect_refs(output)] == [ref.artifact_id for ref in refs]
+    assert map_refs(output, lambda ref: store.get(ref)) == {"a": 1, "nested": [{"b": 2}, 3]}
+    assert as_ref({"artifact_id": "x"}) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试 WebSocket 广播中心：进度合并、结束状态不丢失、慢客户端处理
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import pytest
+
+from panda_server.broadcast import DISCONNECT, BroadcastHub
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def _executed(node_id, status="completed", execution_id="e1"):
+    return {"type": "node_executed", "execution_id": execution_id, "node_id": node_id, "status": status}
+
+
+def _state(node_id, state, progress=None, execution_id="e1"):
+    return {"type": "node_state", "execution_id": execution_id, "node_id": node_id, "state": state,
+            "progress": progress}
+
+
+def _progress(progress, execution_id="e1"):
+    return {"type": "execution_progress", "execution_id": execution_id, "progress": progress}
+
+
+async def _drain(hub):
+    hub.flush()
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_terminal_node_statuses_are_never_coalesced():
+    async def scenario():
+        hub = BroadcastHub(coalesce_window=0.05)
+        websocket = FakeWebSocket()
+        hub.connect(websocket)
+        hub.publish(_executed("a"))
+        hub.publish(_executed("b", "failed"))
+        hub.publish(_executed("c", "skipped"))
+        await asyncio.sleep(0.1)
+        await _drain(hub)
+        return websocket.sent, hub.get_stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert [(message["node_id"], message["status"]) for message in sent] == [
+        ("a", "completed"), ("b", "failed"), ("c", "skipped")]
+    assert stats["coalesced"] == 0
+
+
+def test_execution_progress_is_coalesced_and_flushed_before_node_states():
+    async def scenario():
+        hub = BroadcastHub(coalesce_window=10)
+        websocket = FakeWebSocket()
+        hub.connect(websocket)
+        # 每个节点只有一条 running，节点状态逐条送达，执行级进度只保留最新一条
+        hub.publish(_state("a", "running"))
+        hub.publish(_progress(0.0))
+        hub.publish(_state("b", "running"))
+        hub.publish(_progress(0.0))
+        hub.publish(_progress(0.25))
+        hub.publish(_progress(0.5))
+        hub.publish(_state("a", "completed", 0.5))
+        await _drain(hub)
+        return websocket.sent, hub.get_stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert [(message["type"], message.get("node_id"), message["progress"]) for message in sent] == [
+        ("node_state", "a", None), ("execution_progress", None, 0.0), ("node_state", "b", None),
+        ("execution_progress", None, 0.5), ("node_state", "a", 0.5)]
+    assert stats["coalesced"] == 2
+
+
+def test_other_executions_are_not_merged():
+    async def scenario():
+        hub = BroadcastHub(coalesce_window=10)
+        websocket = FakeWebSocket()
+        hub.connect(websocket)
+        hub.publish(_progress(0.1, execution_id="e1"))
+        hub.publish(_progress(0.2, execution_id="e2"))
+        hub.publish(_progress(0.3, execution_id="e1"))
+        await _drain(hub)
+        return websocket.sent
+
+    assert [(message["execution_id"], message["progress"]) for message in asyncio.run(scenario())] == [
+        ("e1", 0.3), ("e2", 0.2)]
+
+
+def test_slow_client_drops_oldest_without_blocking_others():
+    async def scenario():
+        hub = BroadcastHub(queue_size=2, coalesce_window=0)
+        slow, fast = FakeWebSocket(delay=0.05), FakeWebSocket()
+        hub.connect(slow)
+        hub.connect(fast)
+        await asyncio.sleep(0)
+        for i in range(5):
+            hub.publish({"type": "log", "i": i})
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.3)
+        return slow.sent, fast.sent, hub.get_stats()
+
+    slow_sent, fast_sent, stats = asyncio.run(scenario())
+    assert [message["i"] for message in fast_sent] == [0, 1, 2, 3, 4]
+    assert slow_sent[-1]["i"] == 4 and len(slow_sent) < 5
+    assert stats["dropped"] > 0 and stats["clients"] == 2
+
+
+def test_disconnect_policy_closes_slow_client():
+    async def scenario():
+        hub = BroadcastHub(queue_size=1, coalesce_window=0, slow_policy=DISCONNECT)
+        slow = FakeWebSocket(delay=1)
+        hub.connect(slow)
+        await asyncio.sleep(0)
+        for i in range(3):
+            hub.publish({"type": "log", "i": i})
+        await asyncio.sleep(0.01)
+        return slow, hub.get_stats()
+
+    slow, stats = asyncio.run(scenario())
+    assert slow.closed == 1008
+    assert stats["disconnected"] == 1 and stats["clients"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试工作流节点结果缓存：命中、失效、过期和不可缓存节点
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import pandas as pd
+import pytest
+from pydantic import BaseModel
+
+from panda_plugins.base import BaseWorkNode, get_registry, work_node
+from panda_server.executor import WorkflowExecutor, load_plugins, resolve_node_id
+from panda_server.node_cache import NodeResultCache, make_cache_key
+
+_runs = {"square": 0, "count": 0}
+
+
+@work_node(name="测试平方", group="缓存测试")
+class SquareNode(BaseWorkNode):
+    class Input(BaseModel):
+        value: float = 0
+
+    class Output(BaseModel):
+        value: float
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return cls.Output
+
+    def run(self, input):
+        _runs["square"] += 1
+        return self.Output(value=input.value ** 2)
+
+
+@work_node(name="测试计数", group="缓存测试")
+class CountNode(BaseWorkNode):
+    class Input(BaseModel):
+        payload: Any = None
+
+    class Output(BaseModel):
+        value: int
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return cls.Output
+
+    def run(self, input):
+        _runs["count"] += 1
+        return self.Output(value=len(input.payload))
+
+
+def _run(node_cache, value=3, node_type="测试平方", **data):
+    workflow = SimpleNamespace(nodes=[SimpleNamespace(id="n", type=node_type, data={"value": value, **data})],
+                               connections=[])
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        return asyncio.run(WorkflowExecutor(pool, cache=node_cache).run(workflow))["n"]
+
+
+def test_key_depends_on_type_version_and_inputs():
+    frame = pd.DataFrame({"close": [1.0, 2.0]})
+    key = make_cache_key("a.b", "1.0.0", {"x": 1, "frame": frame})
+    assert key == make_cache_key("a.b", "1.0.0", {"frame": frame.copy(), "x": 1})
+    assert key != make_cache_key("a.b", "1.0.1", {"x": 1, "frame": frame})
+    assert key != make_cache_key("a.b", "1.0.0", {"x": 2, "frame": frame})
+    assert key != make_cache_key("a.b", "1.0.0", {"x": 1, "frame": frame.assign(close=[1.0, 3.0])})
+
+
+def test_executor_hits_cache_and_invalidates(tmp_path):
+    cache = NodeResultCache(root=str(tmp_path))
+    _runs["square"] = 0
+    first = _run(cache)
+    second = _run(cache)
+    assert first["output"] == second["output"] == {"value": 9.0}
+    assert second.get("cached") is True
+    assert _runs["square"] == 1
+
+    # 输入变化或节点关闭缓存时重新执行
+    _run(cache, value=4)
+    _run(cache, cache=False)
+    assert _runs["square"] == 3
+
+    assert cache.invalidate(resolve_node_id("测试平方")) == 2
+    _run(cache)
+    assert _runs["square"] == 4
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["entries"] == 1
+
+
+@pytest.mark.parametrize("payload", [
+    pd.DataFrame({"codes": [["000001", "000002"], ["600000"]]}),  # list 列无法按行哈希
+    [threading.Lock(), threading.Lock()],                          # 无法 pickle
+])
+def test_unhashable_inputs_skip_cache(tmp_path, payload):
+    cache = NodeResultCache(root=str(tmp_path))
+    _runs["count"] = 0
+    for _ in range(2):
+        result = _run(cache, node_type="测试计数", payload=payload)
+        assert result["status"] == "completed"
+        assert result["output"] == {"value": 2}
+    assert _runs["count"] == 2
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_entries_expire_after_max_age(tmp_path):
+    cache = NodeResultCache(root=str(tmp_path), max_age=60)
+    cache.put("k", {"value": 1}, "缓存测试.测试平方", "1.0.0")
+    assert cache.get("k") == {"value": 1}
+
+    meta_path = tmp_path / "k" / "meta.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta["created_at"] = time.time() - 120
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+    assert cache.get("k") is None
+    assert not (tmp_path / "k").exists()
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_max_age_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUANTFLOW_CACHE_MAX_AGE", "30")
+    assert NodeResultCache(root=str(tmp_path)).max_age == 30
+    monkeypatch.delenv("QUANTFLOW_CACHE_MAX_AGE")
+    assert NodeResultCache(root=str(tmp_path)).max_age is None
+
+
+@pytest.mark.parametrize("name", ["股票数据加载", "ML模型训练"])
+def test_data_source_and_random_examples_are_not_cacheable(name):
+    load_plugins()
+    node_id = resolve_node_id(name)
+    if node_id is None:
+        pytest.skip("示例节点未加载")
+    assert get_registry().get_node(node_id).cacheable is False
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试工作流 DAG 执行器：并发调度、端口传值、失败后跳过下游
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import pytest
+from pydantic import BaseModel
+
+from panda_plugins.base import BaseWorkNode, work_node
+from panda_server.executor import (COMPLETED, FAILED, SKIPPED, TIMEOUT, WorkflowExecutor,
+                                   topological_sort)
+
+@work_node(name="测试常数", group="执行器测试")
+class ConstNode(BaseWorkNode):
+    class Input(BaseModel):
+        value: float = 0
+        delay: float = 0
+
+    class Output(BaseModel):
+        value: float
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return cls.Output
+
+    def run(self, input):
+        time.sleep(input.delay)
+        return self.Output(value=input.value)
+
+
+@work_node(name="测试求和", group="执行器测试")
+class SumNode(BaseWorkNode):
+    class Input(BaseModel):
+        a: float = 0
+        b: float = 0
+
+    class Output(BaseModel):
+        total: float
+
+    @classmethod
+    def input_model(cls):
+        return cls.Input
+
+    @classmethod
+    def output_model(cls):
+        return cls.Output
+
+    def run(self, input):
+        return self.Output(total=input.a + input.b)
+
+
+@work_node(name="测试失败", group="执行器测试")
+class FailNode(BaseWorkNode):
+    @classmethod
+    def input_model(cls):
+        return None
+
+    @classmethod
+    def output_model(cls):
+        return None
+
+    def run(self, input):
+        raise ValueError("boom")
+
+
+def _node(node_id, node_type, **data):
+    return SimpleNamespace(id=node_id, type=node_type, data=data)
+
+
+def _edge(source, target, source_port="value", target_port=None):
+    return SimpleNamespace(source=source, target=target, sourcePort=source_port, targetPort=target_port)
+
+
+def _run(workflow, **kwargs):
+    events = []
+
+    async def on_state(event):
+        events.append(event)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        executor = WorkflowExecutor(pool, on_state=on_state, **kwargs)
+        results = asyncio.run(executor.run(workflow))
+    return results, events
+
+
+def test_topological_sort_detects_cycles():
+    assert topological_sort(["a", "b", "c"], [("a", "b"), ("b", "c")]) == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        topological_sort(["a", "b"], [("a", "b"), ("b", "a")])
+
+
+def test_independent_branches_run_concurrently_and_pass_ports():
+    workflow = SimpleNamespace(
+        nodes=[
+            _node("x", "测试常数", value=1, delay=0.3),
+            _node("y", "测试常数", value=2, delay=0.3),
+            _node("s", "测试求和"),
+        ],
+        connections=[_edge("x", "s", target_port="a"), _edge("y", "s", target_port="b")],
+    )
+    started = time.perf_counter()
+    results, events = _run(workflow)
+    elapsed = time.perf_counter() - started
+
+    assert results["s"]["status"] == COMPLETED
+    assert results["s"]["output"] == {"total": 3.0}
+    # 两个 0.3 秒的分支并行执行
+    assert elapsed < 0.55
+    finished = [event["node_id"] for event in events if event["state"] == COMPLETED]
+    assert finished[-1] == "s"
+    assert events[-1]["progress"] == 1.0
+
+
+def test_failure_skips_downstream_only():
+    workflow = SimpleNamespace(
+        nodes=[
+            _node("bad", "测试失败"),
+            _node("after_bad", "测试求和"),
+            _node("after_after", "测试求和"),
+            _node("ok", "测试常数", value=5),
+            _node("after_ok", "测试求和"),
+        ],
+        connections=[
+            _edge("bad", "after_bad", target_port="a"),
+            _edge("after_bad", "after_after", source_port="total", target_port="a"),
+            _edge("ok", "after_ok", target_port="b"),
+        ],
+    )
+    results, events = _run(workflow)
+    assert results["bad"]["status"] == FAILED
+    assert "boom" in results["bad"]["error"]
+    assert results["after_bad"]["status"] == SKIPPED
+    assert results["after_after"]["status"] == SKIPPED
+    assert results["after_ok"]["output"] == {"total": 5.0}
+    assert {event["node_id"] for event in events if event["state"] == SKIPPED} == {"after_bad", "after_after"}
+
+
+def test_unknown_node_and_timeout():
+    workflow = SimpleNamespace(
+        nodes=[_node("missing", "不存在的节点"), _node("slow", "测试常数", delay=0.5, timeout=0.1)],
+        connections=[],
+    )
+    results, _ = _run(workflow)
+    assert results["missing"]["status"] == FAILED
+    assert results["slow"]["status"] == TIMEOUT
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
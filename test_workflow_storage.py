@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试工作流存储：分页、过滤和执行记录过期
+"""
+
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "src"))
+sys.path.insert(0, os.path.join(current_dir, "panda_factor-main", "panda_factor-main", "panda_common"))
+
+import pytest
+
+from panda_server.storage import MongoWorkflowStore, SQLiteWorkflowStore, WorkflowStore
+
+
+def _execution(execution_id, workflow_id="w1", status="completed"):
+    return {"id": execution_id, "workflow_id": workflow_id, "status": status, "owner": "alice"}
+
+
+def _expire(store, execution_id):
+    """把执行记录的过期时间改到过去"""
+    with store._conn() as conn:
+        conn.execute("UPDATE executions SET expires_at = ? WHERE id = ?", (time.time() - 1, execution_id))
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        WorkflowStore()
+
+
+def test_workflow_pagination_and_filters(tmp_path):
+    store = SQLiteWorkflowStore(path=str(tmp_path / "quantflow.db"), ttl_days=30)
+    for i in range(5):
+        store.save_workflow({"id": f"w{i}", "owner": "alice" if i % 2 else "bob", "status": "draft",
+                             "updated_at": f"2024-01-0{i + 1}T00:00:00"})
+    page, total = store.list_workflows(limit=2, offset=0)
+    assert total == 5
+    assert [workflow["id"] for workflow in page] == ["w4", "w3"]
+    page, total = store.list_workflows(owner="alice")
+    assert total == 2 and [workflow["id"] for workflow in page] == ["w3", "w1"]
+    assert store.delete_workflow("w0") and store.get_workflow("w0") is None
+
+
+def test_expired_executions_are_hidden_before_purge(tmp_path):
+    store = SQLiteWorkflowStore(path=str(tmp_path / "quantflow.db"), ttl_days=30)
+    for i in range(3):
+        store.save_execution(_execution(f"e{i}"))
+    _expire(store, "e1")
+
+    page, total = store.list_executions(workflow_id="w1")
+    assert total == 2
+    assert sorted(execution["id"] for execution in page) == ["e0", "e2"]
+    assert store.get_execution("e1") is None
+    assert store.purge_expired() == 1
+
+
+def test_executions_without_ttl_never_expire(tmp_path):
+    store = SQLiteWorkflowStore(path=str(tmp_path / "quantflow.db"), ttl_days=0)
+    store.save_execution(_execution("e0"))
+    assert store.list_executions()[1] == 1
+    assert store.purge_expired() == 0
+
+
+def test_mongo_store_hides_expired_executions():
+    mongomock = pytest.importorskip("mongomock")
+    pytest.importorskip("panda_common.handlers.database_handler")
+    from datetime import datetime, timedelta, timezone
+    from panda_common.handlers.database_handler import DatabaseHandler
+
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.mongo_client = mongomock.MongoClient(tz_aware=True)
+    handler.initialized = True
+    DatabaseHandler._instance = handler
+
+    store = MongoWorkflowStore(ttl_days=30)
+    store.save_execution(_execution("e0"))
+    store.save_execution(_execution("e1"))
+    store.executions.update_one({"_id": "e1"},
+                                {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    page, total = store.list_executions(owner="alice")
+    assert total == 1 and page[0]["id"] == "e0"
+    assert store.get_execution("e1") is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))